@@ -0,0 +1,192 @@
+"""Сводные отчёты по продажам, записям ветклиники и питомцам (нужен numpy).
+
+Данные раскладываются по столбцам: строки (имена, породы, типы записей)
+кодируются номерами категорий, даты разбираются в datetime64, а прививки
+и болезни берутся из медкарт упакованными (EnumSeq) и разворачиваются
+сдвигами сразу по всему столбцу. Все отчёты считаются операциями над
+массивами, без цикла по записям.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+AGE_BINS = (1, 3, 7)
+AGE_LABELS = ("до 1 года", "1-2 года", "3-6 лет", "7 лет и старше")
+NO_BREED = "без породы"
+UNKNOWN = "неизвестно"
+TOP = 10
+DATE_LEN = len("дд.мм.гг чч:мм:сс")
+# Перестановка символов "дд.мм.гг чч:мм:сс" в ISO "20гг-мм-ддTчч:мм:сс";
+# отрицательные номера — символы-разделители из ISO_FILL
+ISO_ORDER = (-1, -2, 6, 7, -3, 3, 4, -3, 0, 1, -4, 9, 10, 11, 12, 13, 14, 15, 16)
+ISO_FILL = {-1: "2", -2: "0", -3: "-", -4: "T"}
+
+
+@dataclass
+class Categorical:
+    """Столбец строк: номер категории для каждой строки и сами категории"""
+    codes: np.ndarray
+    labels: np.ndarray
+
+    @classmethod
+    def encode(cls, values: List[str]) -> "Categorical":
+        labels, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+        return cls(codes.reshape(-1), labels)
+
+    def counts(self, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Число строк по категориям, по убыванию (первые limit)"""
+        counts = np.bincount(self.codes, minlength=len(self.labels))
+        order = np.argsort(-counts, kind="stable")[:limit]
+        return [(str(self.labels[i]), int(counts[i])) for i in order]
+
+
+def parse_dates(values: List[str]) -> np.ndarray:
+    """Даты "дд.мм.гг чч:мм:сс" в datetime64[s]; нераспознанные — NaT"""
+    s = np.asarray(values, dtype=f"U{DATE_LEN}")
+    chars = s.view("U1").reshape(len(s), DATE_LEN)
+    iso = np.empty((len(s), len(ISO_ORDER)), dtype="U1")
+    for col, src in enumerate(ISO_ORDER):
+        iso[:, col] = ISO_FILL[src] if src < 0 else chars[:, src]
+    iso = iso.view(f"U{len(ISO_ORDER)}").reshape(-1)
+    valid = np.char.str_len(s) == DATE_LEN
+    times = np.full(len(s), np.datetime64("NaT"), dtype="datetime64[s]")
+    if valid.any():
+        times[valid] = iso[valid].astype("datetime64[s]")
+    return times
+
+
+def unpack_flags(packed: np.ndarray, seq) -> np.ndarray:
+    """Матрица (питомец x член перечисления): есть ли значение в списке.
+
+    packed — столбец упакованных EnumSeq; список короче числа членов
+    перечисления, поэтому сдвигов не больше len(seq.members).
+    """
+    flags = np.zeros((len(packed), len(seq.members)), dtype=bool)
+    rest = packed.copy()
+    for _ in seq.members:
+        codes = (rest & np.uint64(seq.mask)).astype(np.intp)
+        present = codes > 0
+        flags[present, codes[present] - 1] = True
+        rest >>= np.uint64(seq.bits)
+    return flags
+
+
+@dataclass
+class PetsTable:
+    breed: Categorical
+    age: np.ndarray
+    vaccinations: np.ndarray
+    diseases: np.ndarray
+
+    @classmethod
+    def from_manager(cls, manager) -> "PetsTable":
+        pets = [p for o in manager.owners for p in o.pets]
+        pets.extend(manager.petshop.available_pets)
+        return cls(
+            Categorical.encode([p.breed or NO_BREED for p in pets]),
+            np.fromiter((p.age for p in pets), dtype=np.int64, count=len(pets)),
+            np.fromiter((p.medical_card.packed_vaccinations for p in pets),
+                        dtype=np.uint64, count=len(pets)),
+            np.fromiter((p.medical_card.packed_diseases for p in pets),
+                        dtype=np.uint64, count=len(pets)))
+
+    def age_groups(self) -> Categorical:
+        return Categorical(np.digitize(self.age, AGE_BINS), np.asarray(AGE_LABELS))
+
+
+@dataclass
+class SalesTable:
+    owner: Categorical
+    breed: Categorical
+    time: np.ndarray
+
+    @classmethod
+    def from_manager(cls, manager) -> "SalesTable":
+        sales = manager.petshop.sales
+        # Продажа ссылается на имена: породу берём у питомца владельца
+        breeds: Dict[Tuple[str, str], str] = {}
+        for o in manager.owners:
+            for p in o.pets:
+                breeds.setdefault((o.name, p.name), p.breed or NO_BREED)
+        return cls(
+            Categorical.encode([s["owner_name"] for s in sales]),
+            Categorical.encode([breeds.get((s["owner_name"], s["pet_name"]), UNKNOWN)
+                                for s in sales]),
+            parse_dates([s["date"] for s in sales]))
+
+
+@dataclass
+class RecordsTable:
+    detail: Categorical
+    time: np.ndarray
+
+    @classmethod
+    def from_manager(cls, manager) -> "RecordsTable":
+        records = manager.vetclinic.records
+        return cls(
+            Categorical.encode([r["detail"] for r in records]),
+            parse_dates([r["date"] for r in records]))
+
+
+def count_by_day(times: np.ndarray) -> List[Tuple[str, int]]:
+    """Число событий по дням, в порядке дат"""
+    days = times[~np.isnat(times)].astype("datetime64[D]")
+    labels, counts = np.unique(days, return_counts=True)
+    return [(d.astype(object).strftime("%d.%m.%y"), int(c))
+            for d, c in zip(labels, counts)]
+
+
+def shares(groups: Categorical, flags: np.ndarray) -> np.ndarray:
+    """Доля строк с флагом в каждой группе: (группа x флаг)"""
+    totals = np.bincount(groups.codes, minlength=len(groups.labels))
+    hits = np.stack([np.bincount(groups.codes, weights=flags[:, j],
+                                 minlength=len(groups.labels))
+                     for j in range(flags.shape[1])], axis=1)
+    return hits / np.maximum(totals, 1)[:, None]
+
+
+def format_table(title: str, rows: np.ndarray, columns: List[str],
+                 values: np.ndarray) -> List[str]:
+    lines = [f"\n{title}:", "  " + " | ".join(["", *columns])]
+    for label, row in zip(rows, values):
+        lines.append("  " + " | ".join([str(label), *(f"{v:.0%}" for v in row)]))
+    return lines
+
+
+def format_counts(title: str, counts: List[Tuple[str, int]]) -> List[str]:
+    if not counts:
+        return [f"\n{title}: нет данных"]
+    return [f"\n{title}:", *(f"  {label}: {n}" for label, n in counts)]
+
+
+def report(manager, vaccine_seq, disease_seq) -> str:
+    """Текст всех отчётов; vaccine_seq/disease_seq — упаковка медкарт"""
+    sales = SalesTable.from_manager(manager)
+    records = RecordsTable.from_manager(manager)
+    pets = PetsTable.from_manager(manager)
+    lines = [f"Продаж: {len(sales.time)}, записей клиники: {len(records.time)}, "
+             f"питомцев: {len(pets.age)}"]
+    lines += format_counts(f"Продажи по дням (последние {TOP})",
+                           count_by_day(sales.time)[-TOP:])
+    lines += format_counts(f"Продажи по владельцам (первые {TOP})",
+                           sales.owner.counts(TOP))
+    lines += format_counts("Продажи по породам", sales.breed.counts())
+    lines += format_counts(f"Записи клиники по дням (последние {TOP})",
+                           count_by_day(records.time)[-TOP:])
+    lines += format_counts("Записи клиники по видам", records.detail.counts())
+    if len(pets.age):
+        diseases = unpack_flags(pets.diseases, disease_seq)
+        vaccinations = unpack_flags(pets.vaccinations, vaccine_seq)
+        disease_names = [m.value for m in disease_seq.members]
+        vaccine_names = [m.value for m in vaccine_seq.members]
+        lines += format_table("Болезни по породам (доля питомцев)", pets.breed.labels,
+                              disease_names, shares(pets.breed, diseases))
+        ages = pets.age_groups()
+        lines += format_table("Болезни по возрасту (доля питомцев)", ages.labels,
+                              disease_names, shares(ages, diseases))
+        lines += format_table("Охват прививками по породам", pets.breed.labels,
+                              vaccine_names, shares(pets.breed, vaccinations))
+        lines.append("\nОхват прививками всего: " + ", ".join(
+            f"{name} {v:.0%}" for name, v in zip(vaccine_names, vaccinations.mean(axis=0))))
+    return "\n".join(lines)
@@ -0,0 +1,434 @@
+"""HTTP API для касс и киосков: владельцы, магазин, продажи и ветклиника.
+
+Сервер на asyncio без сторонних пакетов. Все клиенты работают с одним
+DataManager в памяти: обработчик запроса выполняется целиком под
+manager.transaction(), поэтому запросы не перемешиваются между собой.
+Сохранение объединяется: без --journal/--sqlite изменения пишутся
+фоновым сохранением (BackgroundSaver) после паузы --debounce секунд,
+в режиме журнала каждое изменение — одна дописанная строка.
+
+Владельцы и питомцы адресуются идентификаторами из Repository: они
+не меняются и не выдаются повторно, пока сервер запущен, в том числе
+после перезагрузки данных в общем режиме (--shared). Если объекта
+с выданным номером больше нет — ответ 409, список нужно запросить заново.
+
+Запуск: python api.py [--host 127.0.0.1] [--port 8080] [--journal|--shared|--sqlite ФАЙЛ]
+
+Запросы (тела и ответы — JSON в UTF-8):
+    GET  /owners?prefix=&offset=&limit=      владельцы
+    POST /owners                             {"name", "age", "gender"}
+    GET  /owners/ID                          владелец с питомцами
+    GET  /shop/pets?prefix=&type=&breed=&color=&offset=&limit=
+    POST /shop/pets                          {"type"|"breed", "name", "age", "gender", "color"}
+    GET  /pets/ID                            питомец с медкартой
+    POST /sales                              {"owner": ID, "pet": ID}
+    GET  /sales?from=дд.мм.гг&to=дд.мм.гг&offset=&limit=&archive=1
+    POST /pets/ID/treatments                 {"diseases": [...], "vaccinations": [...]}
+    GET  /records?pet=&from=&to=&offset=&limit=&archive=1
+
+С archive=1 продажи и записи читаются и из архива (--retention-days):
+архив идёт потоком, поэтому вместо total в ответе more — есть ли дальше.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import re
+import signal
+import sys
+import traceback
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from main import (STATS, ConflictError, DataManager, Disease, EnumTable, Owner,
+                  Pet, Repository, Vaccine, add_stats_arguments,
+                  add_storage_arguments, between, encode, enum_table,
+                  make_manager, parse_storage_args, row_to_pet, start_stats,
+                  validate_batch)
+
+STATUS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+MAX_BODY = 1 << 20
+MAX_HEADERS = 100
+# Сколько ждать следующего запроса по открытому соединению
+IDLE_TIMEOUT = 60.0
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+DISEASES = enum_table(Disease)
+VACCINES = enum_table(Vaccine)
+# Границы периода, если задан только один из from/to
+FIRST_DAY = datetime.fromtimestamp(0)
+LAST_DAY = datetime(9999, 12, 31)
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def pet_json(manager: DataManager, pet: Pet) -> dict:
+    owner = manager.index.owner_of(pet)
+    return {"id": manager.index.uid(pet),
+            "owner": manager.index.uid(owner) if owner else None,
+            **encode(pet)}
+
+
+def owner_json(manager: DataManager, owner: Owner, pets: bool = False) -> dict:
+    data = {"id": manager.index.uid(owner), "name": owner.name,
+            "age": owner.age, "gender": owner.gender}
+    if pets:
+        data["pets"] = [pet_json(manager, p) for p in owner.pets]
+    else:
+        data["pets"] = len(owner.pets)
+    return data
+
+
+def query_int(query: Dict[str, str], key: str, default: int,
+              max_val: Optional[int] = None) -> int:
+    value = query.get(key)
+    if value is None:
+        return default
+    if not value.isdigit():
+        raise HttpError(400, f"Параметр {key} должен быть неотрицательным числом.")
+    return min(int(value), max_val) if max_val is not None else int(value)
+
+
+def query_date(query: Dict[str, str], key: str) -> Optional[datetime]:
+    value = query.get(key)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%d.%m.%y")
+    except ValueError:
+        raise HttpError(400, f"Параметр {key}: дата в формате дд.мм.гг.") from None
+
+
+def query_period(query: Dict[str, str]) -> Optional[Tuple[datetime, datetime]]:
+    """Период из from/to (оба дня включительно); None — период не задан"""
+    start, end = query_date(query, "from"), query_date(query, "to")
+    if start is None and end is None:
+        return None
+    end = (end or LAST_DAY).replace(hour=23, minute=59, second=59)
+    return start or FIRST_DAY, end
+
+
+def page(items, query: Dict[str, str], convert=None) -> dict:
+    """Часть списка по offset/limit и общее число элементов"""
+    offset = query_int(query, "offset", 0)
+    limit = query_int(query, "limit", DEFAULT_LIMIT, MAX_LIMIT)
+    chunk = items[offset:offset + limit]
+    return {"total": len(items), "offset": offset,
+            "items": [convert(x) for x in chunk] if convert else list(chunk)}
+
+
+def stream_page(items: Iterator, query: Dict[str, str]) -> dict:
+    """Часть потока по offset/limit; more — есть ли элементы дальше"""
+    offset = query_int(query, "offset", 0)
+    limit = query_int(query, "limit", DEFAULT_LIMIT, MAX_LIMIT)
+    chunk = list(itertools.islice(items, offset, offset + limit + 1))
+    return {"offset": offset, "more": len(chunk) > limit, "items": chunk[:limit]}
+
+
+def id_field(body: dict, key: str) -> int:
+    value = body.get(key)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise HttpError(400, f"Поле {key} должно быть идентификатором (числом).")
+    return value
+
+
+def enum_values(body: dict, key: str, table: EnumTable) -> list:
+    values = body.get(key, [])
+    if not isinstance(values, list):
+        raise HttpError(400, f"Поле {key} должно быть списком.")
+    try:
+        return [table.parse(v) for v in values]
+    except ValueError as e:
+        raise HttpError(400, f"Поле {key}: {e}") from None
+
+
+class Api:
+    """Обработчики запросов. Каждый возвращает (статус, JSON-ответ)"""
+    ROUTES = (
+        (r"/owners", {"GET": "list_owners", "POST": "create_owner"}),
+        (r"/owners/(\d+)", {"GET": "get_owner"}),
+        (r"/shop/pets", {"GET": "list_shop", "POST": "create_shop_pet"}),
+        (r"/pets/(\d+)", {"GET": "get_pet"}),
+        (r"/pets/(\d+)/treatments", {"POST": "treat"}),
+        (r"/sales", {"GET": "list_sales", "POST": "create_sale"}),
+        (r"/records", {"GET": "list_records"}),
+    )
+
+    def __init__(self, manager: DataManager):
+        self.manager = manager
+        self.routes = [(re.compile(pattern), methods) for pattern, methods in self.ROUTES]
+
+    def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, object]:
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        for pattern, methods in self.routes:
+            m = pattern.fullmatch(url.path.rstrip("/") or "/")
+            if m is None:
+                continue
+            if method not in methods:
+                raise HttpError(405, f"Метод {method} не поддерживается для {url.path}.")
+            handler = getattr(self, methods[method])
+            args = [int(g) for g in m.groups()]
+            if method == "POST":
+                args.append(self.parse_body(body))
+            with STATS.phase(f"api.{methods[method]}"), self.manager.transaction():
+                return handler(query, *args)
+        raise HttpError(404, f"Нет такого адреса: {url.path}")
+
+    @staticmethod
+    def parse_body(body: bytes) -> dict:
+        try:
+            data = json.loads(body.decode("utf-8")) if body else {}
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(400, "Тело запроса — не JSON.") from None
+        if not isinstance(data, dict):
+            raise HttpError(400, "Тело запроса должно быть объектом JSON.")
+        return data
+
+    @staticmethod
+    def missing(index: Repository, uid: int, what: str) -> HttpError:
+        """404 для неизвестного номера; 409 — номер выдавался, но объекта
+        уже нет (удалён, изменён другим процессом или данные перезагружены)"""
+        if index.issued(uid):
+            return HttpError(409, f"{what} {uid} изменён или удалён, "
+                                  "обновите список.")
+        return HttpError(404, f"{what} {uid} не найден.")
+
+    def find_owner(self, uid: int) -> Owner:
+        index = self.manager.index
+        owner = index.owner(uid)
+        if owner is None:
+            raise self.missing(index, uid, "Владелец")
+        return owner
+
+    def find_pet(self, uid: int) -> Pet:
+        index = self.manager.index
+        pet = index.pet(uid)
+        if pet is None:
+            raise self.missing(index, uid, "Питомец")
+        return pet
+
+    @staticmethod
+    def validate(row: dict):
+        error = validate_batch([row])[0]
+        if error:
+            raise HttpError(400, error)
+
+    # Владельцы
+
+    def list_owners(self, query: dict):
+        owners = self.manager.index.filter_owners(query.get("prefix", ""))
+        return 200, page(owners, query, lambda o: owner_json(self.manager, o))
+
+    def create_owner(self, query: dict, body: dict):
+        row = {"kind": "owner", "name": body.get("name"), "age": body.get("age"),
+               "gender": body.get("gender")}
+        self.validate(row)
+        owner = Owner(str(row["name"]).strip(), int(str(row["age"]).strip()),
+                      str(row["gender"]).strip())
+        self.manager.add_owner(owner)
+        return 201, owner_json(self.manager, owner, pets=True)
+
+    def get_owner(self, query: dict, uid: int):
+        return 200, owner_json(self.manager, self.find_owner(uid), pets=True)
+
+    # Магазин и продажи
+
+    def list_shop(self, query: dict):
+        pets = self.manager.index.filter_pets(
+            query.get("prefix", ""), query.get("type"), query.get("breed"),
+            query.get("color"), owner=None)
+        return 200, page(pets, query, lambda p: pet_json(self.manager, p))
+
+    def create_shop_pet(self, query: dict, body: dict):
+        row = {**body, "kind": "pet", "owner": None}
+        self.validate(row)
+        pet = row_to_pet(row)
+        self.manager.add_shop_pet(pet)
+        return 201, pet_json(self.manager, pet)
+
+    def get_pet(self, query: dict, uid: int):
+        return 200, pet_json(self.manager, self.find_pet(uid))
+
+    def create_sale(self, query: dict, body: dict):
+        owner = self.find_owner(id_field(body, "owner"))
+        pet = self.find_pet(id_field(body, "pet"))
+        if self.manager.index.owner_of(pet) is not None:
+            raise HttpError(409, f"Питомец {pet.name} уже продан.")
+        rec = self.manager.sell_pet(owner, pet)
+        return 201, {"sale": rec, "pet": pet_json(self.manager, pet)}
+
+    def list_sales(self, query: dict):
+        period = query_period(query)
+        if query.get("archive") == "1":
+            return 200, stream_page(self.manager.history("sales", *(period or ())), query)
+        if period:
+            sales = self.manager.index.sales_between(*period)
+        else:
+            sales = self.manager.petshop.sales
+        return 200, page(sales, query)
+
+    # Ветклиника
+
+    def treat(self, query: dict, uid: int, body: dict):
+        """Неинтерактивный приём: болезни и прививки одним визитом"""
+        pet = self.find_pet(uid)
+        diseases = enum_values(body, "diseases", DISEASES)
+        vaccines = enum_values(body, "vaccinations", VACCINES)
+        if not diseases and not vaccines:
+            raise HttpError(400, "Укажите diseases и/или vaccinations.")
+        owner = self.manager.index.owner_of(pet)
+        if owner is None:
+            raise HttpError(409, f"Питомец {pet.name} в магазине: лечение — "
+                                 "только для питомцев владельцев.")
+        records = self.manager.treat(owner, pet, diseases, vaccines)
+        return 201, {"records": records, "medical_card": encode(pet.medical_card)}
+
+    def list_records(self, query: dict):
+        period = query_period(query)
+        if query.get("archive") == "1":
+            records = self.manager.history("records", *(period or ()))
+            if "pet" in query:
+                records = (r for r in records if r["pet_name"] == query["pet"])
+            return 200, stream_page(records, query)
+        index = self.manager.index
+        if "pet" in query:
+            records = index.records_of_pet(query["pet"])
+            if period:
+                records = between(records, *period)
+        elif period:
+            records = index.records_between(*period)
+        else:
+            records = self.manager.vetclinic.records
+        return 200, page(records, query)
+
+    # HTTP
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Соединение клиента: запросы по очереди, пока клиент держит
+        соединение открытым (HTTP/1.1 keep-alive)"""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT)
+                except HttpError as e:
+                    writer.write(response(e.status, {"error": e.message}, False))
+                    break
+                if request is None:
+                    break
+                method, target, keep_alive, body = request
+                try:
+                    status, payload = self.dispatch(method, target, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                except ConflictError as e:
+                    status, payload = 409, {"error": str(e)}
+                except Exception as e:
+                    traceback.print_exc()
+                    status, payload = 500, {"error": f"Внутренняя ошибка: {e}"}
+                writer.write(response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def read_request(reader: asyncio.StreamReader
+                       ) -> Optional[Tuple[str, str, bool, bytes]]:
+    """(метод, адрес, оставить ли соединение, тело); None — клиент закрыл
+    соединение"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Неверная строка запроса.") from None
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HttpError(400, "Слишком много заголовков.")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Неверный Content-Length.") from None
+    if length > MAX_BODY:
+        raise HttpError(413, "Слишком большое тело запроса.")
+    body = await reader.readexactly(length) if length > 0 else b""
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection == "keep-alive" or (
+        version == "HTTP/1.1" and connection != "close")
+    return method.upper(), target, keep_alive, body
+
+
+def response(status: int, payload, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def serve(api: Api, host: str, port: int):
+    """Принимает соединения до SIGTERM/SIGINT"""
+    server = await asyncio.start_server(api.handle, host, port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    host, port = server.sockets[0].getsockname()[:2]
+    print(f"API: http://{host}:{port}", flush=True)
+    async with server:
+        await stop.wait()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="api.py",
+                                     description="HTTP API учёта домашних животных")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080,
+                        help="порт (0 — любой свободный)")
+    parser.add_argument("--debounce", type=float, default=1.0, metavar="SEC",
+                        help="пауза в изменениях перед фоновым сохранением "
+                             "(без --journal, --shared и --sqlite)")
+    add_storage_arguments(parser)
+    add_stats_arguments(parser)
+    args = parse_storage_args(parser, argv)
+    start_stats(args)
+    manager = make_manager(args, args.debounce)
+    try:
+        asyncio.run(serve(Api(manager), args.host, args.port))
+    finally:
+        manager.close()
+        print("API остановлен, данные сохранены.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Скорость отчётов analytics.report на больших данных (нужен numpy).
+
+Запуск из корня проекта: python benchmarks/analytics_report.py [N]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+from main import DISEASE_SEQ, VACCINE_SEQ, Disease  # noqa: E402
+from serialize import build  # noqa: E402
+
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    manager = build(n)
+    # Каждому питомцу владельца — продажа и запись клиники
+    for i, o in enumerate(manager.owners):
+        for p in o.pets:
+            date = f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.25 12:00:00"
+            manager.petshop.sales.append(
+                {"owner_name": o.name, "pet_name": p.name, "date": date})
+            manager.vetclinic.records.append(
+                {"pet_name": p.name, "type": "Болезнь",
+                 "detail": Disease.ALLERGY.value, "date": date})
+    print(f"питомцев: {n}, продаж и записей: {len(manager.petshop.sales)}")
+    start = time.perf_counter()
+    analytics.report(manager, VACCINE_SEQ, DISEASE_SEQ)
+    print(f"отчёты: {time.perf_counter() - start:.3f} с")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,173 @@
+"""Нагрузочная проверка HTTP API (api.py): пропускная способность и задержки.
+
+Скрипт готовит данные во временном каталоге, запускает сервер отдельным
+процессом и открывает CLIENTS соединений (keep-alive). Каждый клиент шлёт
+REQUESTS запросов вперемешку: список магазина, продажа случайного питомца,
+лечение купленного питомца, карточка владельца. Продажа уже проданного
+питомца (409) — нормальный исход гонки между кассами. В конце сервер
+останавливается по SIGTERM и проверяется, что сохранены все продажи.
+
+Запуск из корня проекта:
+    python benchmarks/api_load.py [--clients 32] [--requests 500] [-- параметры api.py]
+например: python benchmarks/api_load.py -- --journal
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from main import (Cat, Color, DataManager, Gender, Owner, make_manager,  # noqa: E402
+                  parse_args)
+
+# Доли запросов по видам
+MIX = (("shop", 0.4), ("sale", 0.3), ("treat", 0.2), ("owner", 0.1))
+
+
+def seed(owners: int, pets: int):
+    manager = DataManager(xml_mode="off")
+    for i in range(owners):
+        manager.owners.append(Owner(f"Владелец{i}", 30, Gender.MALE.value))
+    for i in range(pets):
+        manager.petshop.available_pets.append(
+            Cat(f"Мурка{i}", i % 15, Gender.FEMALE.value, Color.GRAY.value, None))
+    manager.save_all()
+
+
+class Client:
+    """Одно соединение HTTP/1.1 с сервером"""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    @classmethod
+    async def connect(cls, port: int) -> "Client":
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    async def request(self, method: str, path: str, body=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                          f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+
+async def run_client(port: int, requests: int, n: int, owner_ids, pet_ids,
+                     times, statuses):
+    rng = random.Random(n)
+    client = await Client.connect(port)
+    bought = []
+    kinds, weights = zip(*MIX)
+    try:
+        for _ in range(requests):
+            kind = rng.choices(kinds, weights)[0]
+            if kind == "treat" and not bought:
+                kind = "sale"
+            start = time.perf_counter()
+            if kind == "shop":
+                status, _ = await client.request(
+                    "GET", f"/shop/pets?limit=20&offset={rng.randrange(100)}")
+            elif kind == "sale":
+                status, data = await client.request(
+                    "POST", "/sales", {"owner": rng.choice(owner_ids),
+                                       "pet": rng.choice(pet_ids)})
+                if status == 201:
+                    bought.append(data["pet"]["id"])
+            elif kind == "treat":
+                status, _ = await client.request(
+                    "POST", f"/pets/{rng.choice(bought)}/treatments",
+                    {"vaccinations": ["Общая вакцина"]})
+            else:
+                status, _ = await client.request("GET", f"/owners/{rng.choice(owner_ids)}")
+            times[kind].append(time.perf_counter() - start)
+            statuses[kind, status] += 1
+    finally:
+        client.close()
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+async def load(port: int, clients: int, requests: int):
+    """Задержки по видам запросов, число ответов по (вид, статус), время"""
+    client = await Client.connect(port)
+    _, owners = await client.request("GET", "/owners?limit=1000")
+    _, shop = await client.request("GET", "/shop/pets?limit=1000")
+    client.close()
+    owner_ids = [o["id"] for o in owners["items"]]
+    pet_ids = [p["id"] for p in shop["items"]]
+    times, statuses = defaultdict(list), Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(port, requests, n, owner_ids, pet_ids,
+                                      times, statuses)
+                           for n in range(clients)))
+    return times, statuses, time.perf_counter() - start
+
+
+def main_bench():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("server_args", nargs="*", help="параметры api.py")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        seed(50, 1000)
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "api.py"), "--port", "0",
+             "--xml", "off", *args.server_args],
+            cwd=tmp, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline().rsplit(":", 1)[1])
+            times, statuses, elapsed = asyncio.run(
+                load(port, args.clients, args.requests))
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        total = sum(statuses.values())
+        print(f"клиентов: {args.clients}, запросов: {total}, {elapsed:.2f} с, "
+              f"{total / elapsed:.0f} запросов/с")
+        print("запрос   кол-во   p50 мс   p95 мс   p99 мс")
+        for kind, _ in MIX:
+            t = times.get(kind)
+            if t:
+                print(f"{kind:8} {len(t):6} {percentile(t, 0.5):8.2f} "
+                      f"{percentile(t, 0.95):8.2f} {percentile(t, 0.99):8.2f}")
+        print("ответы:", ", ".join(f"{kind} {status}: {n}"
+                                   for (kind, status), n in sorted(statuses.items())))
+
+        check = make_manager(parse_args(args.server_args))
+        sold = statuses["sale", 201]
+        ok = (len(check.petshop.sales) == sold
+              and sum(len(o.pets) for o in check.owners) == sold)
+        print("проверка сохранения:", "OK" if ok else "ОШИБКА")
+        check.close(save=False)
+        os.chdir(ROOT)
+    sys.exit(0 if ok and server.returncode == 0 else 1)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,83 @@
+"""Нагрузочная проверка общего режима: N процессов одновременно продают
+питомцев из одного магазина (DataManager(shared=True)).
+
+Каждый процесс, как оператор за терминалом, выбирает питомца по своей
+(возможно, устаревшей) копии данных; если питомца уже продал другой
+процесс, продажа отклоняется (ConflictError) и повторяется. В конце
+проверяется, что ни одна продажа не потеряна и ни один питомец не продан
+дважды.
+
+Запуск из корня проекта: python benchmarks/concurrent_sales.py [N] [ПРОДАЖ]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (Cat, Color, ConflictError, DataManager, Gender,  # noqa: E402
+                  Owner)
+
+
+def seed(owners: int, pets: int):
+    manager = DataManager(xml_mode="off")
+    for i in range(owners):
+        manager.owners.append(Owner(f"Владелец{i}", 30, Gender.MALE.value))
+    for i in range(pets):
+        manager.petshop.available_pets.append(
+            Cat(f"Мурка{i}", i % 15, Gender.FEMALE.value, Color.GRAY.value, None))
+    manager.save_all()
+
+
+def worker(args) -> tuple:
+    workdir, sales, n = args
+    os.chdir(workdir)
+    rng = random.Random(n)
+    manager = DataManager(shared=True, xml_mode="off")
+    manager.load_all()
+    done = conflicts = 0
+    while done < sales:
+        pet = rng.choice(manager.petshop.available_pets)
+        owner = rng.choice(manager.owners)
+        try:
+            manager.sell_pet(owner, pet)
+            done += 1
+        except ConflictError:
+            conflicts += 1
+    manager.close()
+    return done, conflicts
+
+
+def main_bench():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    sales = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    owners, pets = 50, processes * sales * 2
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        seed(owners, pets)
+        ctx = multiprocessing.get_context("spawn")
+        start = time.perf_counter()
+        with ctx.Pool(processes) as pool:
+            results = pool.map(worker, [(tmp, sales, n) for n in range(processes)])
+        elapsed = time.perf_counter() - start
+
+        check = DataManager(shared=True, xml_mode="off")
+        check.load_all()
+        total = sum(done for done, _ in results)
+        conflicts = sum(c for _, c in results)
+        sold = [s["pet_name"] for s in check.petshop.sales]
+        owned = sum(len(o.pets) for o in check.owners)
+        ok = (len(sold) == total == owned and len(set(sold)) == total
+              and len(check.petshop.available_pets) == pets - total)
+        print(f"процессов: {processes}, продаж: {total}, отклонено: {conflicts}, "
+              f"{elapsed:.2f} с ({total / elapsed:.0f} продаж/с)")
+        print("проверка:", "OK" if ok else "ОШИБКА")
+        os.chdir(os.path.dirname(tmp))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,111 @@
+"""Память на одного питомца (Dog/Cat с паспортом и медкартой): текущие
+модели (slots и упакованные EnumSeq списки) против прежних — обычных
+dataclass со списками строк в медкарте (копия классов до перехода).
+
+Запуск из корня проекта: python benchmarks/memory_models.py [N]
+"""
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Cat, CatBreed, Color, Disease, Dog, DogBreed, Gender, Vaccine  # noqa: E402
+
+
+# Прежние модели — для сравнения «до/после»
+
+@dataclass
+class OldPassport:
+    pet_name: str
+    age: int
+    color: str
+    gender: str
+    breed: str
+    birth_date: str = field(
+        default_factory=lambda: datetime.now().strftime("%d.%m.%y"))
+
+
+@dataclass
+class OldMedicalCard:
+    pet_name: str
+    vaccinations: List[str] = field(default_factory=list)
+    diseases: List[str] = field(default_factory=list)
+
+    def add_vaccination(self, vaccine: Vaccine):
+        if vaccine.value not in self.vaccinations:
+            self.vaccinations.append(vaccine.value)
+
+    def add_disease(self, disease: Disease):
+        if disease.value not in self.diseases:
+            self.diseases.append(disease.value)
+
+
+@dataclass
+class OldPet:
+    name: str
+    age: int
+    gender: str
+    color: str
+    breed: Optional[str] = None
+    passport: Optional[OldPassport] = None
+    medical_card: OldMedicalCard = field(init=False)
+
+    def __post_init__(self):
+        self.medical_card = OldMedicalCard(self.name)
+        self.passport = OldPassport(
+            self.name, self.age, self.color, self.gender, self.breed)
+
+
+@dataclass
+class OldDog(OldPet):
+    pass
+
+
+@dataclass
+class OldCat(OldPet):
+    pass
+
+
+def build(n: int, dog=Dog, cat=Cat) -> list:
+    pets = []
+    for i in range(n):
+        if i % 2:
+            pet = dog(f"Рекс{i}", i % 15, Gender.MALE.value,
+                      Color.BLACK.value, DogBreed.HUSKY.value)
+        else:
+            pet = cat(f"Мурка{i}", i % 15, Gender.FEMALE.value,
+                      Color.GRAY.value, CatBreed.SPHINX.value)
+        pet.medical_card.add_vaccination(Vaccine.FLU_SHOT)
+        pet.medical_card.add_vaccination(Vaccine.GENERAL_SHOT)
+        pet.medical_card.add_disease(Disease.ALLERGY)
+        pets.append(pet)
+    return pets
+
+
+def measure(n: int, dog, cat):
+    """(байт сейчас, байт в пике) на построение n питомцев"""
+    tracemalloc.start()
+    pets = build(n, dog, cat)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del pets
+    return current, peak
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"питомцев: {n}")
+    results = {}
+    for title, dog, cat in (("было", OldDog, OldCat), ("стало", Dog, Cat)):
+        current, peak = results[title] = measure(n, dog, cat)
+        print(f"{title:>5}: всего {current / 2 ** 20:.1f} МБ, пик {peak / 2 ** 20:.1f} МБ, "
+              f"на питомца {current / n:.0f} байт")
+    print(f"экономия: {1 - results['стало'][0] / results['было'][0]:.0%}")
+
+
+if __name__ == "__main__":
+    main()
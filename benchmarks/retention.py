@@ -0,0 +1,75 @@
+"""Архив истории (--retention-days): сохранение и загрузка до и после
+переноса старых продаж и записей клиники в archive/, размер архива и
+время потокового чтения истории из него.
+
+Данные — как в suite.py: владельцы, магазин и EVENTS продаж и записей
+клиники за год; в текущих данных остаётся последний месяц.
+
+Запуск из корня проекта: python benchmarks/retention.py [EVENTS]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import DataManager  # noqa: E402
+from suite import START_TS, generate  # noqa: E402
+
+KEEP_DAYS = 30
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def size_mb(*paths: str) -> float:
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            total += sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total / 2 ** 20
+
+
+def save_load(manager: DataManager) -> str:
+    save = timed(manager.save_all)
+    load = timed(DataManager(xml_mode="off").load_all)
+    return (f"data.json {size_mb(DataManager.JSON_FILE):6.1f} МБ, "
+            f"сохранение {save:.3f} с, загрузка {load:.3f} с")
+
+
+def main_bench():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        manager = generate(1000, 2, events)
+        print(f"продаж и записей: по {events}")
+        print(f"без архива:    {save_load(manager)}")
+        year_end = datetime.fromtimestamp(START_TS) + timedelta(days=365)
+        start = time.perf_counter()
+        sales, records = manager.archive(year_end - timedelta(days=KEEP_DAYS))
+        print(f"перенос в архив {sales} продаж и {records} записей: "
+              f"{time.perf_counter() - start:.3f} с, архив "
+              f"{size_mb(DataManager.ARCHIVE_DIR):.1f} МБ")
+        print(f"с архивом:     {save_load(manager)}")
+        start = time.perf_counter()
+        count = sum(1 for _ in manager.history("sales"))
+        print(f"вся история продаж потоком: {time.perf_counter() - start:.3f} с "
+              f"({count} записей)")
+        month = datetime.fromtimestamp(START_TS) + timedelta(days=100)
+        period = timed(lambda: sum(1 for _ in manager.history(
+            "records", month, month + timedelta(days=30))))
+        print(f"записи клиники за месяц из архива: {period:.3f} с")
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,64 @@
+"""Скорость сериализации: кодеки против dataclasses.asdict и полный save_all.
+
+Запуск из корня проекта: python benchmarks/serialize.py [N]
+"""
+import os
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (Cat, CatBreed, Color, DataManager, Disease, Dog,  # noqa: E402
+                  DogBreed, Gender, Owner, Vaccine, encode)
+
+
+def build(n: int) -> DataManager:
+    """n питомцев: половина у владельцев (по одному), половина в магазине"""
+    manager = DataManager()
+    for i in range(n):
+        if i % 2:
+            pet = Dog(f"Рекс{i}", i % 15, Gender.MALE.value,
+                      Color.BLACK.value, DogBreed.HUSKY.value)
+        else:
+            pet = Cat(f"Мурка{i}", i % 15, Gender.FEMALE.value,
+                      Color.GRAY.value, CatBreed.SPHINX.value)
+        pet.medical_card.add_vaccination(Vaccine.FLU_SHOT)
+        pet.medical_card.add_disease(Disease.ALLERGY)
+        if i % 2:
+            manager.owners.append(Owner(f"Владелец{i}", 30, Gender.MALE.value, [pet]))
+        else:
+            manager.petshop.available_pets.append(pet)
+    return manager
+
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    fn()
+    print(f"{label}: {time.perf_counter() - start:.3f} с")
+
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    manager = build(n)
+    pets = [p for o in manager.owners for p in o.pets] + \
+        list(manager.petshop.available_pets)
+    print(f"питомцев: {len(pets)}")
+    timed("asdict", lambda: [asdict(p) for p in pets])
+    timed("encode", lambda: [encode(p) for p in pets])
+    timed("build_payload", manager.build_payload)
+    with tempfile.TemporaryDirectory() as tmp:
+        manager.JSON_FILE = os.path.join(tmp, "data.json")
+        manager.XML_FILE = os.path.join(tmp, "data.xml")
+        for mode in DataManager.XML_MODES:
+            manager.xml_mode = mode
+            if mode == "parallel":
+                # запуск процесса не входит в замер
+                manager.xml_pool().submit(int).result()
+            timed(f"save_all (xml={mode})", manager.save_all)
+        manager.xml_pool().shutdown()
+
+
+if __name__ == "__main__":
+    main_bench()
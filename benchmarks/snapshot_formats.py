@@ -0,0 +1,43 @@
+"""Размер и скорость снимка: data.json против двоичного data.bin.
+
+Запуск из корня проекта: python benchmarks/snapshot_formats.py [N]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import DataManager  # noqa: E402
+from serialize import build  # noqa: E402
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    source = build(n)
+    print(f"питомцев: {n}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in DataManager.FORMATS:
+            source.snapshot_format = fmt
+            source.xml_mode = "off"
+            source.JSON_FILE = os.path.join(tmp, "data.json")
+            source.BIN_FILE = os.path.join(tmp, "data.bin")
+            save = timed(source.save_all)
+            path = source.BIN_FILE if fmt == "binary" else source.JSON_FILE
+            target = DataManager(snapshot_format=fmt)
+            target.JSON_FILE, target.BIN_FILE = source.JSON_FILE, source.BIN_FILE
+            load = timed(target.load_all)
+            print(f"{fmt:>6}: {os.path.getsize(path) / 2 ** 20:6.1f} МБ, "
+                  f"сохранение {save:.3f} с, загрузка {load:.3f} с")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,260 @@
+"""Замеры горячих путей на нескольких масштабах данных: сохранение JSON
+и XML (по отдельности), загрузка, продажа, лечение, списки и поиск.
+
+Данные генерируются: N владельцев по M питомцев, столько же питомцев
+в магазине и K продаж и K записей клиники. Для каждого замера берётся
+лучшее время из --repeat прогонов на свежих данных и отдельным прогоном
+под tracemalloc — пик памяти, выделенной самой операцией (трассировка
+замедляет код, поэтому во время замера времени она выключена).
+
+disk_delta_kb — на сколько операция изменила размер файлов данных.
+Результаты — JSON Lines, по строке на замер (stdout или --output),
+таблица — в stderr. С --compare BASE.jsonl показывается изменение
+относительно прошлого прогона; с --max-slowdown скрипт завершается
+с кодом 1, если какой-то замер замедлился сильнее.
+
+Запуск из корня проекта:
+    python benchmarks/suite.py [--scales 100x2x100,1000x2x1000] [--only save_json,load]
+                               [--repeat 3] [--output new.jsonl]
+                               [--compare base.jsonl --max-slowdown 1.2]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (SPECIES, Color, DataManager, Disease, Gender,  # noqa: E402
+                  Owner, Vaccine, show_numbered, show_owner_line)
+
+DEFAULT_SCALES = "100x2x100,1000x2x1000,10000x2x10000"
+# Продаж и визитов в клинику за один замер (не больше питомцев в магазине)
+OPS = 500
+DAY = 24 * 3600
+START_TS = int(time.mktime((2025, 1, 1, 9, 0, 0, 0, 0, -1)))
+
+
+def parse_scale(text: str) -> Tuple[int, int, int]:
+    owners, per_owner, events = (int(x) for x in text.lower().split("x"))
+    return owners, per_owner, events
+
+
+def make_pet(rng: random.Random, i: int):
+    tag, species = rng.choice(list(SPECIES.items()))
+    breeds = [None, *(b.value for b in species.breeds)]
+    pet = species.cls(f"{tag}{i}", rng.randrange(15),
+                      rng.choice(list(Gender)).value, rng.choice(list(Color)).value,
+                      rng.choice(breeds))
+    for v in rng.sample(list(Vaccine), rng.randrange(len(Vaccine) + 1)):
+        pet.medical_card.add_vaccination(v)
+    for d in rng.sample(list(Disease), rng.randrange(len(Disease) + 1)):
+        pet.medical_card.add_disease(d)
+    return pet
+
+
+def generate(owners: int, per_owner: int, events: int, seed: int = 0) -> DataManager:
+    """Детерминированные данные: владельцы с питомцами, магазин
+    такого же размера, events продаж и events записей клиники за год"""
+    rng = random.Random(seed)
+    manager = DataManager(xml_mode="off")
+    n = 0
+    for i in range(owners):
+        pets = []
+        for _ in range(per_owner):
+            pets.append(make_pet(rng, n))
+            n += 1
+        manager.owners.append(Owner(f"Владелец{i}", 18 + i % 60,
+                                    rng.choice(list(Gender)).value, pets))
+    for _ in range(owners * per_owner):
+        manager.petshop.available_pets.append(make_pet(rng, n))
+        n += 1
+    step = 365 * DAY // max(events, 1)
+    for i in range(events):
+        ts = START_TS + i * step
+        date = time.strftime("%d.%m.%y %H:%M:%S", time.localtime(ts))
+        owner = manager.owners[i % owners] if owners else None
+        pet = owner.pets[i % per_owner] if owner and per_owner else None
+        pet_name = pet.name if pet else f"Питомец{i}"
+        manager.petshop.sales.append({"owner_name": owner.name if owner else "",
+                                      "pet_name": pet_name, "date": date, "ts": ts})
+        detail = rng.choice(list(Disease) + list(Vaccine))
+        manager.vetclinic.records.append({
+            "pet_name": pet_name,
+            "type": "Болезнь" if isinstance(detail, Disease) else "Вакцина",
+            "detail": detail.value, "date": date, "ts": ts})
+    return manager
+
+
+# Замеры: функция получает свежие данные в текущем каталоге и возвращает
+# (операция, число повторов действия внутри неё)
+
+def bench_save_json(manager: DataManager):
+    return manager.save_all, 1
+
+
+def bench_save_xml(manager: DataManager):
+    return manager.save_xml, 1
+
+
+def bench_load(manager: DataManager):
+    manager.save_all()
+    return DataManager(xml_mode="off").load_all, 1
+
+
+def journal_manager(manager: DataManager) -> DataManager:
+    """Те же данные в режиме журнала, без компакции во время замера"""
+    manager.journal = True
+    manager.COMPACT_EVERY = float("inf")
+    manager.save_all()
+    return manager
+
+
+def bench_sell(manager: DataManager):
+    manager = journal_manager(manager)
+    rng = random.Random(1)
+    pets = rng.sample(manager.petshop.available_pets,
+                      min(OPS, len(manager.petshop.available_pets)))
+    owners = [rng.choice(manager.owners) for _ in pets]
+
+    def run():
+        for owner, pet in zip(owners, pets):
+            manager.sell_pet(owner, pet)
+    return run, len(pets)
+
+
+def bench_treat(manager: DataManager):
+    manager = journal_manager(manager)
+    rng = random.Random(2)
+    visits = [(o, rng.choice(o.pets)) for o in rng.choices(
+        [o for o in manager.owners if o.pets], k=OPS)]
+    def run():
+        for owner, pet in visits:
+            manager.treat(owner, pet, [], [Vaccine.GENERAL_SHOT])
+    return run, len(visits)
+
+
+def bench_list(manager: DataManager):
+    """Полный просмотр списков владельцев и магазина, как в меню"""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i, o in enumerate(manager.owners):
+                show_owner_line(i, o)
+            for i, p in enumerate(manager.petshop.available_pets):
+                show_numbered(i, p)
+    return run, 1
+
+
+def bench_search(manager: DataManager):
+    """Поиск по индексу (индекс строится до замера)"""
+    index = manager.index
+
+    def run():
+        index.filter_owners("Владелец1")
+        index.filter_pets("Cat", color=Color.GRAY.value, owner=None)
+    return run, 1
+
+
+BENCHES: Dict[str, Callable] = {
+    "save_json": bench_save_json,
+    "save_xml": bench_save_xml,
+    "load": bench_load,
+    "sell": bench_sell,
+    "treat": bench_treat,
+    "list": bench_list,
+    "search": bench_search,
+}
+
+
+def disk_usage(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def measure(name: str, scale: Tuple[int, int, int], repeat: int) -> dict:
+    best, ops = float("inf"), 1
+    for i in range(repeat + 1):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            fn, ops = BENCHES[name](generate(*scale))
+            before = disk_usage(tmp)
+            gc.collect()
+            if i < repeat:
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            else:
+                tracemalloc.start()
+                fn()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            written = disk_usage(tmp) - before
+            os.chdir(os.path.dirname(tmp))
+    owners, per_owner, events = scale
+    return {"bench": name, "scale": "x".join(map(str, scale)),
+            "owners": owners, "pets_per_owner": per_owner, "events": events,
+            "ops": ops, "seconds": round(best, 6),
+            "us_per_op": round(best / ops * 1e6, 2),
+            "peak_kb": round(peak / 1024, 1), "disk_delta_kb": round(written / 1024, 1),
+            "python": platform.python_version()}
+
+
+def load_baseline(path: str) -> Dict[Tuple[str, str], dict]:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return {(r["bench"], r["scale"]): r for r in rows}
+
+
+def main_bench(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Замеры горячих путей")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help="масштабы через запятую: владельцы x питомцев у владельца "
+                             "x продаж и записей")
+    parser.add_argument("--only", help="замеры через запятую: " + ",".join(BENCHES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="файл JSON Lines (по умолчанию stdout)")
+    parser.add_argument("--compare", metavar="BASE", help="прошлые результаты JSON Lines")
+    parser.add_argument("--max-slowdown", type=float, metavar="X",
+                        help="код 1, если замер медленнее BASE больше чем в X раз")
+    args = parser.parse_args(argv)
+    names = args.only.split(",") if args.only else list(BENCHES)
+    unknown = [n for n in names if n not in BENCHES]
+    if unknown:
+        parser.error(f"неизвестные замеры: {', '.join(unknown)}")
+    baseline = load_baseline(args.compare) if args.compare else {}
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    cwd, slow = os.getcwd(), []
+    print(f"{'замер':10} {'масштаб':>16} {'с':>9} {'мкс/оп':>10} {'пик КБ':>10} "
+          f"{'к базе':>7}", file=sys.stderr)
+    try:
+        for scale in map(parse_scale, args.scales.split(",")):
+            for name in names:
+                row = measure(name, scale, max(1, args.repeat))
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                out.flush()
+                base = baseline.get((name, row["scale"]))
+                ratio = row["seconds"] / base["seconds"] if base and base["seconds"] else None
+                if ratio and args.max_slowdown and ratio > args.max_slowdown:
+                    slow.append(f"{name} {row['scale']}: x{ratio:.2f}")
+                print(f"{name:10} {row['scale']:>16} {row['seconds']:9.4f} "
+                      f"{row['us_per_op']:10.1f} {row['peak_kb']:10.0f} "
+                      f"{f'x{ratio:.2f}' if ratio else '':>7}", file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        if out is not sys.stdout:
+            out.close()
+    if slow:
+        print("Замедление сверх --max-slowdown: " + "; ".join(slow), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,133 @@
+"""Микрозамеры проверки ввода и таблиц перечислений: как было (список
+членов и текст меню на каждый вызов, Enum(value), перебор упакованной
+медкарты) и через EnumTable / запомненные наборы EnumSeq.
+
+Запуск из корня проекта: python benchmarks/validation.py [N]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (DISEASE_SEQ, NAME_RE, VACCINE_SEQ, Color, Disease,  # noqa: E402
+                  EnumSeq, Gender, Vaccine, check_name, enum_table,
+                  validate_batch)
+
+NAMES = ["Мурка", "Барсик", "шарик", "Рекс-2", "Анна Мария", ""]
+
+
+def per_op(fn, n: int) -> float:
+    """Микросекунд на вызов fn() (лучшее из трёх)"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / n * 1e6
+
+
+def old_check_name(name: str):
+    if not name:
+        return "Имя не может быть пустым."
+    if not re.match(r'^[A-ЯA-Z][а-яa-zA-Z\- ]*$', name):
+        return "Имя должно начинаться с заглавной буквы"
+    return None
+
+
+def old_choose(enum_class, text: str):
+    """Прежний choose_enum без ввода-вывода: меню и выбор по номеру"""
+    values = list(enum_class)
+    "\n".join(f"{i}. {item.value}" for i, item in enumerate(values, 1))
+    text = text.strip()
+    if text.isdigit():
+        idx = int(text)
+        if 1 <= idx <= len(values):
+            return values[idx - 1]
+    return None
+
+
+def new_choose(enum_class, text: str):
+    table = enum_table(enum_class)
+    table.menu
+    return table.choice(text)
+
+
+def old_unpack(seq: EnumSeq, packed: int) -> list:
+    values = []
+    while packed:
+        values.append(seq.members[(packed & seq.mask) - 1].value)
+        packed >>= seq.bits
+    return values
+
+
+def old_add(seq: EnumSeq, packed: int, value: str) -> int:
+    code = seq.codes[value]
+    shift = 0
+    rest = packed
+    while rest:
+        if rest & seq.mask == code:
+            return packed
+        rest >>= seq.bits
+        shift += seq.bits
+    return packed | (code << shift)
+
+
+def rows(n: int, rng: random.Random) -> list:
+    return [{"kind": "pet", "type": "Cat", "name": rng.choice(NAMES), "age": str(i % 20),
+             "gender": rng.choice(list(Gender)).value, "color": rng.choice(list(Color)).value}
+            for i in range(n)]
+
+
+def main_bench():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(0)
+    names = [rng.choice(NAMES) for _ in range(n)]
+    colors = [rng.choice(list(Color)).value for _ in range(n)]
+    numbers = [str(rng.randrange(1, 7)) for _ in range(n)]
+    cards = [VACCINE_SEQ.pack(rng.sample([v.value for v in Vaccine], rng.randrange(4)))
+             for _ in range(n)]
+    shot = Vaccine.GENERAL_SHOT.value
+    color_table = enum_table(Color)
+    batch = rows(1000, rng)
+
+    def each(items, fn):
+        """fn по очереди для элементов items (по кругу)"""
+        pos = [0]
+
+        def call():
+            i = pos[0]
+            pos[0] = i + 1 if i + 1 < len(items) else 0
+            return fn(items[i])
+        return call
+
+    cases = [
+        ("имя", each(names, old_check_name), each(names, check_name)),
+        ("имя, только regex", each(names, lambda s: re.match(
+            r'^[A-ЯA-Z][а-яa-zA-Z\- ]*$', s)), each(names, NAME_RE.match)),
+        ("меню + выбор номера", each(numbers, lambda t: old_choose(Color, t)),
+         each(numbers, lambda t: new_choose(Color, t))),
+        ("значение → член", each(colors, Color), each(colors, color_table.parse)),
+        ("медкарта: разбор", each(cards, lambda p: old_unpack(VACCINE_SEQ, p)),
+         each(cards, VACCINE_SEQ.unpack)),
+        ("медкарта: есть ли", each(cards, lambda p: shot in old_unpack(VACCINE_SEQ, p)),
+         each(cards, lambda p: VACCINE_SEQ.has(p, shot))),
+        ("медкарта: добавить", each(cards, lambda p: old_add(VACCINE_SEQ, p, shot)),
+         each(cards, lambda p: VACCINE_SEQ.add(p, shot))),
+    ]
+    print(f"вызовов: {n}")
+    print(f"{'операция':22} {'было мкс':>9} {'стало мкс':>10} {'быстрее':>8}")
+    for title, old, new in cases:
+        before, after = per_op(old, n), per_op(new, n)
+        print(f"{title:22} {before:9.3f} {after:10.3f} {before / after:7.1f}x")
+    pack = DISEASE_SEQ.pack([d.value for d in Disease])
+    assert old_unpack(DISEASE_SEQ, pack) == DISEASE_SEQ.unpack(pack)
+    batch_us = per_op(lambda: validate_batch(batch), max(1, n // 1000))
+    print(f"validate_batch: {batch_us / len(batch):.3f} мкс на строку")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -1,12 +1,40 @@
+import argparse
+import atexit
+import bisect
+import cProfile
+import csv
+import gzip
+import io
+import itertools
 import json
+import mmap
+import multiprocessing
 import os
+import pstats
 import re
-from dataclasses import dataclass, field, asdict
-from datetime import datetime
+import shlex
+import signal
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict, defaultdict, deque
+from collections.abc import MutableSequence, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta
 from enum import Enum
-from typing import List, Optional
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from itertools import accumulate
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 
 class Gender(Enum):
@@ -52,8 +80,206 @@ class Vaccine(Enum):
     GENERAL_SHOT = "Общая вакцина"
 
 
-@dataclass
-class Passport:
+class EnumTable:
+    """Готовые таблицы перечисления для разбора ввода — в меню, пакетной
+    загрузке, командах и API: значение → член, номер в меню (строкой,
+    с 1) → член и текст меню"""
+
+    def __init__(self, enum_class):
+        self.members = tuple(enum_class)
+        self.by_value = {m.value: m for m in self.members}
+        self.by_number = {str(i): m for i, m in enumerate(self.members, 1)}
+        self.values = frozenset(self.by_value)
+        self.menu = "\n".join(f"{i}. {m.value}" for i, m in enumerate(self.members, 1))
+
+    def choice(self, text: str):
+        """Член по номеру из меню или None"""
+        return self.by_number.get(text.strip())
+
+    def parse(self, value):
+        """Член по значению; ValueError со списком допустимых"""
+        member = self.by_value.get(value) if isinstance(value, str) else None
+        if member is None:
+            raise ValueError(f"Неизвестное значение {value!r}. "
+                             f"Допустимые: {', '.join(self.by_value)}.")
+        return member
+
+
+ENUM_TABLES: Dict[type, EnumTable] = {}
+
+
+def enum_table(enum_class) -> EnumTable:
+    table = ENUM_TABLES.get(enum_class)
+    if table is None:
+        table = ENUM_TABLES[enum_class] = EnumTable(enum_class)
+    return table
+
+
+DATE_FORMAT = "%d.%m.%y %H:%M:%S"
+
+
+def now_stamp() -> dict:
+    """Время новой записи: date — строка для показа, ts — секунды эпохи"""
+    now = datetime.now().replace(microsecond=0)
+    return {"date": now.strftime(DATE_FORMAT), "ts": int(now.timestamp())}
+
+
+def record_ts(rec: dict) -> int:
+    """Время записи в секундах эпохи; у записей без ts (старые файлы)
+    разбирается из date один раз и запоминается в записи"""
+    ts = rec.get("ts")
+    if ts is None:
+        try:
+            ts = int(datetime.strptime(rec["date"], DATE_FORMAT).timestamp())
+        except (KeyError, ValueError):
+            ts = 0
+        rec["ts"] = ts
+    return ts
+
+
+def insert_by_time(items: List[dict], rec: dict):
+    """Вставка в список, упорядоченный по времени (обычно в конец)"""
+    bisect.insort(items, rec, key=record_ts)
+
+
+def between(items: List[dict], start: datetime, end: datetime) -> List[dict]:
+    """Записи упорядоченного по времени списка с start по end включительно"""
+    lo = bisect.bisect_left(items, start.timestamp(), key=record_ts)
+    hi = bisect.bisect_right(items, end.timestamp(), key=record_ts)
+    return items[lo:hi]
+
+
+class EnumSeq:
+    """Упаковка списка значений перечисления в одно целое.
+
+    Каждый элемент — номер члена перечисления (с 1) в bits битах,
+    порядок добавления сохраняется, 0 означает конец списка.
+    Различных упакованных значений немного (у карт повторяются одни
+    и те же наборы), поэтому разобранный список и множество значений
+    запоминаются для каждого.
+    """
+
+    def __init__(self, enum_class):
+        self.members = list(enum_class)
+        self.codes = {m.value: i + 1 for i, m in enumerate(self.members)}
+        self.bits = len(self.members).bit_length()
+        self.mask = (1 << self.bits) - 1
+        self._items: Dict[int, Tuple[str, ...]] = {}
+        self._sets: Dict[int, frozenset] = {}
+
+    def items(self, packed: int) -> Tuple[str, ...]:
+        items = self._items.get(packed)
+        if items is None:
+            values = []
+            rest = packed
+            while rest:
+                values.append(self.members[(rest & self.mask) - 1].value)
+                rest >>= self.bits
+            items = self._items[packed] = tuple(values)
+            self._sets[packed] = frozenset(values)
+        return items
+
+    def unpack(self, packed: int) -> List[str]:
+        return list(self.items(packed))
+
+    def has(self, packed: int, value: str) -> bool:
+        values = self._sets.get(packed)
+        if values is None:
+            self.items(packed)
+            values = self._sets[packed]
+        return value in values
+
+    def pack(self, values) -> int:
+        packed = 0
+        for shift, value in enumerate(values):
+            packed |= self.codes[value] << (shift * self.bits)
+        return packed
+
+    def add(self, packed: int, value: str) -> int:
+        """Добавляет значение в конец, если его ещё нет"""
+        values = self._sets.get(packed)
+        if values is None:
+            self.items(packed)
+            values = self._sets[packed]
+        if value in values:
+            return packed
+        # Значения в наборе не повторяются: их столько же, сколько элементов
+        return packed | (self.codes[value] << (len(values) * self.bits))
+
+
+VACCINE_SEQ = EnumSeq(Vaccine)
+DISEASE_SEQ = EnumSeq(Disease)
+
+# Общий счётчик версий: пара (объект, версия) не повторяется
+VERSIONS = itertools.count(1)
+
+
+class Versioned:
+    """Версия объекта для кэшей готовых фрагментов (сериализация).
+
+    Методы, меняющие объект после создания, вызывают touch(). Только что
+    созданный или загруженный объект имеет версию 0: кэши хранят сам
+    объект, поэтому новые объекты с ними не путаются. Полю, которое
+    присваивается напрямую после создания, тоже нужен touch().
+    Присваивания не перехватываются через __setattr__: это в разы
+    замедлило бы создание и загрузку объектов.
+    """
+    __slots__ = ("version",)
+
+    def touch(self):
+        self.version = next(VERSIONS)
+
+
+def version(obj) -> int:
+    return getattr(obj, "version", 0)
+
+
+class RenderCache:
+    """Текстовый вид объектов (__str__) для повторных показов списков.
+
+    Используется для медкарт: их текст собирается из упакованных
+    перечислений и дороже поиска в кэше. Строки питомца, паспорта и
+    владельца — одна f-строка, они быстрее без кэша.
+
+    Запись действительна, пока у объекта та же версия (Versioned);
+    давно не показанные записи вытесняются (LRU, не больше size).
+    Кэш держит сам объект, поэтому id нового объекта не спутается
+    с записью удалённого.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.items: OrderedDict = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, obj, render: Callable[[object], str]) -> str:
+        key = id(obj)
+        entry = self.items.get(key)
+        ver = version(obj)
+        if entry is not None and entry[0] is obj and entry[1] == ver:
+            self.items.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        text = render(obj)
+        self.items[key] = (obj, ver, text)
+        if entry is not None:
+            self.items.move_to_end(key)
+        elif len(self.items) > self.size:
+            self.items.popitem(last=False)
+        return text
+
+    def clear(self):
+        self.items.clear()
+
+
+# Строк в кэше отображения: несколько полных просмотров большого магазина
+RENDER_CACHE_SIZE = 100_000
+RENDER_CACHE = RenderCache(RENDER_CACHE_SIZE)
+
+
+@dataclass(slots=True)
+class Passport(Versioned):
     pet_name: str
     age: int
     color: str
@@ -71,29 +297,71 @@ class Passport:
                 f"  Возраст: {self.age}")
 
 
-@dataclass
-class MedicalCard:
+@dataclass(slots=True, init=False)
+class MedicalCard(Versioned):
+    """Медкарта; прививки и болезни хранятся упакованными в EnumSeq"""
     pet_name: str
-    vaccinations: List[str] = field(default_factory=list)
-    diseases: List[str] = field(default_factory=list)
+    packed_vaccinations: int
+    packed_diseases: int
+
+    def __init__(self, pet_name: str, vaccinations: List[str] = (),
+                 diseases: List[str] = ()):
+        self.pet_name = pet_name
+        self.packed_vaccinations = VACCINE_SEQ.pack(vaccinations)
+        self.packed_diseases = DISEASE_SEQ.pack(diseases)
+
+    @property
+    def vaccinations(self) -> List[str]:
+        return VACCINE_SEQ.unpack(self.packed_vaccinations)
+
+    @vaccinations.setter
+    def vaccinations(self, values: List[str]):
+        self.packed_vaccinations = VACCINE_SEQ.pack(values)
+        self.touch()
+
+    @property
+    def diseases(self) -> List[str]:
+        return DISEASE_SEQ.unpack(self.packed_diseases)
+
+    @diseases.setter
+    def diseases(self, values: List[str]):
+        self.packed_diseases = DISEASE_SEQ.pack(values)
+        self.touch()
+
+    def has_vaccination(self, vaccine: Vaccine) -> bool:
+        return VACCINE_SEQ.has(self.packed_vaccinations, vaccine.value)
+
+    def has_disease(self, disease: Disease) -> bool:
+        return DISEASE_SEQ.has(self.packed_diseases, disease.value)
 
     def add_vaccination(self, vaccine: Vaccine):
-        if vaccine.value not in self.vaccinations:
-            self.vaccinations.append(vaccine.value)
+        self.packed_vaccinations = VACCINE_SEQ.add(
+            self.packed_vaccinations, vaccine.value)
+        self.touch()
 
     def add_disease(self, disease: Disease):
-        if disease.value not in self.diseases:
-            self.diseases.append(disease.value)
+        self.packed_diseases = DISEASE_SEQ.add(
+            self.packed_diseases, disease.value)
+        self.touch()
+
+    def to_dict(self) -> dict:
+        return {"pet_name": self.pet_name,
+                "vaccinations": self.vaccinations,
+                "diseases": self.diseases}
 
     def __str__(self):
-        vac = ", ".join(
-            self.vaccinations) if self.vaccinations else "Нет прививок"
-        dis = ", ".join(self.diseases) if self.diseases else "Нет болезней"
+        return RENDER_CACHE.get(self, MedicalCard.render)
+
+    def render(self) -> str:
+        vaccinations = VACCINE_SEQ.items(self.packed_vaccinations)
+        diseases = DISEASE_SEQ.items(self.packed_diseases)
+        vac = ", ".join(vaccinations) if vaccinations else "Нет прививок"
+        dis = ", ".join(diseases) if diseases else "Нет болезней"
         return f"Медкарта питомца: {self.pet_name}\n  Прививки: {vac}\n  Болезни: {dis}"
 
 
-@dataclass
-class Pet:
+@dataclass(slots=True)
+class Pet(Versioned):
     name: str
     age: int
     gender: str
@@ -105,11 +373,16 @@ class Pet:
     def __post_init__(self):
         self.medical_card = MedicalCard(self.name)
 
+    def to_dict(self) -> dict:
+        return encode(self)
 
-@dataclass
+
+# super() без аргументов не работает в классах с slots=True,
+# поэтому базовый __post_init__ вызывается явно
+@dataclass(slots=True)
 class Dog(Pet):
     def __post_init__(self):
-        super().__post_init__()
+        Pet.__post_init__(self)
         self.passport = Passport(
             self.name, self.age, self.color, self.gender, self.breed)
 
@@ -117,10 +390,10 @@ class Dog(Pet):
         return f"Собака {self.name}, пол {self.gender}, цвет {self.color}, возраст {self.age}"
 
 
-@dataclass
+@dataclass(slots=True)
 class Cat(Pet):
     def __post_init__(self):
-        super().__post_init__()
+        Pet.__post_init__(self)
         self.passport = Passport(
             self.name, self.age, self.color, self.gender, self.breed)
 
@@ -128,7 +401,7 @@ class Cat(Pet):
         return f"Кошка {self.name}, пол {self.gender}, цвет {self.color}, возраст {self.age}"
 
 @dataclass
-class Owner:
+class Owner(Versioned):
     """Владелец питомца"""
     name: str
     age: int
@@ -137,24 +410,145 @@ class Owner:
 
     def add_pet(self, pet: Pet):
         self.pets.append(pet)
+        self.touch()
 
     def remove_pet(self, idx: int):
         if 0 <= idx < len(self.pets):
+            self.touch()
             return self.pets.pop(idx)
         return None
 
-    def show_pets(self):
+    def show_pets(self, search: Optional[Callable] = None,
+                  select: bool = False) -> Optional[Pet]:
         if not self.pets:
             print("У вас пока нет питомцев.\n")
-            return
+            return None
         print("Ваши питомцы:\n")
-        for i, pet in enumerate(self.pets, 1):
-            print(f"{i}. {pet}")
+        return browse(self.pets, show_numbered, search, select)
 
     def __str__(self):
         return f"{self.name}, возраст: {self.age}, пол {self.gender}"
 
 
+# Кодеки: функции объект -> dict, сгенерированные по полям датаклассов.
+# В отличие от asdict() они не обходят значения рекурсивно и ничего не
+# копируют, вложенные объекты кодируются своими кодеками.
+
+ENCODERS: Dict[type, Callable[[object], dict]] = {}
+
+
+def encode(obj) -> dict:
+    return ENCODERS[type(obj)](obj)
+
+
+def make_encoder(cls, nested: Optional[Dict[str, str]] = None,
+                 tag: Optional[str] = None) -> Callable[[object], dict]:
+    """Генерирует кодировщик для датакласса.
+
+    nested задаёт выражение для отдельных полей, {v} в нём заменяется
+    на значение поля. tag добавляется первым ключом "type".
+    """
+    nested = nested or {}
+    items = ", ".join(
+        ([f"'type': {tag!r}"] if tag else []) +
+        [f"{f.name!r}: " + nested.get(f.name, "{v}").format(v=f"obj.{f.name}")
+         for f in fields(cls)])
+    name = f"encode_{cls.__name__}"
+    namespace = {"encode": encode}
+    exec(f"def {name}(obj):\n    return {{{items}}}\n", namespace)
+    return namespace[name]
+
+
+def register_encoder(cls, encoder: Callable[[object], dict]):
+    ENCODERS[cls] = encoder
+
+
+register_encoder(Passport, make_encoder(Passport))
+register_encoder(MedicalCard, MedicalCard.to_dict)
+register_encoder(Owner, make_encoder(Owner, {
+    "pets": "[encode(p) for p in {v}]",
+}))
+
+# Декодеры — обратные функции dict -> объект. Объект создаётся через
+# object.__new__ и поля присваиваются напрямую: __post_init__ не вызывается,
+# сохранённые паспорт и медкарта не пересоздаются.
+
+DECODERS: Dict[type, Callable[[dict], object]] = {}
+
+
+def decode(cls, data: dict):
+    return DECODERS[cls](data)
+
+
+def make_decoder(cls, nested: Optional[Dict[str, str]] = None) -> Callable[[dict], object]:
+    """Генерирует декодер для датакласса; nested — как в make_encoder,
+    {v} заменяется на сохранённое значение поля"""
+    nested = nested or {}
+    name = f"decode_{cls.__name__}"
+    lines = [f"def {name}(data):", "    obj = new(cls)"]
+    for f in fields(cls):
+        value = nested.get(f.name, "{v}").format(v=f"data[{f.name!r}]")
+        lines.append(f"    obj.{f.name} = {value}")
+    lines.append("    return obj")
+    namespace = {"new": object.__new__, "cls": cls, "decode": decode,
+                 "Passport": Passport, "MedicalCard": MedicalCard}
+    exec("\n".join(lines) + "\n", namespace)
+    return namespace[name]
+
+
+def register_decoder(cls, decoder: Callable[[dict], object]):
+    DECODERS[cls] = decoder
+
+
+register_decoder(Passport, make_decoder(Passport))
+register_decoder(MedicalCard, lambda data: MedicalCard(
+    data["pet_name"], data["vaccinations"], data["diseases"]))
+
+
+@dataclass(frozen=True)
+class Species:
+    """Вид питомца: класс, перечисление пород и подписи для меню"""
+    cls: type
+    breeds: type
+    title: str
+    breed_title: str
+
+
+# Реестр видов строится один раз при импорте: тег type -> вид
+# и порода -> вид (для записей старого формата без тега)
+SPECIES: Dict[str, Species] = {}
+BREED_SPECIES: Dict[str, Species] = {}
+
+
+def register_species(species: Species):
+    cls = species.cls
+    SPECIES[cls.__name__] = species
+    for breed in species.breeds:
+        BREED_SPECIES[breed.value] = species
+    register_encoder(cls, make_encoder(cls, {
+        "passport": "encode({v}) if {v} is not None else None",
+        "medical_card": "encode({v})",
+    }, tag=cls.__name__))
+    register_decoder(cls, make_decoder(cls, {
+        "passport": "decode(Passport, {v}) if {v} is not None else None",
+        "medical_card": "decode(MedicalCard, {v})",
+    }))
+
+
+register_species(Species(Dog, DogBreed, "Собака", "породу собаки"))
+register_species(Species(Cat, CatBreed, "Кошка", "породу кошки"))
+
+
+def pet_class(pd: dict) -> type:
+    """Класс питомца по тегу type; без тега — по породе, иначе Cat,
+    как было в старом формате"""
+    tag = pd.get("type")
+    if tag is not None:
+        return SPECIES[tag].cls
+    species = BREED_SPECIES.get(pd.get("breed"))
+    return species.cls if species is not None else Cat
+
+
 @dataclass
 class Organization:
     name: str
@@ -172,40 +566,37 @@ class PetShop(Organization):
         age = input_int("\nВозраст питомца: ", 0)
         gender = choose_enum(Gender, "пол питомца").value
         color = choose_enum(Color, "цвет питомца").value
-        print("\n1. Собака\n2. Кошка")
+        kinds = list(SPECIES.values())
+        print()
+        for i, kind in enumerate(kinds, 1):
+            print(f"{i}. {kind.title}")
         while True:
-            t = input("Выбор: ").strip()
-            if t == "1":
-                breed = choose_enum(DogBreed, "породу собаки").value
-                pet = Dog(name, age, gender, color, breed)
-                break
-            elif t == "2":
-                breed = choose_enum(CatBreed, "породу кошки").value
-                pet = Cat(name, age, gender, color, breed)
-                break
-            else:
-                print("Выбор: ")
-        self.available_pets.append(pet)
-        print(f"Питомец {pet.name} добавлен в магазин.")
-
-    def list_available(self):
+            t = ask("Выбор: ").strip()
+            if t.isdigit() and 1 <= int(t) <= len(kinds):
+                kind = kinds[int(t) - 1]
+                breed = choose_enum(kind.breeds, kind.breed_title).value
+                return kind.cls(name, age, gender, color, breed)
+            print("Выбор: ")
+
+    def list_available(self, search: Optional[Callable] = None,
+                       select: bool = False) -> Optional[Pet]:
         if not self.available_pets:
             print("\nВ магазине нет питомцев.")
-            return
+            return None
         print(f"\nПитомцы в магазине {self.name}:")
-        for i, p in enumerate(self.available_pets, 1):
-            print(f"{i}. {p}")
+        return browse(self.available_pets, show_numbered, search, select)
 
-    def sell_pet(self, owner: Owner, idx: int):
+    def sell_pet(self, owner: Owner, idx: int, date: Optional[str] = None):
         if 1 <= idx <= len(self.available_pets):
             pet = self.available_pets.pop(idx - 1)
             owner.add_pet(pet)
-            rec = {
-                "owner_name": owner.name,
-                "pet_name": pet.name,
-                "date": datetime.now().strftime("%d.%m.%y %H:%M:%S")
-            }
-            self.sales.append(rec)
+            rec = {"owner_name": owner.name, "pet_name": pet.name}
+            if date:
+                rec["date"] = date
+                record_ts(rec)
+            else:
+                rec.update(now_stamp())
+            insert_by_time(self.sales, rec)
             return rec
         else:
             raise IndexError("Неверный индекс питомца для продажи.")
@@ -215,208 +606,2514 @@ class PetShop(Organization):
 class VetClinic(Organization):
     records: List[dict] = field(default_factory=list)
 
-    def treat_interactive(self, pet: Pet):
+    def record(self, pet: Pet, kind: str, detail: str) -> dict:
+        rec = {
+            "pet_name": pet.name,
+            "type": kind,
+            "detail": detail,
+            **now_stamp()
+        }
+        insert_by_time(self.records, rec)
+        return rec
+
+    def add_disease(self, pet: Pet, disease: Disease) -> dict:
+        """Болезнь в медкарту и запись клиники о ней"""
+        if pet.medical_card is None:
+            pet.medical_card = MedicalCard(pet.name)
+        pet.medical_card.add_disease(disease)
+        return self.record(pet, "Болезнь", disease.value)
+
+    def add_vaccination(self, pet: Pet, vaccine: Vaccine) -> dict:
+        """Прививка в медкарту и запись клиники о ней"""
         if pet.medical_card is None:
             pet.medical_card = MedicalCard(pet.name)
+        pet.medical_card.add_vaccination(vaccine)
+        return self.record(pet, "Вакцина", vaccine.value)
+
+    def add_record(self, pet: Pet, rec: dict):
+        """Готовая запись (повтор журнала): в медкарту и в список записей
+        как есть, без новой отметки времени"""
+        if pet.medical_card is None:
+            pet.medical_card = MedicalCard(pet.name)
+        if rec["type"] == "Болезнь":
+            pet.medical_card.add_disease(Disease(rec["detail"]))
+        else:
+            pet.medical_card.add_vaccination(Vaccine(rec["detail"]))
+        insert_by_time(self.records, rec)
+
+    def treat_interactive(self, pet: Pet) -> Tuple[List[Disease], List[Vaccine]]:
+        """Интерактивное лечение: выбранные за визит болезни и прививки.
+        В медкарту они попадают после визита (DataManager.treat)"""
+        diseases, vaccines = [], []
         while True:
             print("\nВетклиника:")
             print("1. Добавить болезнь")
             print("2. Добавить прививку")
             print("3. Посмотреть медкарту")
             print("0. Назад")
-            choice = input("Выбор: ").strip()
+            choice = read_choice("clinic.visit")
             if choice == "0":
                 break
             if choice == "1":
-                disease = choose_enum(Disease, "болезнь")
-                pet.medical_card.add_disease(disease)
-                rec = {
-                    "pet_name": pet.name,
-                    "type": "Болезнь",
-                    "detail": disease.value,
-                    "date": datetime.now().strftime("%d.%m.%y %H:%M:%S")
-                }
-                self.records.append(rec)
+                diseases.append(choose_enum(Disease, "болезнь"))
                 print("Запись болезни добавлена.")
             elif choice == "2":
-                vaccine = choose_enum(Vaccine, "вакцину")
-                pet.medical_card.add_vaccination(vaccine)
-                rec = {
-                    "pet_name": pet.name,
-                    "type": "Вакцина",
-                    "detail": vaccine.value,
-                    "date": datetime.now().strftime("%d.%m.%y %H:%M:%S")
-                }
-                self.records.append(rec)
+                vaccines.append(choose_enum(Vaccine, "вакцину"))
                 print("Вакцинация добавлена.")
             elif choice == "3":
-                print("\n" + str(pet.medical_card))
+                card = str(pet.medical_card) if pet.medical_card else "Медкарты пока нет."
+                added = [d.value for d in diseases] + [v.value for v in vaccines]
+                if added:
+                    card += "\nЗа этот визит: " + ", ".join(added)
+                print("\n" + card)
             else:
                 print("Неверный выбор.")
+        return diseases, vaccines
+
+
+def xml_escape(text: str) -> str:
+    """Экранирование как в minidom (текст и значения атрибутов)"""
+    return (text.replace("&", "&amp;").replace("<", "&lt;")
+            .replace("\"", "&quot;").replace(">", "&gt;"))
+
+
+class XmlStreamWriter:
+    """Пишет XML с отступами сразу в файл, в формате toprettyxml(indent="  ").
+
+    Открытый элемент не выводится, пока не станет ясно, пустой он или нет,
+    поэтому пустые элементы получаются в виде <tag/>, как у minidom.
+    """
+
+    def __init__(self, f, indent: str = "  ", depth: int = 0,
+                 declaration: bool = True):
+        self.f = f
+        self.indent = indent
+        self.depth = depth
+        self.pending: Optional[str] = None
+        self.stack: List[str] = []
+        if declaration:
+            f.write('<?xml version="1.0" ?>\n')
+
+    def _flush_pending(self):
+        if self.pending is not None:
+            self.f.write(self.pending + ">\n")
+            self.pending = None
+
+    def start(self, tag: str, **attrs: str):
+        self._flush_pending()
+        head = self.indent * self.depth + "<" + tag
+        for k, v in attrs.items():
+            head += f' {k}="{xml_escape(v)}"'
+        self.pending = head
+        self.stack.append(tag)
+        self.depth += 1
+
+    def end(self):
+        tag = self.stack.pop()
+        self.depth -= 1
+        if self.pending is not None:
+            self.f.write(self.pending + "/>\n")
+            self.pending = None
+        else:
+            self.f.write(f"{self.indent * self.depth}</{tag}>\n")
+
+    def leaf(self, tag: str, text: str):
+        """Элемент с текстом; пустой текст даёт <tag/>"""
+        self._flush_pending()
+        pad = self.indent * self.depth
+        if text:
+            self.f.write(f"{pad}<{tag}>{xml_escape(text)}</{tag}>\n")
+        else:
+            self.f.write(f"{pad}<{tag}/>\n")
+
+    def record(self, tag: str, rec: dict, skip: tuple = ()):
+        self.start(tag)
+        for k, v in rec.items():
+            if k not in skip:
+                self.leaf(k, str(v))
+        self.end()
+
+    def raw(self, text: str):
+        """Готовый фрагмент с элементами на текущей глубине"""
+        self._flush_pending()
+        self.f.write(text)
+
+
+def xml_fragment(depth: int, write: Callable[[XmlStreamWriter], None]) -> str:
+    """Текст элементов, которые write выводит на глубине depth"""
+    buf = io.StringIO()
+    write(XmlStreamWriter(buf, depth=depth, declaration=False))
+    return buf.getvalue()
+
+
+class JsonStream:
+    """Потоковое чтение JSON: значения разбираются по одному из буфера,
+    файл целиком в память не загружается"""
+    CHUNK = 1 << 16
+    WS = re.compile(r"[ \t\r\n]*")
+    NUMBER_TAIL = re.compile(r"[0-9eE.+-]*")
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        # Размер чтения растёт вместе с буфером, чтобы крупное значение
+        # не разбиралось заново на каждом маленьком куске
+        chunk = self.f.read(max(self.CHUNK, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = self.WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str):
+        if self.peek() != ch:
+            raise json.JSONDecodeError(f"Ожидался '{ch}'", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Число на границе буфера может продолжаться в следующем куске,
+            # в том числе после разобранной части ("-678." и "25e2")
+            if (end == len(self.buf) or type(obj) in (int, float) and
+                    self.NUMBER_TAIL.fullmatch(self.buf, end)) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+    def iter_object(self):
+        """Отдаёт ключи объекта; значение каждого ключа читает вызывающий"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+
+class LazyPets(MutableSequence):
+    """Список питомцев, который создаёт объекты Pet при первом обращении"""
+
+    def __init__(self, raw=()):
+        self._items = list(raw)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self._items)))]
+        item = self._items[idx]
+        if isinstance(item, dict):
+            item = DataManager.pet_from_dict(item)
+            self._items[idx] = item
+        return item
+
+    def __setitem__(self, idx, value):
+        self._items[idx] = value
+
+    def __delitem__(self, idx):
+        del self._items[idx]
+
+    def __len__(self):
+        return len(self._items)
+
+    def insert(self, idx, value):
+        self._items.insert(idx, value)
+
+    def __repr__(self):
+        return f"LazyPets({len(self._items)})"
+
+
+class Concat(Sequence):
+    """Несколько списков как один без копирования: позиция элемента
+    ищется двоичным поиском по накопленным длинам"""
+
+    def __init__(self, parts: List[Sequence]):
+        self.parts = parts
+        self.ends = list(accumulate(len(p) for p in parts))
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        part = bisect.bisect_right(self.ends, idx)
+        return self.parts[part][idx - (self.ends[part - 1] if part else 0)]
+
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+
+
+class Stats:
+    """Замеры по фазам и счётчики для поиска медленных мест.
+
+    Выключены, пока не вызван enable() (переменная окружения PETS_STATS
+    или параметр --stats). Для каждой фазы копятся число вызовов, полное
+    время и собственное — без вложенных фаз: так видно, ушло ли время
+    сохранения на построение словарей, кодирование JSON, XML или диск.
+    Действия меню — тоже фазы, от выбора пункта до следующего запроса
+    выбора; ожидание ввода пользователя идёт отдельной фазой input.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        # имя -> [вызовов, всего секунд, собственных секунд]
+        self.phases: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._action: Optional[str] = None
+
+    def enable(self):
+        self.enabled = True
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name: str):
+        # [имя, начало, время вложенных фаз]
+        self._stack().append([name, time.perf_counter(), 0.0])
+
+    def end(self):
+        stack = self._stack()
+        name, start, nested = stack.pop()
+        elapsed = time.perf_counter() - start
+        if stack:
+            stack[-1][2] += elapsed
+        with self._lock:
+            p = self.phases[name]
+            p[0] += 1
+            p[1] += elapsed
+            p[2] += elapsed - nested
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def action(self, name: Optional[str]):
+        """Завершает текущее действие меню и начинает name (None — никакое)"""
+        if not self.enabled:
+            return
+        if self._action is not None:
+            self._action = None
+            self.end()
+        if name is not None:
+            self._action = name
+            self.begin(name)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "phases": {name: {"calls": int(c), "total": round(t, 6), "self": round(own, 6)}
+                           for name, (c, t, own) in self.phases.items()},
+                "counters": dict(self.counters),
+            }
+
+    def report(self) -> str:
+        data = self.snapshot()
+        lines = ["Замеры по фазам:",
+                 f"  {'фаза':32} {'вызовов':>8} {'всего, с':>10} {'своё, с':>10}"]
+        for name, p in sorted(data["phases"].items(), key=lambda kv: -kv[1]["total"]):
+            lines.append(f"  {name:32} {p['calls']:8} {p['total']:10.3f} {p['self']:10.3f}")
+        lines.append("Счётчики:")
+        lines += [f"  {name}: {value}" for name, value in sorted(data["counters"].items())]
+        return "\n".join(lines)
+
+
+STATS = Stats()
+
+
+def ask(prompt: str = "") -> str:
+    """input() для меню: ожидание пользователя при замерах идёт фазой input"""
+    with STATS.phase("input"):
+        return input(prompt)
+
+
+@contextmanager
+def atomic_write(path: str, binary: bool = False):
+    """Запись во временный файл и замена исходного одним os.replace:
+    при сбое на диске остаётся либо старая, либо новая версия целиком"""
+    tmp = f"{path}.tmp"
+    try:
+        with (open(tmp, "wb") if binary else
+              open(tmp, "w", encoding="utf-8")) as f:
+            yield f
+            with STATS.phase("disk.fsync"):
+                f.flush()
+                os.fsync(f.fileno())
+                STATS.count("bytes_written", f.tell())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class FileLock:
+    """Межпроцессная рекомендательная блокировка на отдельном файле.
+
+    Повторный вход только увеличивает счётчик: вызывающий код держит
+    DataManager.lock, так что потоки одного процесса сюда не конкурируют.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            f = open(self.path, "a+b")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                f.close()
+                raise
+            self._file = f
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            f, self._file = self._file, None
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            f.close()
+
+
+class BackgroundSaver:
+    """Фоновое сохранение для интерактивного режима.
+
+    Изменения только помечают данные как изменённые; поток ждёт паузы
+    в изменениях (debounce секунд, но не дольше max_delay) и сохраняет всё
+    одним save_all. Если сохранение не удалось, данные остаются
+    изменёнными, поток повторяет попытку после следующей паузы, а ошибка
+    выводится в stderr; flush и stop её пробрасывают.
+    """
+
+    def __init__(self, manager: "DataManager", debounce: float = 2.0,
+                 max_delay: Optional[float] = None):
+        self.manager = manager
+        self.debounce = debounce
+        self.max_delay = max_delay if max_delay is not None else debounce * 5
+        self.cond = threading.Condition()
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.first_change = 0.0
+        self.last_change = 0.0
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, name="background-saver",
+                                       daemon=True)
+        self.thread.start()
+
+    def mark_dirty(self):
+        with self.cond:
+            now = time.monotonic()
+            if not self.dirty:
+                self.first_change = now
+            self.dirty = True
+            self.last_change = now
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.dirty and not self.stopped:
+                    self.cond.wait()
+                while not self.stopped:
+                    now = time.monotonic()
+                    delay = min(self.last_change + self.debounce,
+                                self.first_change + self.max_delay) - now
+                    if delay <= 0:
+                        break
+                    self.cond.wait(delay)
+                if self.stopped:
+                    return
+                self.dirty = False
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Фоновое сохранение не удалось: {e}", file=sys.stderr)
+
+    def _save(self):
+        try:
+            with self.save_lock:
+                self.manager.save_all()
+        except BaseException:
+            # Изменения не записаны: снова помечаем их, следующая попытка —
+            # после паузы, а не сразу
+            with self.cond:
+                now = time.monotonic()
+                if not self.dirty:
+                    self.first_change = now
+                self.dirty = True
+                self.last_change = now
+            raise
+
+    def flush(self):
+        """Синхронно сохраняет несохранённые изменения; ошибка сохранения
+        пробрасывается, изменения остаются несохранёнными"""
+        with self.cond:
+            if not self.dirty:
+                return
+            self.dirty = False
+        self._save()
+
+    def stop(self):
+        """Останавливает поток и дописывает последние изменения"""
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        self.thread.join()
+        self.flush()
+
+
+def xml_owner_head(w: XmlStreamWriter, od: dict):
+    w.leaf("name", od["name"])
+    w.leaf("age", str(od["age"]))
+    w.leaf("gender", od["gender"])
+
+
+def xml_owner_pet(w: XmlStreamWriter, pd: dict):
+    w.start("pet", type=pd["type"])
+    w.leaf("name", pd["name"])
+    w.leaf("age", str(pd["age"]))
+    w.leaf("gender", pd["gender"])
+    w.leaf("color", pd["color"])
+    w.leaf("breed", pd["breed"] if pd["breed"] else "")
+    if pd["passport"]:
+        w.start("passport")
+        for k, v in pd["passport"].items():
+            w.leaf(k, str(v))
+        w.end()
+    if pd["medical_card"]:
+        w.start("medical_card")
+        w.start("vaccinations")
+        for v in pd["medical_card"]["vaccinations"]:
+            w.leaf("vaccine", v)
+        w.end()
+        w.start("diseases")
+        for d in pd["medical_card"]["diseases"]:
+            w.leaf("disease", d)
+        w.end()
+        w.end()
+    w.end()
+
+
+def xml_shop_pet(w: XmlStreamWriter, pd: dict):
+    w.start("pet", type=pd["type"])
+    for k, v in pd.items():
+        if v is None or k == "type":
+            continue
+        if isinstance(v, dict):
+            w.start(k)
+            for kk, vv in v.items():
+                w.leaf(kk, str(vv))
+            w.end()
+        else:
+            w.leaf(k, str(v))
+    w.end()
+
+
+def xml_record(w: XmlStreamWriter, rec: dict):
+    w.record("record", rec, skip=("ts",))
+
+
+def write_xml(path: str, payload: dict):
+    """Потоковая запись XML: элементы пишутся в файл по мере обхода.
+
+    Значения берутся из payload (см. DataManager.build_payload); списки
+    в нём могут быть и генераторами (DataManager.payload_view). Функция
+    уровня модуля, чтобы её можно было выполнить в отдельном процессе.
+    """
+    with atomic_write(path) as f:
+        w = XmlStreamWriter(f)
+        w.start("data")
+        w.start("owners")
+        for od in payload["owners"]:
+            w.start("owner")
+            xml_owner_head(w, od)
+            w.start("pets")
+            for pd in od["pets"]:
+                xml_owner_pet(w, pd)
+            w.end()
+            w.end()
+        w.end()
+
+        # PetShop
+        w.start("petshop")
+        w.start("available_pets")
+        for pd in payload["petshop"]["available_pets"]:
+            xml_shop_pet(w, pd)
+        w.end()
+        w.start("sales")
+        for s in payload["petshop"]["sales"]:
+            xml_record(w, s)
+        w.end()
+        w.end()
+
+        # VetClinic
+        w.start("vetclinic")
+        w.start("records")
+        for r in payload["vetclinic"]["records"]:
+            xml_record(w, r)
+        w.end()
+        w.end()
+        w.end()
+
+
+# Строка JSON без экранирования не-ASCII (C-функция модуля json)
+json_string = json.encoder.encode_basestring
+
+
+def json_fragment(value, level: int) -> str:
+    """То же, что json.dumps(value, ensure_ascii=False, indent=4) для
+    значения на уровне вложенности level. Для данных снимка (словари,
+    списки, строки, целые, None) — без медленного питоновского
+    кодировщика json, который используется при indent."""
+    t = type(value)
+    if t is str:
+        return json_string(value)
+    if t is dict or t is list:
+        if not value:
+            return "{}" if t is dict else "[]"
+        inner = "\n" + "    " * (level + 1)
+        level += 1
+        # Строки и целые — напрямую, без рекурсивного вызова
+        if t is dict:
+            items = [json_string(k) + ": " + (
+                json_string(v) if type(v) is str else
+                str(v) if type(v) is int else json_fragment(v, level))
+                for k, v in value.items()]
+            brackets = "{}"
+        else:
+            items = [json_string(v) if type(v) is str else
+                     str(v) if type(v) is int else json_fragment(v, level)
+                     for v in value]
+            brackets = "[]"
+        return (brackets[0] + inner + ("," + inner).join(items) +
+                "\n" + "    " * (level - 1) + brackets[1])
+    text = json.dumps(value, ensure_ascii=False, indent=4)
+    return text.replace("\n", "\n" + "    " * level) if level else text
+
+
+def json_list(items: List[str], level: int) -> List[str]:
+    """Части JSON-списка готовых фрагментов уровня level + 1"""
+    if not items:
+        return ["[]"]
+    sep = ",\n" + "    " * (level + 1)
+    return ["[\n" + "    " * (level + 1), sep.join(items), "\n" + "    " * level + "]"]
+
+
+class SnapshotCache:
+    """Готовые фрагменты снимка data.json и data.xml.
+
+    Питомцы, владельцы (без питомцев), продажи и записи клиники хранятся
+    уже закодированными — JSON-текстом и XML-элементами с нужным отступом —
+    вместе с объектом и его версией (Versioned), от которых построены.
+    При сохранении заново кодируются только новые и изменённые объекты,
+    остальное склеивается из кэша; результат совпадает с полной записью
+    (json.dump с indent=4 и write_xml) байт в байт. Записи продаж и
+    клиники не меняются после создания, для них проверяется только
+    объект. Фрагменты, не попавшие в очередной снимок, выбрасываются.
+    """
+
+    def __init__(self):
+        self.entries: Dict[tuple, tuple] = {}
+        self._fresh: Dict[tuple, tuple] = {}
+        self.hits = self.misses = 0
+
+    def _get(self, kind: str, obj, stamp, build: Callable[[], str]) -> str:
+        key = (kind, id(obj))
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is not obj or entry[1] != stamp:
+            entry = (obj, stamp, build())
+            self.misses += 1
+        else:
+            self.hits += 1
+        self._fresh[key] = entry
+        return entry[2]
+
+    @staticmethod
+    def pet_stamp(pet: Pet) -> tuple:
+        passport, card = pet.passport, pet.medical_card
+        return (version(pet), passport, version(passport), card, version(card))
+
+    def pet_json(self, pet: Pet, stamp: tuple, level: int) -> str:
+        return self._get(f"json{level}", pet, stamp,
+                         lambda: json_fragment(encode(pet), level))
+
+    def pet_xml(self, pet: Pet, stamp: tuple, owned: bool) -> str:
+        if owned:
+            return self._get("xml_owner_pet", pet, stamp, lambda: xml_fragment(
+                4, lambda w: xml_owner_pet(w, encode(pet))))
+        return self._get("xml_shop_pet", pet, stamp, lambda: xml_fragment(
+            3, lambda w: xml_shop_pet(w, encode(pet))))
+
+    @staticmethod
+    def owner_head(owner: Owner) -> dict:
+        return {"name": owner.name, "age": owner.age, "gender": owner.gender}
+
+    def owner_json(self, owner: Owner) -> str:
+        """Начало объекта владельца на уровне 2: без "pets" и закрывающей скобки"""
+        return self._get("json_owner", owner, version(owner), lambda: json_fragment(
+            self.owner_head(owner), 2).rsplit("\n", 1)[0])
+
+    def owner_xml(self, owner: Owner) -> str:
+        return self._get("xml_owner", owner, version(owner), lambda: xml_fragment(
+            3, lambda w: xml_owner_head(w, self.owner_head(owner))))
+
+    def record_json(self, rec: dict) -> str:
+        return self._get("json_record", rec, None, lambda: json_fragment(rec, 3))
+
+    def record_xml(self, rec: dict) -> str:
+        return self._get("xml_record", rec, None,
+                         lambda: xml_fragment(3, lambda w: xml_record(w, rec)))
+
+    def build(self, manager: "DataManager", xml: bool) -> Tuple[List[str], Optional[list]]:
+        """Части data.json и (если xml) части для write_xml_parts: списки
+        строк, ссылающиеся на фрагменты кэша"""
+        self._fresh = {}
+        pad = "    "
+        js = ["{\n" + pad + '"owners": ']
+        owners_js, owners_xml = [], []
+        for o in manager.owners:
+            stamps = [self.pet_stamp(p) for p in o.pets]
+            pets = [self.pet_json(p, st, 4) for p, st in zip(o.pets, stamps)]
+            owners_js.append("".join([
+                self.owner_json(o), ",\n" + pad * 3 + '"pets": ',
+                *json_list(pets, 3), "\n" + pad * 2 + "}"]))
+            if xml:
+                owners_xml.append((self.owner_xml(o), [
+                    self.pet_xml(p, st, True) for p, st in zip(o.pets, stamps)]))
+        js += json_list(owners_js, 1)
+        shop = manager.petshop.available_pets
+        stamps = [self.pet_stamp(p) for p in shop]
+        js.append(",\n" + pad + '"petshop": {\n' + pad * 2 + '"available_pets": ')
+        js += json_list([self.pet_json(p, st, 3) for p, st in zip(shop, stamps)], 2)
+        js.append(",\n" + pad * 2 + '"sales": ')
+        js += json_list([self.record_json(r) for r in manager.petshop.sales], 2)
+        js.append("\n" + pad + "},\n" + pad + '"vetclinic": {\n' + pad * 2 + '"records": ')
+        js += json_list([self.record_json(r) for r in manager.vetclinic.records], 2)
+        js.append("\n" + pad + "}")
+        if manager.journal:
+            js.append(",\n" + pad + '"journal_seq": ' + json.dumps(manager.journal_seq))
+        js.append("\n}")
+        xml_parts = None
+        if xml:
+            xml_parts = [
+                owners_xml,
+                [self.pet_xml(p, st, False) for p, st in zip(shop, stamps)],
+                [self.record_xml(r) for r in manager.petshop.sales],
+                [self.record_xml(r) for r in manager.vetclinic.records],
+            ]
+        self.entries, self._fresh = self._fresh, {}
+        return js, xml_parts
+
+
+def write_xml_parts(path: str, parts: list):
+    """write_xml из готовых фрагментов SnapshotCache.build"""
+    owners, shop, sales, records = parts
+    with atomic_write(path) as f:
+        w = XmlStreamWriter(f)
+        w.start("data")
+        w.start("owners")
+        for head, pets in owners:
+            w.start("owner")
+            w.raw(head)
+            w.start("pets")
+            for pet in pets:
+                w.raw(pet)
+            w.end()
+            w.end()
+        w.end()
+        w.start("petshop")
+        w.start("available_pets")
+        for pet in shop:
+            w.raw(pet)
+        w.end()
+        w.start("sales")
+        for rec in sales:
+            w.raw(rec)
+        w.end()
+        w.end()
+        w.start("vetclinic")
+        w.start("records")
+        for rec in records:
+            w.raw(rec)
+        w.end()
+        w.end()
+        w.end()
+
+
+class BinarySnapshot:
+    """Компактный двоичный снимок данных (data.bin).
+
+    Все строки (имена, значения перечислений, даты) записываются один раз
+    в таблицу строк в конце файла, в записях хранятся их номера. Прививки
+    и болезни хранятся упакованными числами EnumSeq, как в MedicalCard.
+    Чтение идёт через mmap без загрузки файла в память целиком.
+
+    Заголовок: MAGIC, версия, journal_seq, смещение таблицы строк.
+    """
+    MAGIC = b"PETS"
+    VERSION = 1
+    NONE = 0xFFFFFFFF
+
+    HEADER = struct.Struct("<4sHQQ")
+    COUNT = struct.Struct("<I")
+    OWNER = struct.Struct("<IqI")
+    # type, name, age, gender, color, breed, флаги (1 — паспорт, 2 — медкарта)
+    PET = struct.Struct("<IIqIIIB")
+    PASSPORT = struct.Struct("<IqIIII")
+    CARD = struct.Struct("<IQQ")
+    DICT_LEN = struct.Struct("<H")
+    # ключ, тип значения (0 — строка, 1 — целое, 2 — JSON), значение
+    STR_ITEM = struct.Struct("<IBI")
+    INT_ITEM = struct.Struct("<IBq")
+
+    @classmethod
+    def dump(cls, manager: "DataManager") -> bytes:
+        strings: Dict[str, int] = {}
+
+        def ref(value: Optional[str]) -> int:
+            if value is None:
+                return cls.NONE
+            return strings.setdefault(value, len(strings))
+
+        out = bytearray(cls.HEADER.size)
+        write = out.extend
+
+        def pets(items):
+            write(cls.COUNT.pack(len(items)))
+            for p in items:
+                ps, mc = p.passport, p.medical_card
+                flags = (1 if ps else 0) | (2 if mc else 0)
+                write(cls.PET.pack(ref(p.__class__.__name__), ref(p.name), p.age,
+                                   ref(p.gender), ref(p.color), ref(p.breed), flags))
+                if ps:
+                    write(cls.PASSPORT.pack(ref(ps.pet_name), ps.age, ref(ps.color),
+                                            ref(ps.gender), ref(ps.breed),
+                                            ref(ps.birth_date)))
+                if mc:
+                    write(cls.CARD.pack(ref(mc.pet_name), mc.packed_vaccinations,
+                                        mc.packed_diseases))
+
+        def records(items):
+            write(cls.COUNT.pack(len(items)))
+            for rec in items:
+                write(cls.DICT_LEN.pack(len(rec)))
+                for k, v in rec.items():
+                    if isinstance(v, str):
+                        write(cls.STR_ITEM.pack(ref(k), 0, ref(v)))
+                    elif isinstance(v, int) and not isinstance(v, bool):
+                        write(cls.INT_ITEM.pack(ref(k), 1, v))
+                    else:
+                        write(cls.STR_ITEM.pack(
+                            ref(k), 2, ref(json.dumps(v, ensure_ascii=False))))
+
+        write(cls.COUNT.pack(len(manager.owners)))
+        for o in manager.owners:
+            write(cls.OWNER.pack(ref(o.name), o.age, ref(o.gender)))
+            pets(o.pets)
+        pets(manager.petshop.available_pets)
+        records(manager.petshop.sales)
+        records(manager.vetclinic.records)
+
+        table_offset = len(out)
+        encoded = [value.encode("utf-8") for value in strings]
+        write(cls.COUNT.pack(len(encoded)))
+        write(struct.pack(f"<{len(encoded)}I", *map(len, encoded)))
+        write(b"".join(encoded))
+        cls.HEADER.pack_into(out, 0, cls.MAGIC, cls.VERSION,
+                             manager.journal_seq, table_offset)
+        return bytes(out)
+
+    @classmethod
+    def load(cls, path: str, manager: "DataManager") -> bool:
+        """Загружает снимок в manager; False — файла нет или он пустой"""
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return False
+        with open(path, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, seq, table_offset = cls.HEADER.unpack_from(mm, 0)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f"{path}: неизвестный формат снимка")
+            (n,) = cls.COUNT.unpack_from(mm, table_offset)
+            pos = table_offset + cls.COUNT.size
+            lengths = struct.unpack_from(f"<{n}I", mm, pos)
+            pos += 4 * n
+            strings: List[Optional[str]] = []
+            for length in lengths:
+                strings.append(mm[pos:pos + length].decode("utf-8"))
+                pos += length
+            pos = cls.HEADER.size
+            new = object.__new__
+
+            def string(i: int) -> Optional[str]:
+                return None if i == cls.NONE else strings[i]
+
+            def pets():
+                nonlocal pos
+                (count,) = cls.COUNT.unpack_from(mm, pos)
+                pos += cls.COUNT.size
+                items = []
+                for _ in range(count):
+                    tag, name, age, gender, color, breed, flags = \
+                        cls.PET.unpack_from(mm, pos)
+                    pos += cls.PET.size
+                    pet = new(SPECIES[strings[tag]].cls)
+                    pet.name, pet.age = strings[name], age
+                    pet.gender, pet.color = strings[gender], strings[color]
+                    pet.breed = string(breed)
+                    pet.passport = None
+                    pet.medical_card = None
+                    if flags & 1:
+                        p_name, p_age, p_color, p_gender, p_breed, born = \
+                            cls.PASSPORT.unpack_from(mm, pos)
+                        pos += cls.PASSPORT.size
+                        ps = new(Passport)
+                        ps.pet_name, ps.age = strings[p_name], p_age
+                        ps.color, ps.gender = strings[p_color], strings[p_gender]
+                        ps.breed, ps.birth_date = string(p_breed), strings[born]
+                        pet.passport = ps
+                    if flags & 2:
+                        c_name, vacc, dis = cls.CARD.unpack_from(mm, pos)
+                        pos += cls.CARD.size
+                        mc = new(MedicalCard)
+                        mc.pet_name = strings[c_name]
+                        mc.packed_vaccinations, mc.packed_diseases = vacc, dis
+                        pet.medical_card = mc
+                    items.append(pet)
+                return items
+
+            def records():
+                nonlocal pos
+                (count,) = cls.COUNT.unpack_from(mm, pos)
+                pos += cls.COUNT.size
+                items = []
+                for _ in range(count):
+                    (size,) = cls.DICT_LEN.unpack_from(mm, pos)
+                    pos += cls.DICT_LEN.size
+                    rec = {}
+                    for _ in range(size):
+                        key, kind = cls.STR_ITEM.unpack_from(mm, pos)[:2]
+                        if kind == 1:
+                            rec[strings[key]] = cls.INT_ITEM.unpack_from(mm, pos)[2]
+                            pos += cls.INT_ITEM.size
+                        else:
+                            value = strings[cls.STR_ITEM.unpack_from(mm, pos)[2]]
+                            rec[strings[key]] = value if kind == 0 else json.loads(value)
+                            pos += cls.STR_ITEM.size
+                    items.append(rec)
+                return items
+
+            (count,) = cls.COUNT.unpack_from(mm, pos)
+            pos += cls.COUNT.size
+            owners = []
+            for _ in range(count):
+                name, age, gender = cls.OWNER.unpack_from(mm, pos)
+                pos += cls.OWNER.size
+                owners.append(Owner(strings[name], age, strings[gender], pets()))
+            manager.owners = owners
+            manager.petshop.available_pets = pets()
+            manager.petshop.sales = records()
+            manager.vetclinic.records = records()
+            manager.journal_seq = seq
+        return True
+
+
+def index_of(items: list, item) -> int:
+    """Позиция объекта в списке по идентичности (без сравнения полей)"""
+    if isinstance(items, LazyPets):
+        # Объект может быть только среди уже созданных: остальные не трогаем
+        items = items._items
+    for i, x in enumerate(items):
+        if x is item:
+            return i
+    raise ValueError("Объект не найден.")
+
+
+class Repository:
+    """Индексы по владельцам, питомцам, продажам и записям клиники.
+
+    Идентификаторы выдаются при добавлении в индекс и не меняются до конца
+    сеанса, в том числе после перезагрузки данных (build с previous):
+    номера не выдаются повторно, а объект, который до и после
+    перезагрузки однозначно узнаётся по полям, сохраняет свой номер.
+    Продажи и записи клиники ссылаются на имена, поэтому
+    индексируются по именам и по дню ("дд.мм.гг"); все их списки упорядочены
+    по времени (ts), интервалы ищутся двоичным поиском.
+
+    Для поиска по началу имени хранятся отсортированные списки различных
+    имён владельцев и питомцев.
+    """
+    # Значения owner в filter_pets помимо владельца и None (магазин)
+    ALL = "all"
+    OWNED = "owned"
+
+    def __init__(self):
+        self._next_id = 1
+        self._ids: Dict[int, int] = {}
+        # Номера, заранее назначенные объектам при перезагрузке: id(obj) → uid
+        self._preset: Dict[int, int] = {}
+        self.owners: Dict[int, Owner] = {}
+        self.pets: Dict[int, Pet] = {}
+        self.pet_owner: Dict[int, Optional[int]] = {}
+        self.owners_by_name: Dict[str, Dict[int, Owner]] = defaultdict(dict)
+        self.pets_by_name: Dict[str, Dict[int, Pet]] = defaultdict(dict)
+        self.pets_by_breed: Dict[str, Dict[int, Pet]] = defaultdict(dict)
+        self.pets_by_color: Dict[str, Dict[int, Pet]] = defaultdict(dict)
+        self.pets_by_type: Dict[str, Dict[int, Pet]] = defaultdict(dict)
+        self.owner_names: List[str] = []
+        self.pet_names: List[str] = []
+        self.sales_by_time: List[dict] = []
+        self.records_by_time: List[dict] = []
+        self.sales_by_owner: Dict[str, List[dict]] = defaultdict(list)
+        self.sales_by_pet: Dict[str, List[dict]] = defaultdict(list)
+        self.sales_by_date: Dict[str, List[dict]] = defaultdict(list)
+        self.records_by_pet: Dict[str, List[dict]] = defaultdict(list)
+        self.records_by_type: Dict[str, List[dict]] = defaultdict(list)
+        self.records_by_date: Dict[str, List[dict]] = defaultdict(list)
+
+    @classmethod
+    def build(cls, manager: "DataManager",
+              previous: Optional["Repository"] = None) -> "Repository":
+        """Индекс данных manager; previous — индекс тех же данных до
+        перезагрузки, его номера переносятся"""
+        repo = cls()
+        if previous is not None:
+            repo._next_id = previous._next_id
+            repo._preset = cls.carried_ids(previous, manager)
+        for o in manager.owners:
+            repo.add_owner(o)
+        for p in manager.petshop.available_pets:
+            repo.add_pet(p)
+        for s in manager.petshop.sales:
+            repo.add_sale(s)
+        for r in manager.vetclinic.records:
+            repo.add_record(r)
+        repo._preset = {}
+        return repo
+
+    @staticmethod
+    def owner_key(owner: Owner) -> tuple:
+        return ("owner", owner.name, owner.age, owner.gender)
+
+    @classmethod
+    def pet_key(cls, pet: Pet, owner: Optional[Owner]) -> tuple:
+        return ("pet", type(pet).__name__, pet.name, pet.age, pet.gender, pet.color,
+                pet.breed, cls.owner_key(owner) if owner is not None else None)
+
+    @classmethod
+    def keyed(cls, owners, shop) -> Iterator[Tuple[tuple, object]]:
+        """(ключ по полям, объект) для владельцев, их питомцев и магазина"""
+        for o in owners:
+            yield cls.owner_key(o), o
+            for p in o.pets:
+                yield cls.pet_key(p, o), p
+        for p in shop:
+            yield cls.pet_key(p, None), p
+
+    @classmethod
+    def carried_ids(cls, previous: "Repository", manager: "DataManager") -> Dict[int, int]:
+        """Номера из previous для объектов manager, чей ключ встречается
+        ровно один раз и до, и после перезагрузки. Одинаковые объекты
+        (например, два одинаковых котёнка в магазине) не сопоставить
+        надёжно — они получают новые номера."""
+        old: Dict[tuple, int] = {}
+        shop = [p for uid, p in previous.pets.items() if previous.pet_owner[uid] is None]
+        for key, obj in cls.keyed(previous.owners.values(), shop):
+            old[key] = 0 if key in old else previous.uid(obj)
+        new = list(cls.keyed(manager.owners, manager.petshop.available_pets))
+        counts = Counter(key for key, _ in new)
+        return {id(obj): old[key] for key, obj in new
+                if counts[key] == 1 and old.get(key)}
+
+    def issued(self, uid: int) -> bool:
+        """Номер уже выдавался (объект мог быть удалён или данные
+        перезагружены с другими объектами)"""
+        return 0 < uid < self._next_id
+
+    def uid(self, obj) -> Optional[int]:
+        """Идентификатор владельца или питомца"""
+        return self._ids.get(id(obj))
+
+    def _register(self, obj) -> int:
+        uid = self._preset.pop(id(obj), None)
+        if uid is None:
+            uid = self._next_id
+            self._next_id += 1
+        self._ids[id(obj)] = uid
+        return uid
+
+    @staticmethod
+    def _link(index: dict, key: str, uid: int, obj, names: Optional[list] = None):
+        bucket = index[key]
+        if not bucket and names is not None:
+            bisect.insort(names, key)
+        bucket[uid] = obj
+
+    @staticmethod
+    def _unlink(index: dict, key: str, uid: int, names: Optional[list] = None):
+        bucket = index[key]
+        del bucket[uid]
+        if not bucket:
+            del index[key]
+            if names is not None:
+                del names[bisect.bisect_left(names, key)]
+
+    def add_owner(self, owner: Owner):
+        uid = self._register(owner)
+        self.owners[uid] = owner
+        self._link(self.owners_by_name, owner.name, uid, owner, self.owner_names)
+        for p in owner.pets:
+            self.add_pet(p, owner)
+
+    def remove_owner(self, owner: Owner):
+        for p in owner.pets:
+            self.remove_pet(p)
+        uid = self._ids.pop(id(owner))
+        del self.owners[uid]
+        self._unlink(self.owners_by_name, owner.name, uid, self.owner_names)
+
+    def add_pet(self, pet: Pet, owner: Optional[Owner] = None):
+        uid = self._register(pet)
+        self.pets[uid] = pet
+        self.pet_owner[uid] = self.uid(owner) if owner else None
+        self._link(self.pets_by_name, pet.name, uid, pet, self.pet_names)
+        self._link(self.pets_by_breed, pet.breed or "", uid, pet)
+        self._link(self.pets_by_color, pet.color, uid, pet)
+        self._link(self.pets_by_type, type(pet).__name__, uid, pet)
+
+    def remove_pet(self, pet: Pet):
+        uid = self._ids.pop(id(pet))
+        del self.pets[uid]
+        del self.pet_owner[uid]
+        self._unlink(self.pets_by_name, pet.name, uid, self.pet_names)
+        self._unlink(self.pets_by_breed, pet.breed or "", uid)
+        self._unlink(self.pets_by_color, pet.color, uid)
+        self._unlink(self.pets_by_type, type(pet).__name__, uid)
+
+    def move_pet(self, pet: Pet, owner: Optional[Owner]):
+        self.pet_owner[self.uid(pet)] = self.uid(owner) if owner else None
+
+    def add_sale(self, rec: dict):
+        for items in (self.sales_by_time, self.sales_by_owner[rec["owner_name"]],
+                      self.sales_by_pet[rec["pet_name"]],
+                      self.sales_by_date[rec["date"][:8]]):
+            insert_by_time(items, rec)
+
+    def add_record(self, rec: dict):
+        for items in (self.records_by_time, self.records_by_pet[rec["pet_name"]],
+                      self.records_by_type[rec["type"]],
+                      self.records_by_date[rec["date"][:8]]):
+            insert_by_time(items, rec)
+
+    def trim_history(self, cutoff: int):
+        """Убирает продажи и записи раньше cutoff (перенесены в архив);
+        все списки упорядочены по времени, поэтому убирается начало"""
+        for items in (self.sales_by_time, self.records_by_time):
+            del items[:bisect.bisect_left(items, cutoff, key=record_ts)]
+        for index in (self.sales_by_owner, self.sales_by_pet, self.sales_by_date,
+                      self.records_by_pet, self.records_by_type, self.records_by_date):
+            for key in list(index):
+                items = index[key]
+                del items[:bisect.bisect_left(items, cutoff, key=record_ts)]
+                if not items:
+                    del index[key]
+
+    # Запросы
+
+    def owner(self, uid: int) -> Optional[Owner]:
+        return self.owners.get(uid)
+
+    def pet(self, uid: int) -> Optional[Pet]:
+        return self.pets.get(uid)
+
+    def owner_of(self, pet: Pet) -> Optional[Owner]:
+        """Владелец питомца, None — питомец в магазине"""
+        owner_uid = self.pet_owner.get(self.uid(pet))
+        return self.owners.get(owner_uid) if owner_uid else None
+
+    def find_owners(self, name: str) -> List[Owner]:
+        return list(self.owners_by_name.get(name, {}).values())
+
+    def find_pets(self, name: str) -> List[Pet]:
+        return list(self.pets_by_name.get(name, {}).values())
+
+    def pets_of_breed(self, breed: str) -> List[Pet]:
+        return list(self.pets_by_breed.get(breed, {}).values())
+
+    @staticmethod
+    def with_prefix(names: List[str], prefix: str) -> List[str]:
+        """Имена из отсортированного списка, начинающиеся с prefix"""
+        lo = bisect.bisect_left(names, prefix)
+        hi = bisect.bisect_left(names, prefix + "\U0010ffff")
+        return names[lo:hi]
+
+    def filter_owners(self, prefix: str = "") -> List[Owner]:
+        uids = [uid for name in self.with_prefix(self.owner_names, prefix)
+                for uid in self.owners_by_name[name]]
+        return [self.owners[uid] for uid in sorted(uids)]
+
+    def filter_pets(self, prefix: str = "", species: Optional[str] = None,
+                    breed: Optional[str] = None, color: Optional[str] = None,
+                    owner=ALL) -> List[Pet]:
+        """Питомцы по началу имени, виду (тег type), породе и цвету.
+
+        owner: Repository.ALL — все, Repository.OWNED — только у владельцев,
+        None — только в магазине, иначе — питомцы этого владельца.
+        Отбор начинается с самого короткого из подходящих списков индекса.
+        """
+        matches = []
+        if prefix:
+            matches.append({uid for name in self.with_prefix(self.pet_names, prefix)
+                            for uid in self.pets_by_name[name]})
+        for index, key in ((self.pets_by_type, species), (self.pets_by_breed, breed),
+                           (self.pets_by_color, color)):
+            if key is not None:
+                matches.append(index.get(key, {}).keys())
+        if matches:
+            matches.sort(key=len)
+            uids = set(matches[0]).intersection(*matches[1:])
+        else:
+            uids = self.pets.keys()
+        if owner is self.OWNED:
+            uids = [u for u in uids if self.pet_owner[u] is not None]
+        elif owner is not self.ALL:
+            target = self.uid(owner) if owner is not None else None
+            uids = [u for u in uids if self.pet_owner[u] == target]
+        return [self.pets[uid] for uid in sorted(uids)]
+
+    def sales_of_owner(self, name: str) -> List[dict]:
+        return self.sales_by_owner.get(name, [])
+
+    def sales_of_pet(self, name: str) -> List[dict]:
+        return self.sales_by_pet.get(name, [])
+
+    def sales_on(self, day: str) -> List[dict]:
+        return self.sales_by_date.get(day, [])
+
+    def records_of_pet(self, name: str) -> List[dict]:
+        return self.records_by_pet.get(name, [])
+
+    def records_of_type(self, rec_type: str) -> List[dict]:
+        return self.records_by_type.get(rec_type, [])
+
+    def records_on(self, day: str) -> List[dict]:
+        return self.records_by_date.get(day, [])
+
+    def sales_between(self, start: datetime, end: datetime) -> List[dict]:
+        return between(self.sales_by_time, start, end)
+
+    def records_between(self, start: datetime, end: datetime) -> List[dict]:
+        return between(self.records_by_time, start, end)
+
+    def last_records_of_pet(self, name: str, n: int) -> List[dict]:
+        """Последние n визитов питомца, от ранних к поздним"""
+        return self.records_of_pet(name)[-n:] if n > 0 else []
+
+
+class Archive:
+    """Архив старых продаж и записей клиники: файл gzip JSONL на вид
+    и месяц (archive/sales-2024-05.jsonl.gz), записи по времени.
+
+    Новые записи дописываются к файлу месяца отдельным членом gzip
+    (старое содержимое копируется без распаковки, файл заменяется
+    атомарно). Читается архив потоково, только нужные месяцы.
+    """
+    KINDS = ("sales", "records")
+    SUFFIX = ".jsonl.gz"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def month_of(ts: float) -> str:
+        return time.strftime("%Y-%m", time.localtime(ts))
+
+    def file(self, kind: str, month: str) -> str:
+        return os.path.join(self.path, f"{kind}-{month}{self.SUFFIX}")
+
+    def files(self, kind: str) -> List[Tuple[str, str]]:
+        """(месяц, путь) файлов вида kind по возрастанию месяца"""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        prefix = f"{kind}-"
+        return sorted((name[len(prefix):-len(self.SUFFIX)], os.path.join(self.path, name))
+                      for name in names
+                      if name.startswith(prefix) and name.endswith(self.SUFFIX))
+
+    @staticmethod
+    def read_file(path: str) -> Iterator[dict]:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def add(self, kind: str, records: List[dict]) -> int:
+        """Дописывает записи (по времени) в файлы месяцев. Уже лежащие
+        в файле месяца (повтор после сбоя между записью архива и
+        сохранением данных) пропускаются; сравниваются записи целиком,
+        а не время, — поздно внесённая запись за старую дату тоже
+        попадёт в архив. Возвращает число записанных."""
+        months: Dict[str, List[dict]] = defaultdict(list)
+        for rec in records:
+            months[self.month_of(record_ts(rec))].append(rec)
+        if months:
+            os.makedirs(self.path, exist_ok=True)
+        written = 0
+        for month, recs in months.items():
+            path = self.file(kind, month)
+            try:
+                with open(path, "rb") as f:
+                    old = f.read()
+            except FileNotFoundError:
+                old = b""
+            lines = [json.dumps(rec, ensure_ascii=False) + "\n" for rec in recs]
+            if old:
+                stored = set(gzip.decompress(old).decode("utf-8").splitlines(keepends=True))
+                lines = [line for line in lines if line not in stored]
+            if not lines:
+                continue
+            with atomic_write(path, binary=True) as f:
+                f.write(old)
+                f.write(gzip.compress("".join(lines).encode("utf-8")))
+            written += len(lines)
+        return written
+
+    def read(self, kind: str, start: Optional[float] = None,
+             end: Optional[float] = None) -> Iterator[dict]:
+        """Записи вида kind с start по end (секунды эпохи, включительно)"""
+        first = self.month_of(start) if start is not None else None
+        last = self.month_of(end) if end is not None else None
+        for month, path in self.files(kind):
+            if (first and month < first) or (last and month > last):
+                continue
+            for rec in self.read_file(path):
+                ts = record_ts(rec)
+                if (start is None or ts >= start) and (end is None or ts <= end):
+                    yield rec
+
+
+class ConflictError(Exception):
+    """Изменение опирается на данные, которые уже изменил другой процесс"""
 
 
 class DataManager:
     JSON_FILE = "data.json"
     XML_FILE = "data.xml"
-
-    def __init__(self):
+    BIN_FILE = "data.bin"
+    # Формат основного снимка: data.json или двоичный data.bin
+    FORMATS = ("json", "binary")
+    JOURNAL_FILE = "data.journal"
+    # Архив старых продаж и записей клиники (retention)
+    ARCHIVE_DIR = "archive"
+    # Блокировка общего режима (несколько процессов с одними файлами)
+    LOCK_FILE = "data.lock"
+    # Сколько последних записей журнала общий режим оставляет после
+    # компакции: отставшие на столько процессы догоняют без перезагрузки
+    KEEP_TAIL = 200
+    # После скольких записей журнала делать снимок (компакцию)
+    COMPACT_EVERY = 1000
+    # Как save_all пишет data.xml: вслед за JSON, в отдельном процессе
+    # параллельно с JSON или никак (тогда только экспорт по запросу)
+    XML_MODES = ("sync", "parallel", "off")
+
+    def __init__(self, journal: bool = False, lazy: bool = False,
+                 storage: Optional["Storage"] = None,
+                 debounce: Optional[float] = None, xml_mode: str = "sync",
+                 snapshot_format: str = "json", shared: bool = False,
+                 fragment_cache: bool = False):
         self.owners: List[Owner] = []
         self.petshop = PetShop(name="Зоомагазин", address="ул. Главная, 1")
         self.vetclinic = VetClinic("Ветклиника", "ул. Здоровая, 2")
+        # Общий режим: изменения идут через журнал под межпроцессной
+        # блокировкой, версия данных — номер последней записи журнала
+        if shared and storage is not None:
+            raise ValueError("Общий режим работает с журналом, а не с внешним хранилищем")
+        self.journal = journal or shared
+        self.file_lock = FileLock(self.LOCK_FILE) if shared else None
+        self.lazy = lazy
+        # Внешнее хранилище (например, SQLite) вместо файлов JSON/XML
+        self.storage = storage
+        # Изменения данных и снимок для сохранения берутся под этой блокировкой
+        self.lock = threading.RLock()
+        if xml_mode not in self.XML_MODES:
+            raise ValueError(f"Неизвестный режим XML: {xml_mode}")
+        self.xml_mode = xml_mode
+        if snapshot_format not in self.FORMATS:
+            raise ValueError(f"Неизвестный формат снимка: {snapshot_format}")
+        self.snapshot_format = snapshot_format
+        self._xml_pool: Optional[ProcessPoolExecutor] = None
+        self.saver: Optional[BackgroundSaver] = None
+        if debounce is not None and storage is None and not self.journal:
+            self.saver = BackgroundSaver(self, debounce)
+        self.journal_seq = 0
+        self._journal_pending = 0
+        # Сколько байт журнала уже применено и какой это файл: после
+        # компакции журнал заменяется новым файлом
+        self._journal_offset = 0
+        self._journal_ino: Optional[int] = None
+        self._journal_tail: deque = deque(maxlen=self.KEEP_TAIL if shared else 0)
+        self._replaying = False
+        # Изменения внутри deferred(), ещё не зафиксированные: (op, data)
+        self._deferred: Optional[List[Tuple[str, dict]]] = None
+        self._index: Optional[Repository] = None
+        self.archive_store = Archive(self.ARCHIVE_DIR)
+        # Готовые фрагменты data.json/data.xml между сохранениями — только
+        # по запросу: это ещё столько же памяти, сколько весь снимок в
+        # тексте (около 4 КБ на питомца с владельцем и XML). В ленивом
+        # режиме не держим, чтобы не хранить в памяти всех питомцев
+        self._fragments: Optional[SnapshotCache] = (
+            SnapshotCache() if fragment_cache and not lazy else None)
+
+    @property
+    def index(self) -> Repository:
+        """Индексы строятся при первом обращении и далее обновляются
+        вместе с изменениями"""
+        if self._index is None:
+            self._index = Repository.build(self)
+        return self._index
+
+    def commit(self, op: str, **data):
+        """Фиксирует изменение: в режиме журнала дописывает одну запись,
+        иначе пересохраняет все данные"""
+        if self._replaying:
+            return
+        if self._deferred is not None:
+            self._deferred.append((op, data))
+            return
+        if self.storage is not None:
+            with STATS.phase("storage.commit"):
+                self.storage.commit(self, op, data)
+            return
+        if self.saver is not None:
+            self.saver.mark_dirty()
+            return
+        if not self.journal:
+            self.save_all()
+            return
+        self.append_journal([(op, data)])
+
+    def append_journal(self, ops: List[Tuple[str, dict]]):
+        """Дописывает изменения в журнал одной записью в файл"""
+        lines = []
+        for op, data in ops:
+            self.journal_seq += 1
+            entry = {"seq": self.journal_seq, "op": op, **data}
+            lines.append((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._journal_tail.extend(lines)
+        STATS.count("journal_entries", len(lines))
+        STATS.count("bytes_written", sum(map(len, lines)))
+        with STATS.phase("journal.append"), open(self.JOURNAL_FILE, "ab") as f:
+            if (os.fstat(f.fileno()).st_ino == self._journal_ino and
+                    f.tell() > self._journal_offset):
+                # Оборванная запись после сбоя: иначе новые записи склеятся
+                # с ней в одну нечитаемую строку и пропадут при загрузке
+                f.truncate(self._journal_offset)
+            f.write(b"".join(lines))
+            self._journal_offset = f.tell()
+            self._journal_ino = os.fstat(f.fileno()).st_ino
+        self._journal_pending += len(lines)
+        if self._journal_pending >= self.COMPACT_EVERY:
+            self.compact()
+
+    @contextmanager
+    def deferred(self):
+        """Пакетные изменения: внутри блока commit только запоминает их,
+        а при выходе они фиксируются разом — одной дописью в журнал, одной
+        транзакцией хранилища или одним сохранением файлов. Блок держит transaction(),
+        поэтому в общем режиме другие процессы ждут его окончания."""
+        with self.transaction():
+            if self._deferred is not None:
+                yield
+                return
+            self._deferred = []
+            try:
+                yield
+            finally:
+                ops, self._deferred = self._deferred, None
+                if ops:
+                    self.flush(ops)
+
+    def flush(self, ops: List[Tuple[str, dict]]):
+        if self.storage is not None:
+            with STATS.phase("storage.commit"):
+                self.storage.commit_many(self, ops)
+        elif self.saver is not None:
+            self.saver.mark_dirty()
+        elif self.journal:
+            self.append_journal(ops)
+        else:
+            self.save_all()
+
+    def close(self, save: bool = True):
+        """Сохранение при выходе из программы; save=False — только закрыть
+        хранилище, когда все изменения уже зафиксированы"""
+        if self.storage is not None:
+            self.storage.close()
+        elif self.saver is not None:
+            self.saver.stop()
+        elif save:
+            self.save_all()
+        if self._xml_pool is not None:
+            self._xml_pool.shutdown()
+            self._xml_pool = None
+
+    def xml_pool(self) -> ProcessPoolExecutor:
+        """Процесс для построения XML (не делит GIL с основным)"""
+        if self._xml_pool is None:
+            # spawn, а не fork: в процессе могут работать потоки
+            self._xml_pool = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._xml_pool
+
+    def compact(self):
+        """Сворачивает журнал в снимок data.json/data.xml"""
+        self.save_all()
+
+    @contextmanager
+    def transaction(self):
+        """Блокировка на время изменения. В общем режиме ещё и
+        межпроцессная: сначала применяются записи журнала других процессов,
+        и изменение ложится поверх последней версии данных"""
+        with self.lock:
+            if self.file_lock is None or self._replaying:
+                yield
+                return
+            with self.file_lock:
+                self.sync()
+                yield
+
+    def sync(self):
+        """Подтягивает изменения других процессов из журнала (под file_lock).
+        Если журнал сжат другим процессом, данные загружаются заново."""
+        try:
+            st = os.stat(self.JOURNAL_FILE)
+            ino, size = st.st_ino, st.st_size
+        except FileNotFoundError:
+            ino, size = None, 0
+        if ino == self._journal_ino and size == self._journal_offset:
+            return
+        # Новый файл журнала (после компакции) читается с начала: если
+        # снимок не опередил эти данные, перезагрузка не нужна
+        same = ino == self._journal_ino and size >= self._journal_offset
+        if not self.replay_journal(self._journal_offset if same else 0, strict=True):
+            self._load()
+
+    @staticmethod
+    def position(items: list, item) -> int:
+        """Позиция объекта; если его уже нет (удалён или продан другим
+        процессом), — ConflictError"""
+        try:
+            return index_of(items, item)
+        except ValueError:
+            raise ConflictError(
+                "Данные изменены другим оператором, повторите действие.") from None
 
-    def save_all(self):
+    def owner_index(self, owner: Owner) -> int:
+        return self.position(self.owners, owner)
+
+    # Изменения данных: обновляют индексы и фиксируются через commit.
+    # Позиции (при повторе журнала) можно передавать и самими объектами:
+    # тогда позиция ищется уже под блокировкой, после sync.
+
+    def add_owner(self, owner: Owner):
+        with self.transaction():
+            self.owners.append(owner)
+            if self._index is not None:
+                self._index.add_owner(owner)
+            self.commit("add_owner", owner=encode(owner))
+
+    def remove_owner(self, owner: Union[int, Owner]) -> Owner:
+        with self.transaction():
+            idx = owner if isinstance(owner, int) else self.owner_index(owner)
+            owner = self.owners.pop(idx)
+            if self._index is not None:
+                self._index.remove_owner(owner)
+            self.commit("remove_owner", owner=idx)
+            return owner
+
+    def add_shop_pet(self, pet: Pet):
+        with self.transaction():
+            self.petshop.available_pets.append(pet)
+            if self._index is not None:
+                self._index.add_pet(pet)
+            self.commit("add_shop_pet", pet=encode(pet))
+
+    def sell_pet(self, owner: Owner, pet: Union[int, Pet],
+                 date: Optional[str] = None) -> dict:
+        """pet — номер питомца в магазине (с 1) или сам питомец"""
+        with self.transaction():
+            # Позиции — до изменений: владелец или питомец могли уже
+            # исчезнуть в другом процессе
+            owner_idx = self.owner_index(owner)
+            idx = pet if isinstance(pet, int) else (
+                self.position(self.petshop.available_pets, pet) + 1)
+            rec = self.petshop.sell_pet(owner, idx, date)
+            if self._index is not None:
+                self._index.move_pet(owner.pets[-1], owner)
+                self._index.add_sale(rec)
+            self.commit("sell_pet", owner=owner_idx, pet=idx, record=rec)
+            return rec
+
+    def remove_pet(self, owner: Owner, pet: Union[int, Pet]) -> Optional[Pet]:
+        with self.transaction():
+            owner_idx = self.owner_index(owner)
+            idx = pet if isinstance(pet, int) else self.position(owner.pets, pet)
+            pet = owner.remove_pet(idx)
+            if pet is None:
+                return None
+            if self._index is not None:
+                self._index.remove_pet(pet)
+            self.commit("remove_pet", owner=owner_idx, pet=idx)
+            return pet
+
+    def treat(self, owner: Owner, pet: Pet, diseases: List[Disease],
+              vaccines: List[Vaccine]) -> List[dict]:
+        """Визит в клинику: болезни и прививки в медкарту и записи клиники
+        одним изменением; возвращает добавленные записи"""
+        if not diseases and not vaccines:
+            return []
+        with self.transaction():
+            owner_idx = self.owner_index(owner)
+            pet_idx = self.position(owner.pets, pet)
+            clinic = self.vetclinic
+            records = [clinic.add_disease(pet, d) for d in diseases]
+            records += [clinic.add_vaccination(pet, v) for v in vaccines]
+            if self._index is not None:
+                for rec in records:
+                    self._index.add_record(rec)
+            self.commit("vet_records", owner=owner_idx, pet=pet_idx, records=records)
+            return records
+
+    def import_batch(self, owners: List[Owner],
+                     pets: List[Tuple[Optional[int], Pet]]):
+        """Добавляет пачку владельцев и питомцев одним commit.
+
+        pets — пары (позиция владельца в self.owners или None для магазина,
+        питомец); позиции могут указывать на владельцев из этой же пачки.
+        """
+        with self.transaction():
+            # Владельцы кодируются до раздачи питомцев, иначе питомцы
+            # попадут в запись дважды
+            data = {"owners": [encode(o) for o in owners], "pets": []}
+            for o in owners:
+                self.owners.append(o)
+                if self._index is not None:
+                    self._index.add_owner(o)
+            for pos, pet in pets:
+                owner = None
+                if pos is None:
+                    self.petshop.available_pets.append(pet)
+                else:
+                    owner = self.owners[pos]
+                    owner.add_pet(pet)
+                if self._index is not None:
+                    self._index.add_pet(pet, owner)
+                data["pets"].append({"owner": pos, "pet": encode(pet)})
+            self.commit("import", **data)
+
+    def archive(self, before: datetime) -> Tuple[int, int]:
+        """Переносит продажи и записи клиники старше before в архив.
+        Файлы архива пишутся до изменения данных, поэтому при сбое
+        между ними записи не теряются, а повтор их не задублирует.
+        Возвращает (продаж, записей)."""
+        cutoff = int(before.timestamp())
+        with self.transaction():
+            sales = self.petshop.sales
+            sales = sales[:bisect.bisect_left(sales, cutoff, key=record_ts)]
+            records = self.vetclinic.records
+            records = records[:bisect.bisect_left(records, cutoff, key=record_ts)]
+            if not sales and not records:
+                return 0, 0
+            with STATS.phase("archive.write"):
+                self.archive_store.add("sales", sales)
+                self.archive_store.add("records", records)
+            self.trim_history(cutoff)
+            STATS.count("archived", len(sales) + len(records))
+            self.commit("archive", before=cutoff)
+            return len(sales), len(records)
+
+    def trim_history(self, cutoff: int):
+        """Убирает из данных продажи и записи раньше cutoff (уже в архиве)"""
+        for items in (self.petshop.sales, self.vetclinic.records):
+            del items[:bisect.bisect_left(items, cutoff, key=record_ts)]
+        if self._index is not None:
+            self._index.trim_history(cutoff)
+
+    def history(self, kind: str, start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> Iterator[dict]:
+        """Продажи (sales) или записи клиники (records) с start по end
+        включительно по времени: сначала потоково из архива, затем из
+        текущих данных. Без границ — вся история."""
+        items = self.petshop.sales if kind == "sales" else self.vetclinic.records
+        start_ts = start.timestamp() if start is not None else None
+        end_ts = end.timestamp() if end is not None else None
+        yield from self.archive_store.read(kind, start_ts, end_ts)
+        lo = 0 if start_ts is None else bisect.bisect_left(items, start_ts, key=record_ts)
+        hi = (len(items) if end_ts is None else
+              bisect.bisect_right(items, end_ts, key=record_ts))
+        yield from items[lo:hi]
+
+    def build_payload(self) -> dict:
+        """Данные для записи; строится один раз и для JSON, и для XML"""
         payload = {
-            "owners": [asdict(o) for o in self.owners],
+            "owners": [encode(o) for o in self.owners],
             "petshop": {
-                "available_pets": [asdict(p) for p in self.petshop.available_pets],
-                "sales": self.petshop.sales
+                "available_pets": [encode(p) for p in self.petshop.available_pets],
+                "sales": list(self.petshop.sales)
             },
-            "vetclinic": {"records": self.vetclinic.records}
+            "vetclinic": {"records": list(self.vetclinic.records)}
         }
+        if self.journal:
+            payload["journal_seq"] = self.journal_seq
+        STATS.count("objects_serialized", len(payload["owners"]) + sum(
+            len(o.pets) for o in self.owners) + len(payload["petshop"]["available_pets"])
+            + len(self.petshop.sales) + len(self.vetclinic.records))
+        return payload
 
-        # JSON
-        with open(self.JSON_FILE, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=4)
-
-        # XML
-        root = ET.Element("data")
-        owners_el = ET.SubElement(root, "owners")
-        for o in self.owners:
-            o_el = ET.SubElement(owners_el, "owner")
-            ET.SubElement(o_el, "name").text = o.name
-            ET.SubElement(o_el, "age").text = str(o.age)
-            ET.SubElement(o_el, "gender").text = o.gender
-            pets_el = ET.SubElement(o_el, "pets")
-            for p in o.pets:
-                p_el = ET.SubElement(pets_el, "pet", type=p.__class__.__name__)
-                ET.SubElement(p_el, "name").text = p.name
-                ET.SubElement(p_el, "age").text = str(p.age)
-                ET.SubElement(p_el, "gender").text = p.gender
-                ET.SubElement(p_el, "color").text = p.color
-                ET.SubElement(p_el, "breed").text = p.breed if p.breed else ""
-                if p.passport:
-                    pass_el = ET.SubElement(p_el, "passport")
-                    for k, v in asdict(p.passport).items():
-                        ET.SubElement(pass_el, k).text = str(v)
-                if p.medical_card:
-                    med_el = ET.SubElement(p_el, "medical_card")
-                    vacc_el = ET.SubElement(med_el, "vaccinations")
-                    for v in p.medical_card.vaccinations:
-                        ET.SubElement(vacc_el, "vaccine").text = v
-                    dis_el = ET.SubElement(med_el, "diseases")
-                    for d in p.medical_card.diseases:
-                        ET.SubElement(dis_el, "disease").text = d
-
-        # PetShop
-        petshop_el = ET.SubElement(root, "petshop")
-        avail_el = ET.SubElement(petshop_el, "available_pets")
-        for p in self.petshop.available_pets:
-            p_el = ET.SubElement(avail_el, "pet", type=p.__class__.__name__)
-            for k, v in asdict(p).items():
-                if v is None:
-                    continue
-                if isinstance(v, dict):
-                    sub = ET.SubElement(p_el, k)
-                    for kk, vv in v.items():
-                        ET.SubElement(sub, kk).text = str(vv)
+    def save_all(self):
+        STATS.count("saves")
+        with STATS.phase("save"):
+            if self.file_lock is not None:
+                # Общий режим: снимок пишется под межпроцессной блокировкой
+                # и уже с изменениями других процессов
+                with self.transaction():
+                    self.write_snapshot()
+            else:
+                self.write_snapshot()
+
+    def write_snapshot(self):
+        # Снимок берётся под блокировкой, запись в файлы идёт уже без неё
+        binary = self.snapshot_format == "binary"
+        cache = self._fragments
+        with self.lock:
+            payload = json_parts = xml_parts = None
+            if not binary and cache is not None:
+                # Заново кодируются только изменённые объекты
+                hits, misses = cache.hits, cache.misses
+                with STATS.phase("save.fragments"):
+                    json_parts, xml_parts = cache.build(self, xml=self.xml_mode == "sync")
+                STATS.count("objects_serialized", cache.misses - misses)
+                STATS.count("fragments_reused", cache.hits - hits)
+            if (self.xml_mode == "parallel" or
+                    (json_parts is None and (not binary or self.xml_mode != "off"))):
+                with STATS.phase("save.payload"):
+                    payload = self.build_payload()
+            if binary:
+                with STATS.phase("save.binary.encode"):
+                    blob = BinarySnapshot.dump(self)
+
+        xml_job = None
+        if self.xml_mode == "parallel":
+            xml_job = self.xml_pool().submit(write_xml, self.XML_FILE, payload)
+
+        if binary:
+            with STATS.phase("save.binary"), atomic_write(self.BIN_FILE, binary=True) as f:
+                f.write(blob)
+        else:
+            with STATS.phase("save.json"), atomic_write(self.JSON_FILE) as f:
+                if json_parts is not None:
+                    f.writelines(json_parts)
                 else:
-                    ET.SubElement(p_el, k).text = str(v)
-        sales_el = ET.SubElement(petshop_el, "sales")
-        for s in self.petshop.sales:
-            r = ET.SubElement(sales_el, "record")
-            for k, v in s.items():
-                ET.SubElement(r, k).text = str(v)
+                    json.dump(payload, f, ensure_ascii=False, indent=4)
+
+        if xml_job is not None:
+            with STATS.phase("save.xml.wait"):
+                xml_job.result()
+        elif xml_parts is not None:
+            with STATS.phase("save.xml"):
+                write_xml_parts(self.XML_FILE, xml_parts)
+        elif self.xml_mode == "sync":
+            self.save_xml(payload)
+
+        # Снимок содержит все записи журнала, журнал можно очистить
+        # Журнал заменяется новым файлом с отметкой о снимке: по ней другие
+        # процессы общего режима видят, включает ли снимок что-то новое
+        if self.journal:
+            marker = json.dumps({"seq": self.journal_seq, "op": "snapshot"}) + "\n"
+            with atomic_write(self.JOURNAL_FILE, binary=True) as f:
+                f.writelines(self._journal_tail)
+                f.write(marker.encode("utf-8"))
+            st = os.stat(self.JOURNAL_FILE)
+            self._journal_ino, self._journal_offset = st.st_ino, st.st_size
+            self._journal_pending = 0
+
+    def save_xml(self, payload: Optional[dict] = None):
+        """Запись data.xml; без аргументов — из текущих данных (экспорт по
+        запросу): объекты кодируются по одному по ходу записи, под
+        блокировкой, без полной копии данных в памяти"""
+        if payload is None:
+            with self.lock, STATS.phase("save.xml"):
+                write_xml(self.XML_FILE, self.payload_view())
+            return
+        with STATS.phase("save.xml"):
+            write_xml(self.XML_FILE, payload)
+
+    def payload_view(self) -> dict:
+        """Как build_payload, но владельцы (с питомцами) и питомцы магазина
+        кодируются при обходе; читать только под self.lock"""
+        return {
+            "owners": (encode(o) for o in self.owners),
+            "petshop": {
+                "available_pets": (encode(p) for p in self.petshop.available_pets),
+                "sales": self.petshop.sales
+            },
+            "vetclinic": {"records": self.vetclinic.records}
+        }
 
-        # VetClinic
-        clinic_el = ET.SubElement(root, "vetclinic")
-        records_el = ET.SubElement(clinic_el, "records")
-        for r in self.vetclinic.records:
-            rec_el = ET.SubElement(records_el, "record")
-            for k, v in r.items():
-                ET.SubElement(rec_el, k).text = str(v)
-
-        xml_str = minidom.parseString(
-            ET.tostring(root)).toprettyxml(indent="  ")
-        with open(self.XML_FILE, "w", encoding="utf-8") as f:
-            f.write(xml_str)
+    @staticmethod
+    def pet_from_dict(pd: dict) -> Pet:
+        """Питомец из сохранённого словаря без потерь: паспорт и медкарта
+        восстанавливаются такими, какими были сохранены"""
+        cls = pet_class(pd)
+        if "passport" in pd and "medical_card" in pd:
+            return decode(cls, pd)
+        # Неполная запись: паспорт и медкарта создаются заново
+        return cls(pd["name"], pd["age"], pd["gender"],
+                   pd["color"], pd.get("breed"))
 
     def load_all(self):
+        STATS.count("loads")
+        with STATS.phase("load"):
+            if self.file_lock is not None:
+                with self.lock, self.file_lock:
+                    self._load()
+            else:
+                self._load()
+
+    def _load(self):
+        # Индекс строится заново по новым объектам, но с прежними номерами
+        previous, self._index = self._index, None
+        if self._fragments is not None:
+            self._fragments = SnapshotCache()
+        # Старые объекты больше не покажут — не держим их в кэше
+        RENDER_CACHE.clear()
+        self.owners = []
+        self.petshop.available_pets, self.petshop.sales = [], []
+        self.vetclinic.records = []
+        self.journal_seq = self._journal_pending = 0
+        if self.storage is not None:
+            with STATS.phase("load.storage"):
+                self.storage.load(self)
+        elif self.snapshot_format == "binary":
+            with STATS.phase("load.binary"):
+                BinarySnapshot.load(self.BIN_FILE, self)
+        elif self.lazy:
+            with STATS.phase("load.streaming"):
+                self.load_streaming()
+        else:
+            self.load_json()
+        # Продажи и записи клиники держатся упорядоченными по времени;
+        # у записей старого формата время разбирается здесь один раз
+        with STATS.phase("load.sort"):
+            self.petshop.sales.sort(key=record_ts)
+            self.vetclinic.records.sort(key=record_ts)
+        if self.journal:
+            with STATS.phase("load.journal"):
+                self.replay_journal()
+        if previous is not None:
+            self._index = Repository.build(self, previous)
+        STATS.count("objects_loaded", len(self.owners) + len(self.petshop.available_pets)
+                    + len(self.petshop.sales) + len(self.vetclinic.records))
+
+    def load_json(self):
+        data = None
+        if os.path.exists(self.JSON_FILE):
+            try:
+                with STATS.phase("load.json.parse"), \
+                        open(self.JSON_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                    STATS.count("bytes_read", f.buffer.tell())
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = None
+
+        if data is not None:
+            with STATS.phase("load.json.objects"):
+                self.owners = []
+                for od in data.get("owners", []):
+                    pets = [self.pet_from_dict(pd) for pd in od.get("pets", [])]
+                    owner = Owner(od["name"], od["age"], od["gender"], pets)
+                    self.owners.append(owner)
+
+                # PetShop
+                ps_data = data.get("petshop", {})
+                self.petshop.available_pets = [
+                    self.pet_from_dict(pd) for pd in ps_data.get("available_pets", [])]
+                self.petshop.sales = ps_data.get("sales", [])
+
+                # VetClinic
+                self.vetclinic.records = data.get(
+                    "vetclinic", {}).get("records", [])
+                self.journal_seq = data.get("journal_seq", 0)
+
+    def load_streaming(self):
+        """Загрузка по частям: владельцы и питомцы магазина читаются
+        из файла по одному, объекты Pet создаются при первом обращении"""
         if not os.path.exists(self.JSON_FILE):
             return
+        owners, pets, sales, records, seq = [], LazyPets(), [], [], 0
         try:
             with open(self.JSON_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+                js = JsonStream(f)
+                for key in js.iter_object():
+                    if key == "owners":
+                        for od in js.iter_array():
+                            owners.append(Owner(od["name"], od["age"], od["gender"],
+                                                LazyPets(od.get("pets", []))))
+                    elif key == "petshop":
+                        for k in js.iter_object():
+                            if k == "available_pets":
+                                pets = LazyPets(js.iter_array())
+                            elif k == "sales":
+                                sales = list(js.iter_array())
+                            else:
+                                js.value()
+                    elif key == "vetclinic":
+                        for k in js.iter_object():
+                            if k == "records":
+                                records = list(js.iter_array())
+                            else:
+                                js.value()
+                    elif key == "journal_seq":
+                        seq = js.value()
+                    else:
+                        js.value()
+        except json.JSONDecodeError:
             return
+        self.owners = owners
+        self.petshop.available_pets = pets
+        self.petshop.sales = sales
+        self.vetclinic.records = records
+        self.journal_seq = seq
+
+    def replay_journal(self, offset: int = 0, strict: bool = False) -> bool:
+        """Применяет записи журнала, которых ещё нет в данных, начиная
+        с offset байт. strict (sync общего режима): False, если журнал не
+        продолжает текущую версию — пропуск номеров или снимок новее
+        данных, — тогда нужна полная загрузка."""
+        try:
+            f = open(self.JOURNAL_FILE, "rb")
+        except FileNotFoundError:
+            return True
+        with f:
+            ino = os.fstat(f.fileno()).st_ino
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Оборванная последняя запись (сбой во время записи)
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    if strict:
+                        return False
+                    break
+                if entry["op"] == "snapshot":
+                    if strict and entry["seq"] > self.journal_seq:
+                        return False
+                elif entry["seq"] > self.journal_seq:
+                    if strict and entry["seq"] != self.journal_seq + 1:
+                        return False
+                    self._replaying = True
+                    try:
+                        self.apply(entry)
+                    finally:
+                        self._replaying = False
+                    self.journal_seq = entry["seq"]
+                    self._journal_pending += 1
+                    self._journal_tail.append(line)
+                offset += len(line)
+        self._journal_ino, self._journal_offset = ino, offset
+        return True
+
+    def apply(self, entry: dict):
+        """Повторяет одно изменение из журнала"""
+        op = entry["op"]
+        if op == "add_owner":
+            od = entry["owner"]
+            self.add_owner(Owner(od["name"], od["age"], od["gender"]))
+        elif op == "remove_owner":
+            self.remove_owner(entry["owner"])
+        elif op == "add_shop_pet":
+            self.add_shop_pet(self.pet_from_dict(entry["pet"]))
+        elif op == "sell_pet":
+            self.sell_pet(self.owners[entry["owner"]], entry["pet"],
+                          entry["record"]["date"])
+        elif op == "remove_pet":
+            self.remove_pet(self.owners[entry["owner"]], entry["pet"])
+        elif op == "vet_records":
+            owner = self.owners[entry["owner"]]
+            pet = owner.pets[entry["pet"]]
+            for rec in entry["records"]:
+                self.vetclinic.add_record(pet, rec)
+                if self._index is not None:
+                    self._index.add_record(rec)
+        elif op == "import":
+            self.import_batch(
+                [Owner(od["name"], od["age"], od["gender"]) for od in entry["owners"]],
+                [(item["owner"], self.pet_from_dict(item["pet"]))
+                 for item in entry["pets"]])
+        elif op == "archive":
+            self.trim_history(entry["before"])
+        else:
+            raise ValueError(f"Неизвестная операция журнала: {op}")
+
+
+class Storage:
+    """Хранилище для DataManager.
+
+    commit получает те же операции, что пишутся в журнал (позиции владельцев
+    и питомцев в списках DataManager), уже после изменения в памяти;
+    commit_many — пачку таких операций из deferred() по порядку.
+    """
+
+    def load(self, manager: DataManager):
+        raise NotImplementedError
+
+    def save(self, manager: DataManager):
+        """Полная запись всех данных"""
+        raise NotImplementedError
+
+    def commit(self, manager: DataManager, op: str, data: dict):
+        self.save(manager)
+
+    def commit_many(self, manager: DataManager, ops: List[Tuple[str, dict]]):
+        self.save(manager)
+
+    def close(self):
+        pass
+
+
+class SqliteStorage(Storage):
+    """Хранение в SQLite: каждое изменение — несколько строк в одной транзакции"""
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS owners (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        age INTEGER NOT NULL,
+        gender TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS pets (
+        id INTEGER PRIMARY KEY,
+        owner_id INTEGER REFERENCES owners(id) ON DELETE CASCADE,
+        pos INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        name TEXT NOT NULL,
+        age INTEGER NOT NULL,
+        gender TEXT NOT NULL,
+        color TEXT NOT NULL,
+        breed TEXT
+    );
+    CREATE TABLE IF NOT EXISTS passports (
+        pet_id INTEGER PRIMARY KEY REFERENCES pets(id) ON DELETE CASCADE,
+        pet_name TEXT NOT NULL,
+        age INTEGER NOT NULL,
+        color TEXT NOT NULL,
+        gender TEXT NOT NULL,
+        breed TEXT,
+        birth_date TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS medical_cards (
+        pet_id INTEGER PRIMARY KEY REFERENCES pets(id) ON DELETE CASCADE,
+        pet_name TEXT NOT NULL,
+        vaccinations TEXT NOT NULL,
+        diseases TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER PRIMARY KEY,
+        owner_name TEXT NOT NULL,
+        pet_name TEXT NOT NULL,
+        date TEXT NOT NULL,
+        ts INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS vet_records (
+        id INTEGER PRIMARY KEY,
+        pet_name TEXT NOT NULL,
+        type TEXT NOT NULL,
+        detail TEXT NOT NULL,
+        date TEXT NOT NULL,
+        ts INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS pets_owner ON pets(owner_id, pos);
+    CREATE INDEX IF NOT EXISTS pets_breed ON pets(breed);
+    CREATE INDEX IF NOT EXISTS sales_owner ON sales(owner_name);
+    CREATE INDEX IF NOT EXISTS sales_pet ON sales(pet_name);
+    CREATE INDEX IF NOT EXISTS vet_records_pet ON vet_records(pet_name);
+    CREATE INDEX IF NOT EXISTS vet_records_type ON vet_records(type);
+    """
+    # Столбцы ts, добавленные после первой версии схемы: в старых базах
+    # создаются и заполняются из date при открытии
+    TIME_TABLES = ("sales", "vet_records")
+    TIME_INDEXES = """
+    CREATE INDEX IF NOT EXISTS sales_ts ON sales(ts);
+    CREATE INDEX IF NOT EXISTS vet_records_ts ON vet_records(ts);
+    """
+
+    def __init__(self, path: str, json_file: str = DataManager.JSON_FILE):
+        self.path = path
+        self.json_file = json_file
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(self.SCHEMA)
+        self.upgrade_schema()
+        self.needs_migration = is_new
+        # id строк в том же порядке, что и списки DataManager
+        self.owner_ids: List[int] = []
+        self.pet_ids: List[List[int]] = []
+        self.shop_ids: List[int] = []
+        self.next_pos = 0
+
+    def upgrade_schema(self):
+        with self.conn:
+            for table in self.TIME_TABLES:
+                columns = {row[1] for row in
+                           self.conn.execute(f"PRAGMA table_info({table})")}
+                if "ts" in columns:
+                    continue
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN ts INTEGER")
+                self.conn.executemany(
+                    f"UPDATE {table} SET ts = ? WHERE id = ?",
+                    [(record_ts({"date": date}), rid) for rid, date in
+                     self.conn.execute(f"SELECT id, date FROM {table}").fetchall()])
+        self.conn.executescript(self.TIME_INDEXES)
+
+    def migrate_json(self):
+        """Однократный перенос данных из data.json"""
+        source = DataManager()
+        source.JSON_FILE = self.json_file
+        source.load_json()
+        self.save(source)
+
+    def load(self, manager: DataManager):
+        if self.needs_migration:
+            self.migrate_json()
+            self.needs_migration = False
+        cur = self.conn.cursor()
+        manager.owners, self.owner_ids, self.pet_ids = [], [], []
+        by_owner: Dict[Optional[int], List] = defaultdict(list)
+        rows = cur.execute(
+            "SELECT p.id, p.owner_id, p.pos, p.type, p.name, p.age, p.gender,"
+            " p.color, p.breed, s.pet_id, s.pet_name, s.age, s.color, s.gender,"
+            " s.breed, s.birth_date, m.pet_name, m.vaccinations, m.diseases"
+            " FROM pets p"
+            " LEFT JOIN passports s ON s.pet_id = p.id"
+            " LEFT JOIN medical_cards m ON m.pet_id = p.id"
+            " ORDER BY p.pos")
+        for (pid, owner_id, pos, kind, name, age, gender, color, breed,
+             passport_id, p_name, p_age, p_color, p_gender, p_breed, born,
+             card_name, vacc, dis) in rows:
+            # Как сохранено, через декодер: без __post_init__, который
+            # завёл бы новый паспорт с сегодняшней датой
+            passport = None if passport_id is None else {
+                "pet_name": p_name, "age": p_age, "color": p_color,
+                "gender": p_gender, "breed": p_breed, "birth_date": born}
+            card = {"pet_name": name, "vaccinations": [], "diseases": []} \
+                if card_name is None else {
+                    "pet_name": card_name, "vaccinations": json.loads(vacc),
+                    "diseases": json.loads(dis)}
+            pet = decode(SPECIES[kind].cls, {
+                "name": name, "age": age, "gender": gender, "color": color,
+                "breed": breed, "passport": passport, "medical_card": card})
+            by_owner[owner_id].append((pid, pet))
+            self.next_pos = max(self.next_pos, pos + 1)
+        for oid, name, age, gender in cur.execute(
+                "SELECT id, name, age, gender FROM owners ORDER BY id"):
+            pets = by_owner.get(oid, [])
+            manager.owners.append(Owner(name, age, gender, [p for _, p in pets]))
+            self.owner_ids.append(oid)
+            self.pet_ids.append([pid for pid, _ in pets])
+        shop = by_owner.get(None, [])
+        manager.petshop.available_pets = [p for _, p in shop]
+        self.shop_ids = [pid for pid, _ in shop]
+        manager.petshop.sales = [
+            {"owner_name": o, "pet_name": p, "date": d, "ts": ts} for o, p, d, ts in
+            cur.execute("SELECT owner_name, pet_name, date, ts FROM sales ORDER BY ts, id")]
+        manager.vetclinic.records = [
+            {"pet_name": p, "type": t, "detail": d, "date": dt, "ts": ts}
+            for p, t, d, dt, ts in cur.execute(
+                "SELECT pet_name, type, detail, date, ts FROM vet_records ORDER BY ts, id")]
+
+    def _insert_owner(self, cur, od: dict) -> int:
+        cur.execute("INSERT INTO owners (name, age, gender) VALUES (?, ?, ?)",
+                    (od["name"], od["age"], od["gender"]))
+        return cur.lastrowid
+
+    def _insert_pet(self, cur, pd: dict, owner_id: Optional[int]) -> int:
+        cur.execute(
+            "INSERT INTO pets (owner_id, pos, type, name, age, gender, color, breed)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (owner_id, self.next_pos, pd["type"], pd["name"], pd["age"], pd["gender"],
+             pd["color"], pd.get("breed")))
+        self.next_pos += 1
+        pid = cur.lastrowid
+        ps = pd.get("passport")
+        if ps:
+            cur.execute(
+                "INSERT INTO passports VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pid, ps["pet_name"], ps["age"], ps["color"], ps["gender"],
+                 ps["breed"], ps["birth_date"]))
+        mc = pd.get("medical_card")
+        if mc:
+            cur.execute(
+                "INSERT INTO medical_cards VALUES (?, ?, ?, ?)",
+                (pid, mc["pet_name"], json.dumps(mc["vaccinations"], ensure_ascii=False),
+                 json.dumps(mc["diseases"], ensure_ascii=False)))
+        return pid
+
+    def _insert_sale(self, cur, rec: dict):
+        cur.execute(
+            "INSERT INTO sales (owner_name, pet_name, date, ts) VALUES (?, ?, ?, ?)",
+            (rec["owner_name"], rec["pet_name"], rec["date"], record_ts(rec)))
+
+    def _insert_record(self, cur, rec: dict):
+        cur.execute(
+            "INSERT INTO vet_records (pet_name, type, detail, date, ts)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (rec["pet_name"], rec["type"], rec["detail"], rec["date"], record_ts(rec)))
+
+    def save(self, manager: DataManager):
+        with self.conn:
+            cur = self.conn.cursor()
+            for table in ("vet_records", "sales", "medical_cards", "passports",
+                          "pets", "owners"):
+                cur.execute(f"DELETE FROM {table}")
+            self.owner_ids, self.pet_ids, self.next_pos = [], [], 0
+            for o in manager.owners:
+                oid = self._insert_owner(
+                    cur, {"name": o.name, "age": o.age, "gender": o.gender})
+                self.owner_ids.append(oid)
+                self.pet_ids.append([
+                    self._insert_pet(cur, encode(p), oid)
+                    for p in o.pets])
+            self.shop_ids = [
+                self._insert_pet(cur, encode(p), None)
+                for p in manager.petshop.available_pets]
+            for rec in manager.petshop.sales:
+                self._insert_sale(cur, rec)
+            for rec in manager.vetclinic.records:
+                self._insert_record(cur, rec)
+
+    def commit(self, manager: DataManager, op: str, data: dict):
+        self.commit_many(manager, [(op, data)])
+
+    def commit_many(self, manager: DataManager, ops: List[Tuple[str, dict]]):
+        """Все операции — одной транзакцией"""
+        with self.conn:
+            cur = self.conn.cursor()
+            for op, data in ops:
+                self._apply(cur, op, data)
+
+    def _apply(self, cur, op: str, data: dict):
+        """Одна операция только по её данным, как при повторе журнала:
+        к концу пачки deferred() списки DataManager уже другие"""
+        if op == "add_owner":
+            self.owner_ids.append(self._insert_owner(cur, data["owner"]))
+            self.pet_ids.append([])
+        elif op == "remove_owner":
+            oid = self.owner_ids.pop(data["owner"])
+            self.pet_ids.pop(data["owner"])
+            cur.execute("DELETE FROM owners WHERE id = ?", (oid,))
+        elif op == "add_shop_pet":
+            self.shop_ids.append(self._insert_pet(cur, data["pet"], None))
+        elif op == "sell_pet":
+            pid = self.shop_ids.pop(data["pet"] - 1)
+            oid = self.owner_ids[data["owner"]]
+            cur.execute("UPDATE pets SET owner_id = ?, pos = ? WHERE id = ?",
+                        (oid, self.next_pos, pid))
+            self.next_pos += 1
+            self.pet_ids[data["owner"]].append(pid)
+            self._insert_sale(cur, data["record"])
+        elif op == "remove_pet":
+            pid = self.pet_ids[data["owner"]].pop(data["pet"])
+            cur.execute("DELETE FROM pets WHERE id = ?", (pid,))
+        elif op == "vet_records":
+            pid = self.pet_ids[data["owner"]][data["pet"]]
+            row = cur.execute(
+                "SELECT vaccinations, diseases FROM medical_cards WHERE pet_id = ?",
+                (pid,)).fetchone()
+            if row is None:
+                # Медкарта заводится клиникой при первом визите
+                cur.execute("INSERT INTO medical_cards SELECT id, name, '[]', '[]'"
+                            " FROM pets WHERE id = ?", (pid,))
+                row = ("[]", "[]")
+            # Как add_vaccination/add_disease медкарты: без повторов
+            vaccinations, diseases = json.loads(row[0]), json.loads(row[1])
+            for rec in data["records"]:
+                values = diseases if rec["type"] == "Болезнь" else vaccinations
+                if rec["detail"] not in values:
+                    values.append(rec["detail"])
+            cur.execute(
+                "UPDATE medical_cards SET vaccinations = ?, diseases = ?"
+                " WHERE pet_id = ?",
+                (json.dumps(vaccinations, ensure_ascii=False),
+                 json.dumps(diseases, ensure_ascii=False), pid))
+            for rec in data["records"]:
+                self._insert_record(cur, rec)
+        elif op == "import":
+            for od in data["owners"]:
+                self.owner_ids.append(self._insert_owner(cur, od))
+                self.pet_ids.append([])
+            for item in data["pets"]:
+                pos = item["owner"]
+                if pos is None:
+                    self.shop_ids.append(self._insert_pet(cur, item["pet"], None))
+                else:
+                    self.pet_ids[pos].append(
+                        self._insert_pet(cur, item["pet"], self.owner_ids[pos]))
+        elif op == "archive":
+            cur.execute("DELETE FROM sales WHERE ts < ?", (data["before"],))
+            cur.execute("DELETE FROM vet_records WHERE ts < ?", (data["before"],))
+        else:
+            raise ValueError(f"Неизвестная операция: {op}")
 
-        self.owners = []
-        for od in data.get("owners", []):
-            pets = []
-            for pd in od.get("pets", []):
-                cls = Dog if pd.get("breed") in [
-                    b.value for b in DogBreed] else Cat
-                pet = cls(pd["name"], pd["age"], pd["gender"],
-                          pd["color"], pd.get("breed"))
-                pets.append(pet)
-            owner = Owner(od["name"], od["age"], od["gender"], pets)
-            self.owners.append(owner)
+    def close(self):
+        self.conn.close()
 
-        # PetShop
-        ps_data = data.get("petshop", {})
-        self.petshop.available_pets = []
-        for pd in ps_data.get("available_pets", []):
-            cls = Dog if pd.get("breed") in [
-                b.value for b in DogBreed] else Cat
-            pet = cls(pd["name"], pd["age"], pd["gender"],
-                      pd["color"], pd.get("breed"))
-            self.petshop.available_pets.append(pet)
-        self.petshop.sales = ps_data.get("sales", [])
 
-        # VetClinic
-        self.vetclinic.records = data.get("vetclinic", {}).get("records", [])
+def read_choice(menu: str) -> str:
+    """Пункт меню. Для замеров здесь кончается предыдущее действие меню
+    и начинается выбранное (фаза menu.<меню>.<пункт>)"""
+    STATS.action(None)
+    choice = ask("Выбор: ").strip()
+    STATS.action(f"menu.{menu}.{choice}")
+    return choice
 
 
 def choose_enum(enum_class: Enum, title: str):
-    values = list(enum_class)
+    table = enum_table(enum_class)
     print(f"\nВыберите {title}:")
-    for i, item in enumerate(values, 1):
-        print(f"{i}. {item.value}")
+    print(table.menu)
     while True:
-        choice = input("Выбор: ").strip()
-        if choice.isdigit():
-            idx = int(choice)
-            if 1 <= idx <= len(values):
-                return values[idx - 1]
+        member = table.choice(ask("Выбор: "))
+        if member is not None:
+            return member
         print("Введите корректный номер из списка.")
 
 
+NAME_RE = re.compile(r'^[A-ЯA-Z][а-яa-zA-Z\- ]*$')
+
+
+def check_name(name: str) -> Optional[str]:
+    """Ошибка в имени или None (правила input_name)"""
+    if not name:
+        return "Имя не может быть пустым."
+    if not NAME_RE.match(name):
+        return "Имя должно начинаться с заглавной буквы и содержать только буквы или пробелы"
+    return None
+
+
+def check_int(s: str, min_val: Optional[int] = None,
+              max_val: Optional[int] = None) -> Optional[str]:
+    """Ошибка в целом числе или None (правила input_int)"""
+    if not s.isdigit():
+        return "Введите целое число."
+    v = int(s)
+    if min_val is not None and v < min_val:
+        return f"Значение должно быть не меньше {min_val}."
+    if max_val is not None and v > max_val:
+        return f"Значение должно быть не больше {max_val}."
+    return None
+
+
 def input_name(prompt: str) -> str:
     while True:
-        name = input(prompt).strip()
-        if not name:
-            print("Имя не может быть пустым.")
-            continue
-        if not re.match(r'^[A-ЯA-Z][а-яa-zA-Z\- ]*$', name):
-            print(
-                "Имя должно начинаться с заглавной буквы и содержать только буквы или пробелы")
+        name = ask(prompt).strip()
+        error = check_name(name)
+        if error:
+            print(error)
             continue
         return name
 
 
 def input_int(prompt: str, min_val: Optional[int] = None, max_val: Optional[int] = None) -> int:
     while True:
-        s = input(prompt).strip()
-        if not s.isdigit():
-            print("Введите целое число.")
-            continue
-        v = int(s)
-        if min_val is not None and v < min_val:
-            print(f"Значение должно быть не меньше {min_val}.")
-            continue
-        if max_val is not None and v > max_val:
-            print(f"Значение должно быть не больше {max_val}.")
+        s = ask(prompt).strip()
+        error = check_int(s, min_val, max_val)
+        if error:
+            print(error)
             continue
-        return v
+        return int(s)
+
+
+def input_date(prompt: str) -> datetime:
+    while True:
+        s = ask(prompt).strip()
+        try:
+            return datetime.strptime(s, "%d.%m.%y")
+        except ValueError:
+            print("Введите дату в формате дд.мм.гг.")
+
+
+def input_period() -> Tuple[datetime, datetime]:
+    """Период по дням, оба дня включительно"""
+    start = input_date("\nС даты (дд.мм.гг): ")
+    end = input_date("По дату (дд.мм.гг): ")
+    return start, end.replace(hour=23, minute=59, second=59)
+
+
+def choose_optional(values: List[str], title: str) -> Optional[str]:
+    """Выбор из списка с вариантом «любой» (None)"""
+    print(f"\nВыберите {title}:")
+    print("0. Не важно")
+    for i, v in enumerate(values, 1):
+        print(f"{i}. {v}")
+    idx = input_int("Выбор: ", 0, len(values))
+    return values[idx - 1] if idx else None
+
+
+PAGE_SIZE = 20
+
+
+def show_numbered(i: int, item):
+    print(f"{i}. {item}")
+
+
+def browse(items: Sequence, show: Callable[[int, object], None],
+           search: Optional[Callable[[], Sequence]] = None,
+           select: bool = False):
+    """Вывод списка страницами по PAGE_SIZE, show(номер, элемент) печатает
+    один элемент.
+
+    Список в одну страницу выводится целиком, как раньше, и номер при
+    select спрашивается через input_int. На длинных списках: Enter —
+    следующая страница, «-» — предыдущая, «/» — поиск (search спрашивает
+    условия и возвращает отобранные элементы), номер — выбор при select,
+    0 — выход. Возвращает выбранный элемент или None.
+    """
+    shown, page = items, 0
+    while True:
+        pages = max(1, -(-len(shown) // PAGE_SIZE))
+        start = page * PAGE_SIZE
+        for i in range(start, min(start + PAGE_SIZE, len(shown))):
+            show(i + 1, shown[i])
+        if pages == 1 and shown is items:
+            if not select:
+                return None
+            idx = input_int("Выбор (0 для отмены): ", 0, len(shown))
+            return shown[idx - 1] if idx else None
+        print(f"Страница {page + 1} из {pages}, всего {len(shown)}.")
+        hint = "номер — выбор, " if select else ""
+        hint += "Enter — дальше, «-» — назад"
+        if search is not None:
+            hint += ", «/» — поиск"
+        cmd = ask(f"{hint}, 0 — {'отмена' if select else 'выход'}: ").strip()
+        if cmd == "0":
+            return None
+        if cmd == "":
+            if page + 1 < pages:
+                page += 1
+            elif not select:
+                return None
+        elif cmd == "-":
+            page = max(page - 1, 0)
+        elif cmd == "/" and search is not None:
+            found = search()
+            if found:
+                shown, page = found, 0
+            else:
+                print("Ничего не найдено.")
+                shown, page = items, 0
+        elif select and cmd.isdigit() and 1 <= int(cmd) <= len(shown):
+            return shown[int(cmd) - 1]
+        else:
+            print("Неверный выбор.")
+
+
+def owner_search(manager: DataManager) -> Callable[[], List[Owner]]:
+    def search():
+        prefix = ask("\nИмя владельца начинается с: ").strip()
+        return manager.index.filter_owners(prefix)
+    return search
+
+
+def pet_search(manager: DataManager, owner=Repository.ALL) -> Callable[[], List[Pet]]:
+    """Поиск питомцев по индексу; owner — как в Repository.filter_pets"""
+    def search():
+        prefix = ask("\nИмя питомца начинается с (Enter — любое): ").strip()
+        kinds = list(SPECIES.values())
+        title = choose_optional([k.title for k in kinds], "вид")
+        kind = next((k for k in kinds if k.title == title), None)
+        breeds = list(kind.breeds) if kind else [b for k in kinds for b in k.breeds]
+        breed = choose_optional([b.value for b in breeds], "породу")
+        color = choose_optional([c.value for c in Color], "цвет")
+        return manager.index.filter_pets(
+            prefix, kind.cls.__name__ if kind else None, breed, color, owner)
+    return search
+
+
+def show_owner_line(i: int, owner: Owner):
+    print(f"{i}. {owner.name} ({len(owner.pets)} питомцев)")
 
 
 def choose_owner(manager: DataManager) -> Optional[Owner]:
@@ -424,23 +3121,42 @@ def choose_owner(manager: DataManager) -> Optional[Owner]:
         print("Нет владельцев.")
         return None
     print("\nВыберите владельца:")
-    for i, o in enumerate(manager.owners, 1):
-        print(f"{i}. {o.name} ({len(o.pets)} питомцев)")
-    idx = input_int("Выбор (0 для отмены): ", 0, len(manager.owners))
-    if idx == 0:
-        return None
-    return manager.owners[idx - 1]
+    return browse(manager.owners, show_owner_line, owner_search(manager), select=True)
 
 
-def choose_pet_from_owner(owner: Owner) -> Optional[Pet]:
+def choose_pet_from_owner(owner: Owner,
+                          search: Optional[Callable] = None) -> Optional[Pet]:
     if not owner.pets:
         print("У владельца нет питомцев.")
         return None
+    return owner.show_pets(search, select=True)
+
+
+def show_sale_line(i: int, s: dict):
+    print(f"{i}. {s['date']} - {s['owner_name']} купил {s['pet_name']}")
+
+
+def show_record_line(i: int, r: dict):
+    print(f"{i}. {r['pet_name']}: {r['type']} — {r['detail']} ({r['date']})")
+
+
+def show_sales(sales: List[dict]):
+    if not sales:
+        print("Журнал продаж пуст.")
+        return
+    browse(sales, show_sale_line)
+
+
+def show_records(records: List[dict]):
+    if not records:
+        print("Записей нет.")
+        return
+    browse(records, show_record_line)
+
+
+def show_owner(i: int, owner: Owner):
+    print("\n" + str(owner))
     owner.show_pets()
-    idx = input_int("Выбор (0 для отмены): ", 0, len(owner.pets))
-    if idx == 0:
-        return None
-    return owner.pets[idx - 1]
 
 
 def menu_owner(manager: DataManager):
@@ -451,34 +3167,29 @@ def menu_owner(manager: DataManager):
         print("3. Удалить владельца")
         print("4. Управлять питомцами владельца")
         print("0. Назад")
-        choice = input("Выбор: ").strip()
+        choice = read_choice("owners")
         if choice == "0":
             break
         if choice == "1":
             name = input_name("\nИмя владельца: ")
             age = input_int("\nВозраст владельца: ", 0)
             gender = choose_enum(Gender, "пол владельца").value
-            manager.owners.append(Owner(name, age, gender))
-            manager.save_all()
+            manager.add_owner(Owner(name, age, gender))
             print("\nВладелец создан.")
         elif choice == "2":
             if not manager.owners:
                 print("\nНет владельцев.")
             else:
-                for o in manager.owners:
-                    print("\n" + str(o))
-                    o.show_pets()
+                browse(manager.owners, show_owner, owner_search(manager))
         elif choice == "3":
             if not manager.owners:
                 print("\nНет владельцев.")
                 continue
-            for i, o in enumerate(manager.owners, 1):
-                print(f"{i}. {o.name}")
-            idx = input_int("Выбор (0 отмена): ", 0, len(manager.owners))
-            if idx == 0:
+            owner = browse(manager.owners, lambda i, o: print(f"{i}. {o.name}"),
+                           owner_search(manager), select=True)
+            if owner is None:
                 continue
-            removed = manager.owners.pop(idx - 1)
-            manager.save_all()
+            removed = manager.remove_owner(owner)
             print(f"Владелец {removed.name} удалён.")
         elif choice == "4":
             owner = choose_owner(manager)
@@ -489,6 +3200,7 @@ def menu_owner(manager: DataManager):
 
 
 def menu_owner_pets(manager: DataManager, owner: Owner):
+    search = pet_search(manager, owner)
     while True:
         print(f"\nУправление питомцами владельца {owner.name}:")
         print("1. Просмотреть питомцев")
@@ -497,53 +3209,52 @@ def menu_owner_pets(manager: DataManager, owner: Owner):
         print("4. Просмотреть паспорт питомца")
         print("5. Просмотреть медкарту питомца")
         print("6. Отвезти питомца в клинику")
+        print("7. История питомца в клинике")
+        print("8. Покупки владельца")
         print("0. Назад")
-        choice = input("Выбор: ").strip()
+        choice = read_choice("owner.pets")
         if choice == "0":
             break
         if choice == "1":
-            owner.show_pets()
+            owner.show_pets(search)
         elif choice == "2":
-            manager.petshop.list_available()
-            if not manager.petshop.available_pets:
-                continue
-            idx = input_int("Выбор (0 отмена): ", 0, len(
-                manager.petshop.available_pets))
-            if idx == 0:
+            pet = manager.petshop.list_available(pet_search(manager, None), select=True)
+            if pet is None:
                 continue
             try:
-                manager.petshop.sell_pet(owner, idx)
-                manager.save_all()
+                manager.sell_pet(owner, pet)
                 print("Питомец куплен.")
             except IndexError as e:
                 print(str(e))
         elif choice == "3":
-            owner.show_pets()
-            if not owner.pets:
-                continue
-            idx = input_int("Выбор (0 отмена): ", 0, len(owner.pets))
-            if idx == 0:
+            pet = owner.show_pets(search, select=True)
+            if pet is None:
                 continue
-            removed = owner.remove_pet(idx - 1)
-            manager.save_all()
+            removed = manager.remove_pet(owner, pet)
             print(f"Питомец {removed.name} удалён.")
         elif choice == "4":
-            pet = choose_pet_from_owner(owner)
+            pet = choose_pet_from_owner(owner, search)
             if pet and pet.passport:
                 print("\n" + str(pet.passport))
             else:
                 print("У питомца нет паспорта.")
         elif choice == "5":
-            pet = choose_pet_from_owner(owner)
+            pet = choose_pet_from_owner(owner, search)
             if pet and pet.medical_card:
                 print("\n" + str(pet.medical_card))
             else:
                 print("У питомца нет медкарты.")
         elif choice == "6":
-            pet = choose_pet_from_owner(owner)
+            pet = choose_pet_from_owner(owner, search)
             if pet:
-                manager.vetclinic.treat_interactive(pet)
-                manager.save_all()
+                diseases, vaccines = manager.vetclinic.treat_interactive(pet)
+                manager.treat(owner, pet, diseases, vaccines)
+        elif choice == "7":
+            pet = choose_pet_from_owner(owner, search)
+            if pet:
+                show_records(manager.index.records_of_pet(pet.name))
+        elif choice == "8":
+            show_sales(manager.index.sales_of_owner(owner.name))
         else:
             print("Неверный выбор.")
 
@@ -554,76 +3265,718 @@ def menu_petshop(manager: DataManager):
         print("1. Добавить питомца в магазин")
         print("2. Показать доступных питомцев")
         print("3. Показать журнал продаж")
+        print("4. Продажи за период")
         print("0. Назад")
-        choice = input("Выбор: ").strip()
+        choice = read_choice("petshop")
         if choice == "0":
             break
         elif choice == "1":
-            manager.petshop.create_pet()
-            manager.save_all()
+            pet = manager.petshop.create_pet()
+            manager.add_shop_pet(pet)
+            print(f"Питомец {pet.name} добавлен в магазин.")
         elif choice == "2":
-            manager.petshop.list_available()
+            manager.petshop.list_available(pet_search(manager, None))
         elif choice == "3":
-            if not manager.petshop.sales:
-                print("Журнал продаж пуст.")
-            else:
-                for i, s in enumerate(manager.petshop.sales, 1):
-                    print(
-                        f"{i}. {s['date']} - {s['owner_name']} купил {s['pet_name']}")
+            show_sales(manager.petshop.sales)
+        elif choice == "4":
+            # За период — вместе с архивом
+            show_sales(list(manager.history("sales", *input_period())))
         else:
             print("Неверный выбор.")
 
 
+def show_medical_card(i: int, pet: Pet):
+    print(f"\n{pet.name}:")
+    print(pet.medical_card)
+
+
 def menu_vetclinic(manager: DataManager):
     while True:
         print("\nМеню ветклиники:")
         print("1. Просмотреть записи клиники")
         print("2. Просмотреть медкарты всех питомцев")
+        print("3. Записи за период")
         print("0. Назад")
-        choice = input("Выбор: ").strip()
+        choice = read_choice("vetclinic")
         if choice == "0":
             break
         elif choice == "1":
-            if not manager.vetclinic.records:
-                print("Записей нет.")
-            else:
-                for i, r in enumerate(manager.vetclinic.records, 1):
-                    print(
-                        f"{i}. {r['pet_name']}: {r['type']} — {r['detail']} ({r['date']})")
+            show_records(manager.vetclinic.records)
         elif choice == "2":
-            for owner in manager.owners:
-                for pet in owner.pets:
-                    print(f"\n{pet.name}:")
-                    print(pet.medical_card)
+            browse(Concat([o.pets for o in manager.owners]), show_medical_card,
+                   pet_search(manager, Repository.OWNED))
+        elif choice == "3":
+            show_records(list(manager.history("records", *input_period())))
         else:
             print("Неверный выбор.")
 
 
-def main():
-    manager = DataManager()
-    manager.load_all()
-    print("Добро пожаловать.")
+def show_reports(manager: DataManager):
+    try:
+        import analytics
+    except ImportError:
+        print("Для отчётов нужен пакет numpy (pip install numpy).")
+        return
+    with manager.transaction():
+        print("\n" + analytics.report(manager, VACCINE_SEQ, DISEASE_SEQ))
+
 
+def main_menu(manager: DataManager):
     while True:
         print("\nГлавное меню:")
         print("1. Владельцы")
         print("2. Зоомагазин")
         print("3. Ветклиника")
         print("4. Сохранить и выйти")
-        choice = input("Выбор: ").strip()
-        if choice == "1":
-            menu_owner(manager)
-        elif choice == "2":
-            menu_petshop(manager)
-        elif choice == "3":
-            menu_vetclinic(manager)
-        elif choice == "4":
-            manager.save_all()
-            print("Данные сохранены. Выход.")
-            break
+        print("5. Экспорт в XML")
+        print("6. Отчёты")
+        choice = read_choice("main")
+        try:
+            if choice == "1":
+                menu_owner(manager)
+            elif choice == "2":
+                menu_petshop(manager)
+            elif choice == "3":
+                menu_vetclinic(manager)
+            elif choice == "4":
+                try:
+                    manager.close()
+                except OSError as e:
+                    print(f"Не удалось сохранить данные: {e}. "
+                          "Исправьте причину и повторите выход.")
+                    continue
+                print("Данные сохранены. Выход.")
+                break
+            elif choice == "5":
+                manager.save_xml()
+                print(f"Данные выгружены в {manager.XML_FILE}.")
+            elif choice == "6":
+                show_reports(manager)
+            else:
+                print("Неверный выбор.")
+        except ConflictError as e:
+            # Общий режим: данные уже обновлены до последней версии
+            print(str(e))
+
+
+# Пакетная загрузка и выгрузка (python main.py import|export ФАЙЛ)
+
+BATCH_COMMANDS = ("import", "export")
+BATCH_FORMATS = ("csv", "jsonl")
+BATCH_FIELDS = ("kind", "type", "name", "age", "gender", "color", "breed", "owner")
+GENDERS = enum_table(Gender).values
+COLORS = enum_table(Color).values
+
+
+def batch_format(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(f, fmt: str) -> Iterator[Tuple[int, Optional[dict]]]:
+    """Строки файла по одной: (номер строки, словарь или None, если строка
+    не разбирается)"""
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for n, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield n, row if isinstance(row, dict) else None
+
+
+def batches(rows: Iterator, size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def validate_batch(rows: List[Optional[dict]]) -> List[Optional[str]]:
+    """Ошибки по строкам пачки (None — строка корректна).
+
+    Проверки идут по столбцам: каждое правило применяется ко всему
+    столбцу за один проход. Имена и возраст проверяются так же,
+    как в input_name/input_int.
+    """
+    errors: List[Optional[str]] = [
+        None if r is not None else "Строка не разобрана." for r in rows]
+
+    def column(key: str) -> List[str]:
+        return ["" if r is None or r.get(key) is None else str(r[key]).strip()
+                for r in rows]
+
+    def check(rule: Callable, *columns):
+        for i, error in enumerate(map(rule, *columns)):
+            if error and errors[i] is None:
+                errors[i] = error
+
+    kinds = column("kind")
+    is_pet = [k == "pet" for k in kinds]
+    check(lambda k: None if k in ("owner", "pet") else
+          f"Неизвестный вид записи: {k!r} (owner или pet).", kinds)
+    check(check_name, column("name"))
+    check(lambda a: check_int(a, 0), column("age"))
+    check(lambda g: None if g in GENDERS else f"Неизвестный пол: {g!r}.",
+          column("gender"))
+    check(lambda pet, c: None if not pet or c in COLORS else f"Неизвестный цвет: {c!r}.",
+          is_pet, column("color"))
+
+    def check_species(pet: bool, tag: str, breed: str) -> Optional[str]:
+        if not pet:
+            return None
+        if tag:
+            species = SPECIES.get(tag)
+            if species is None:
+                return f"Неизвестный вид питомца: {tag!r}."
+            if breed and BREED_SPECIES.get(breed) is not species:
+                return f"Порода {breed!r} не подходит для вида {tag}."
+            return None
+        if breed not in BREED_SPECIES:
+            return f"Неизвестная порода: {breed!r}." if breed else "Укажите вид или породу."
+        return None
+
+    check(check_species, is_pet, column("type"), column("breed"))
+    check(lambda pet, owner: None if pet or not owner else
+          "У владельца не может быть поля owner.", is_pet, column("owner"))
+    return errors
+
+
+def row_to_pet(row: dict) -> Pet:
+    breed = str(row.get("breed") or "").strip() or None
+    tag = str(row.get("type") or "").strip()
+    cls = SPECIES[tag].cls if tag else BREED_SPECIES[breed].cls
+    return cls(str(row["name"]).strip(), int(str(row["age"]).strip()),
+               str(row["gender"]).strip(), str(row["color"]).strip(), breed)
+
+
+def import_file(manager: DataManager, path: str, fmt: Optional[str] = None,
+                batch_size: int = 1000, log=sys.stderr) -> Tuple[int, int, int]:
+    """Загружает владельцев и питомцев из CSV/JSONL пачками по batch_size
+    строк, каждая пачка — один commit. Ошибочные строки пропускаются
+    с сообщением в log. Возвращает (владельцев, питомцев, пропущено)."""
+    fmt = batch_format(path, fmt)
+    total_owners = total_pets = skipped = 0
+    # Позиции владельцев верны, пока идёт загрузка: в общем режиме
+    # другие процессы ждут её окончания
+    with manager.transaction(), open(path, encoding="utf-8", newline="") as f:
+        owner_pos: Dict[str, int] = {}
+        for i, o in enumerate(manager.owners):
+            owner_pos.setdefault(o.name, i)
+        for batch in batches(read_rows(f, fmt), batch_size):
+            rows = [row for _, row in batch]
+            with STATS.phase("import.validate"):
+                errors = validate_batch(rows)
+            owners: List[Owner] = []
+            pets: List[Tuple[Optional[int], Pet]] = []
+            start = len(manager.owners)
+            # Сначала владельцы пачки: питомцы могут ссылаться на них
+            for row, error in zip(rows, errors):
+                if error is None and row["kind"].strip() == "owner":
+                    owner = Owner(str(row["name"]).strip(), int(str(row["age"]).strip()),
+                                  str(row["gender"]).strip())
+                    owner_pos.setdefault(owner.name, start + len(owners))
+                    owners.append(owner)
+            for (line, row), error in zip(batch, errors):
+                if error is None and row["kind"].strip() == "pet":
+                    owner_name = str(row.get("owner") or "").strip()
+                    pos = owner_pos.get(owner_name) if owner_name else None
+                    if owner_name and pos is None:
+                        error = f"Владелец {owner_name!r} не найден."
+                    else:
+                        pets.append((pos, row_to_pet(row)))
+                if error is not None:
+                    skipped += 1
+                    print(f"{path}:{line}: {error}", file=log)
+            if owners or pets:
+                with STATS.phase("import.commit"):
+                    manager.import_batch(owners, pets)
+            total_owners += len(owners)
+            total_pets += len(pets)
+    return total_owners, total_pets, skipped
+
+
+def export_file(manager: DataManager, path: str, fmt: Optional[str] = None) -> int:
+    """Выгружает владельцев, их питомцев и питомцев магазина в формате
+    import_file, строка за строкой. Возвращает число строк."""
+    fmt = batch_format(path, fmt)
+
+    def rows() -> Iterator[dict]:
+        for o in manager.owners:
+            yield {"kind": "owner", "name": o.name, "age": o.age, "gender": o.gender}
+            for p in o.pets:
+                yield pet_row(p, o.name)
+        for p in manager.petshop.available_pets:
+            yield pet_row(p, None)
+
+    def pet_row(p: Pet, owner: Optional[str]) -> dict:
+        row = {"kind": "pet", "type": type(p).__name__, "name": p.name,
+               "age": p.age, "gender": p.gender, "color": p.color, "breed": p.breed}
+        if owner is not None:
+            row["owner"] = owner
+        return row
+
+    count = 0
+    with manager.transaction(), atomic_write(path) as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, BATCH_FIELDS)
+            writer.writeheader()
+            write = writer.writerow
         else:
-            print("Неверный выбор.")
+            def write(row: dict):
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        for row in rows():
+            write(row)
+            count += 1
+    return count
+
+
+# Команды без диалогов (python main.py run [ФАЙЛ])
+
+RUN_COMMAND = "run"
+QUOTING_RE = re.compile(r"[\"'\\]")
+
+
+class CommandError(Exception):
+    """Команда не выполнена; данные не изменены"""
+
+
+def parse_command(line: str) -> dict:
+    """Команда из строки: объект JSON ({"cmd": "sell", "owner": ...}) или
+    «имя аргументы» — аргументы по порядку CommandRunner.ARGS либо
+    ключ=значение, значения с пробелами — в кавычках"""
+    if line.startswith("{"):
+        try:
+            command = json.loads(line)
+        except ValueError as e:
+            raise CommandError(f"Неверный JSON: {e}") from None
+        if not isinstance(command, dict) or not isinstance(command.get("cmd"), str):
+            raise CommandError("Ожидается объект JSON с полем cmd.")
+        return command
+    if QUOTING_RE.search(line) is None:
+        # Без кавычек shlex даёт то же разбиение, но во много раз медленнее
+        tokens = line.split()
+    else:
+        try:
+            tokens = shlex.split(line)
+        except ValueError as e:
+            raise CommandError(f"Не разобрана строка: {e}") from None
+    command = {"cmd": tokens[0]}
+    positional = iter(CommandRunner.ARGS.get(tokens[0], ()))
+    for token in tokens[1:]:
+        key, eq, value = token.partition("=")
+        if not eq:
+            key, value = next(positional, None), token
+            if key is None:
+                raise CommandError(f"Лишний аргумент: {token!r}.")
+        command[key] = value
+    return command
+
+
+def read_commands(f) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(номер строки, команда или None, ошибка разбора); пустые строки
+    и комментарии (#) пропускаются"""
+    for n, line in enumerate(f, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield n, parse_command(line), None
+        except CommandError as e:
+            yield n, None, str(e)
+
+
+def enum_list(value, enum_class, title: str) -> list:
+    """Значения перечисления из списка JSON или строки через запятую"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [v.strip() for v in value.split(",") if v.strip()]
+    elif not isinstance(value, list):
+        raise CommandError(f"Поле {title} должно быть списком или строкой.")
+    table = enum_table(enum_class)
+    try:
+        return [table.parse(v) for v in value]
+    except ValueError as e:
+        raise CommandError(f"{title.capitalize()}: {e}") from None
+
+
+class CommandRunner:
+    """Те же действия, что в меню, без вопросов: создание владельца
+    и питомца, продажа, лечение, списки. Владельцы и питомцы ищутся
+    по имени (при совпадении имён — первый добавленный)."""
+    # Порядок аргументов без ключа
+    ARGS = {
+        "owner": ("name", "age", "gender"),
+        "pet": ("type", "name", "age", "gender", "color", "breed"),
+        "sell": ("owner", "pet"),
+        "treat": ("owner", "pet"),
+        "list": ("what", "owner"),
+        "checkpoint": (),
+    }
+    LISTS = ("owners", "pets", "shop", "sales", "records")
+
+    def __init__(self, manager: DataManager):
+        self.manager = manager
+
+    def run(self, command: dict):
+        name = command["cmd"]
+        handler = getattr(self, f"do_{name}", None) if name in self.ARGS else None
+        if handler is None:
+            raise CommandError(f"Неизвестная команда: {name!r} "
+                               f"({', '.join(self.ARGS)}).")
+        with STATS.phase(f"run.{name}"):
+            handler(command)
+
+    @staticmethod
+    def field(command: dict, key: str) -> str:
+        value = command.get(key)
+        return "" if value is None else str(value).strip()
+
+    def owner(self, name: str) -> Owner:
+        if not name:
+            raise CommandError("Укажите владельца.")
+        found = self.manager.index.find_owners(name)
+        if not found:
+            raise CommandError(f"Владелец {name!r} не найден.")
+        return found[0]
+
+    def check(self, row: dict, kind: str):
+        error = validate_batch([{**row, "kind": kind}])[0]
+        if error:
+            raise CommandError(error)
+
+    def do_owner(self, command: dict):
+        self.check(command, "owner")
+        self.manager.add_owner(Owner(self.field(command, "name"),
+                                     int(self.field(command, "age")),
+                                     self.field(command, "gender")))
+
+    def do_pet(self, command: dict):
+        """Питомец магазина или, с owner=ИМЯ, питомец владельца"""
+        owner_name = self.field(command, "owner")
+        self.check(command, "pet")
+        pet = row_to_pet(command)
+        if owner_name:
+            owner = self.owner(owner_name)
+            self.manager.import_batch([], [(self.manager.owner_index(owner), pet)])
+        else:
+            self.manager.add_shop_pet(pet)
+
+    def do_sell(self, command: dict):
+        owner = self.owner(self.field(command, "owner"))
+        name = self.field(command, "pet")
+        index = self.manager.index
+        pet = next((p for p in index.find_pets(name) if index.owner_of(p) is None), None)
+        if pet is None:
+            raise CommandError(f"Питомца {name!r} нет в магазине.")
+        self.manager.sell_pet(owner, pet)
+
+    def do_treat(self, command: dict):
+        """Визит в клинику: болезни и прививки через запятую
+        (diseases=..., vaccinations=...)"""
+        owner = self.owner(self.field(command, "owner"))
+        name = self.field(command, "pet")
+        pet = next((p for p in owner.pets if p.name == name), None)
+        if pet is None:
+            raise CommandError(f"У владельца {owner.name} нет питомца {name!r}.")
+        diseases = enum_list(command.get("diseases"), Disease, "болезни")
+        vaccines = enum_list(command.get("vaccinations"), Vaccine, "прививки")
+        if not diseases and not vaccines:
+            raise CommandError("Укажите diseases и/или vaccinations.")
+        self.manager.treat(owner, pet, diseases, vaccines)
+
+    def do_list(self, command: dict):
+        """Весь список сразу, без страниц: owners, pets (owner=ИМЯ),
+        shop, sales, records"""
+        what = self.field(command, "what")
+        manager = self.manager
+        if what == "owners":
+            items, show = manager.owners, show_owner_line
+        elif what == "pets":
+            items, show = self.owner(self.field(command, "owner")).pets, show_numbered
+        elif what == "shop":
+            items, show = manager.petshop.available_pets, show_numbered
+        elif what == "sales":
+            items, show = manager.petshop.sales, show_sale_line
+        elif what == "records":
+            items, show = manager.vetclinic.records, show_record_line
+        else:
+            raise CommandError(f"Неизвестный список: {what!r} ({', '.join(self.LISTS)}).")
+        for i, item in enumerate(items, 1):
+            show(i, item)
+
+    def do_checkpoint(self, command: dict):
+        """Обрабатывается в run_commands"""
+
+
+def run_commands(manager: DataManager, f, source: str = "<stdin>",
+                 checkpoint: int = 0, log=sys.stderr) -> Tuple[int, int, int]:
+    """Выполняет команды из f. Изменения фиксируются вместе
+    (DataManager.deferred) на контрольной точке: после каждых checkpoint
+    команд (0 — только в конце), по команде checkpoint и в конце.
+    Ошибочные команды пропускаются с сообщением в log.
+    Возвращает (выполнено, с ошибками, контрольных точек)."""
+    runner = CommandRunner(manager)
+    commands = read_commands(f)
+    done = failed = points = 0
+    finished = False
+    while not finished:
+        count = 0
+        with manager.deferred():
+            for line, command, error in commands:
+                if command is not None and command["cmd"] == "checkpoint":
+                    break
+                if error is None:
+                    try:
+                        runner.run(command)
+                    except (CommandError, ConflictError) as e:
+                        error = str(e)
+                if error is not None:
+                    failed += 1
+                    print(f"{source}:{line}: {error}", file=log)
+                    continue
+                done += 1
+                count += 1
+                if checkpoint and count >= checkpoint:
+                    break
+            else:
+                finished = True
+        points += 1
+    return done, failed, points
+
+
+def run_main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="main.py run",
+        description="Команды без диалогов: по одной в строке, текстом или JSON")
+    parser.add_argument("file", nargs="?", default="-",
+                        help="файл команд (по умолчанию stdin)")
+    parser.add_argument("--checkpoint", type=int, default=0, metavar="N",
+                        help="фиксировать изменения после каждых N команд "
+                             "(0 — только в конце и по команде checkpoint)")
+    add_storage_arguments(parser)
+    add_stats_arguments(parser)
+    args = parse_storage_args(parser, argv)
+    start_stats(args)
+    manager = make_manager(args)
+    start = time.perf_counter()
+    try:
+        if args.file == "-":
+            result = run_commands(manager, sys.stdin, checkpoint=max(0, args.checkpoint))
+        else:
+            with open(args.file, encoding="utf-8") as f:
+                result = run_commands(manager, f, args.file, max(0, args.checkpoint))
+    finally:
+        # Изменения уже зафиксированы на контрольных точках
+        manager.close(save=False)
+    done, failed, points = result
+    print(f"Выполнено команд: {done}, с ошибками: {failed}, контрольных точек: "
+          f"{points}, {time.perf_counter() - start:.2f} с.", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+def add_storage_arguments(parser: argparse.ArgumentParser):
+    """Параметры хранения, общие для меню и пакетного режима"""
+    parser.add_argument("--journal", action="store_true",
+                        help="сохранять изменения в журнал вместо полной перезаписи")
+    parser.add_argument("--shared", action="store_true",
+                        help="общий режим для нескольких терминалов с одними файлами: "
+                             "журнал под межпроцессной блокировкой")
+    parser.add_argument("--lazy", action="store_true",
+                        help="загружать data.json по частям, питомцев — по требованию")
+    parser.add_argument("--xml", choices=DataManager.XML_MODES, default="sync",
+                        help="data.xml: после JSON (sync), параллельно в отдельном "
+                             "процессе (parallel) или только по запросу из меню (off)")
+    parser.add_argument("--format", choices=DataManager.FORMATS, default="json",
+                        help="формат снимка: data.json или компактный двоичный data.bin")
+    parser.add_argument("--sqlite", metavar="FILE",
+                        help="хранить данные в базе SQLite (при первом запуске "
+                             "переносятся из data.json)")
+    parser.add_argument("--fragment-cache", action="store_true",
+                        default=bool(os.environ.get("PETS_FRAGMENT_CACHE")),
+                        help="держать готовые фрагменты data.json/data.xml между "
+                             "сохранениями: повторное сохранение быстрее, но "
+                             "память примерно удваивается (PETS_FRAGMENT_CACHE=1)")
+    parser.add_argument("--retention-days", type=int, metavar="N",
+                        help="при запуске переносить продажи и записи клиники "
+                             f"старше N дней в архив {DataManager.ARCHIVE_DIR}/ "
+                             "(gzip JSONL по месяцам)")
+
+
+def add_stats_arguments(parser: argparse.ArgumentParser):
+    """Параметры замеров; без них действуют переменные окружения
+    PETS_STATS, PETS_PROFILE и PETS_TRACEMALLOC"""
+    parser.add_argument("--stats", nargs="?", const="-", metavar="FILE",
+                        default=os.environ.get("PETS_STATS"),
+                        help="замеры по фазам и счётчики; при выходе — таблица "
+                             "в stderr (без FILE, - или 1/true/yes/on) или JSON "
+                             "в FILE; 0/false/no/off — выключено")
+    parser.add_argument("--profile", metavar="FILE",
+                        default=os.environ.get("PETS_PROFILE"),
+                        help="профиль cProfile: при выходе — в FILE (pstats) "
+                             "и самые долгие функции в stderr")
+    parser.add_argument("--trace-memory", action="store_true",
+                        default=bool(os.environ.get("PETS_TRACEMALLOC")),
+                        help="tracemalloc: при выходе — пик памяти и места "
+                             "наибольших выделений")
+
+
+# Сколько строк профиля и мест выделения памяти выводить при выходе
+PROFILE_TOP = 20
+# Значения --stats/PETS_STATS: отчёт в stderr или выключено; иное — файл
+STATS_STDERR = frozenset({"-", "1", "true", "yes", "on"})
+STATS_OFF = frozenset({"", "0", "false", "no", "off"})
+
+
+def stats_target(value: Optional[str]) -> Optional[str]:
+    """"-" — отчёт в stderr, путь — JSON в файл, None — без замеров"""
+    if value is None or value.strip().lower() in STATS_OFF:
+        return None
+    if value.strip().lower() in STATS_STDERR:
+        return "-"
+    return value
+
+
+def start_stats(args: argparse.Namespace):
+    """Включает замеры и профилирование; отчёты выводятся при выходе"""
+    args.stats = stats_target(args.stats)
+    if args.stats:
+        STATS.enable()
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if args.trace_memory:
+        tracemalloc.start()
+    if args.stats or profiler is not None or args.trace_memory:
+        atexit.register(finish_stats, args, profiler)
+
+
+def finish_stats(args: argparse.Namespace, profiler: Optional[cProfile.Profile]):
+    STATS.action(None)
+    if args.stats == "-":
+        print(STATS.report(), file=sys.stderr)
+    elif args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(STATS.snapshot(), f, ensure_ascii=False, indent=4)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats(
+            "cumulative").print_stats(PROFILE_TOP)
+    if args.trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        print(f"Память: сейчас {current / 2 ** 20:.1f} МБ, пик {peak / 2 ** 20:.1f} МБ",
+              file=sys.stderr)
+        for stat in tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP]:
+            print(f"  {stat}", file=sys.stderr)
+
+
+def parse_storage_args(parser: argparse.ArgumentParser,
+                       argv: Optional[List[str]]) -> argparse.Namespace:
+    args = parser.parse_args(argv)
+    if args.shared and args.sqlite:
+        parser.error("--shared работает через журнал и не сочетается с --sqlite")
+    return args
+
+
+def make_manager(args: argparse.Namespace,
+                 debounce: Optional[float] = None) -> DataManager:
+    storage = SqliteStorage(args.sqlite) if args.sqlite else None
+    manager = DataManager(journal=args.journal, lazy=args.lazy,
+                          storage=storage, debounce=debounce,
+                          xml_mode=args.xml, snapshot_format=args.format,
+                          shared=args.shared, fragment_cache=args.fragment_cache)
+    manager.load_all()
+    if args.retention_days is not None:
+        sales, records = manager.archive(
+            datetime.now() - timedelta(days=max(0, args.retention_days)))
+        if sales or records:
+            print(f"В архив перенесено продаж: {sales}, записей клиники: {records}.",
+                  file=sys.stderr)
+    return manager
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Учёт домашних животных")
+    add_storage_arguments(parser)
+    parser.add_argument("--async-save", action="store_true",
+                        help="сохранять в фоне, объединяя изменения")
+    parser.add_argument("--debounce", type=float, default=2.0, metavar="SEC",
+                        help="пауза в изменениях перед фоновым сохранением")
+    add_stats_arguments(parser)
+    return parse_storage_args(parser, argv)
+
+
+def batch_main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="main.py", description="Пакетная загрузка и выгрузка владельцев и питомцев",
+        epilog="Код выхода 1, если при загрузке пропущены ошибочные строки.")
+    parser.add_argument("command", choices=BATCH_COMMANDS)
+    parser.add_argument("file", help="файл CSV или JSONL")
+    parser.add_argument("--file-format", choices=BATCH_FORMATS,
+                        help="формат файла (по умолчанию — по расширению)")
+    parser.add_argument("--batch-size", type=int, default=1000, metavar="N",
+                        help="строк в одной пачке при загрузке")
+    add_storage_arguments(parser)
+    add_stats_arguments(parser)
+    args = parse_storage_args(parser, argv)
+    start_stats(args)
+    manager = make_manager(args)
+    try:
+        if args.command == "import":
+            owners, pets, skipped = import_file(
+                manager, args.file, args.file_format, max(1, args.batch_size))
+            print(f"Загружено владельцев: {owners}, питомцев: {pets}, "
+                  f"пропущено строк: {skipped}.")
+        else:
+            count = export_file(manager, args.file, args.file_format)
+            print(f"Выгружено строк: {count}.")
+            skipped = 0
+    finally:
+        # Каждая пачка уже зафиксирована в хранилище
+        manager.close(save=False)
+    # Код 1 — загрузка частичная: скрипты должны это видеть
+    if skipped:
+        sys.exit(1)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    start_stats(args)
+    manager = make_manager(args, args.debounce if args.async_save else None)
+    if manager.saver is not None:
+        # SIGTERM/SIGHUP завершают программу через SystemExit,
+        # чтобы сработал finally с сохранением
+        for sig in (signal.SIGTERM, getattr(signal, "SIGHUP", None)):
+            if sig is not None:
+                signal.signal(sig, lambda signum, frame: sys.exit(128 + signum))
+    print("Добро пожаловать.")
+    try:
+        main_menu(manager)
+    finally:
+        saver = manager.saver
+        if saver is not None and (not saver.stopped or saver.dirty):
+            manager.close()
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] in BATCH_COMMANDS:
+        batch_main(sys.argv[1:])
+    elif len(sys.argv) > 1 and sys.argv[1] == RUN_COMMAND:
+        run_main(sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,51 @@
+"""Общее для тестов: временный каталог данных и набор изменений,
+затрагивающий все операции журнала"""
+import os
+import tempfile
+import unittest
+
+from main import (Cat, CatBreed, Color, DataManager, Disease, Dog, DogBreed,
+                  Gender, Owner, Vaccine)
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Каждый тест — в своём пустом каталоге: DataManager пишет файлы
+    данных в текущий каталог"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp.name)
+
+    def assertSameData(self, first: DataManager, second: DataManager):
+        self.assertEqual(first.build_payload(), second.build_payload())
+
+
+def dog(name: str, age: int = 3) -> Dog:
+    return Dog(name, age, Gender.MALE.value, Color.BLACK.value, DogBreed.HUSKY.value)
+
+
+def cat(name: str, age: int = 2) -> Cat:
+    return Cat(name, age, Gender.FEMALE.value, Color.GRAY.value, CatBreed.SPHINX.value)
+
+
+def fill(manager: DataManager):
+    """Владельцы, магазин, продажи, визиты в клинику, удаления и пакетный
+    импорт — через методы DataManager, как из меню"""
+    manager.add_owner(Owner("Анна", 30, Gender.FEMALE.value))
+    manager.add_owner(Owner("Борис", 45, Gender.MALE.value))
+    for pet in (dog("Рекс"), cat("Мурка"), dog("Шарик", 5), cat("Барсик", 1)):
+        manager.add_shop_pet(pet)
+    manager.sell_pet(manager.owners[0], 2, "01.02.24 10:00:00")
+    manager.sell_pet(manager.owners[1], 1, "02.02.24 11:30:00")
+    manager.sell_pet(manager.owners[1], 1, "03.02.24 09:15:00")
+    owner = manager.owners[1]
+    pet = owner.pets[0]
+    manager.treat(owner, pet, [Disease.ALLERGY], [Vaccine.FLU_SHOT])
+    manager.remove_pet(owner, 1)
+    manager.import_batch(
+        [Owner("Вера", 28, Gender.FEMALE.value)],
+        [(len(manager.owners), cat("Тиша")), (None, dog("Бим", 1)),
+         (0, dog("Дружок", 4))])
+    manager.remove_owner(0)
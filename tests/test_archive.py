@@ -0,0 +1,94 @@
+"""Архив истории (--retention-days): перенос старых продаж и записей
+клиники в archive/ и чтение всей истории"""
+import gzip
+import json
+import os
+import unittest
+from datetime import datetime
+
+from main import DataManager, insert_by_time, record_ts
+from tests.support import TempDirTestCase
+
+# Середины месяцев: файл месяца не зависит от часового пояса
+DATES = ["15.01.24 10:00:00", "15.01.24 12:00:00", "14.02.24 09:30:00",
+         "14.03.24 18:00:00", "15.04.24 11:00:00", "15.05.24 08:00:00"]
+CUTOFF = datetime(2024, 4, 1)
+
+
+def sale(date: str, pet: str = "Мурка") -> dict:
+    rec = {"owner_name": "Анна", "pet_name": pet, "date": date}
+    record_ts(rec)
+    return rec
+
+
+def visit(date: str) -> dict:
+    rec = {"pet_name": "Рекс", "type": "Вакцина", "detail": "Прививка от гриппа",
+           "date": date}
+    record_ts(rec)
+    return rec
+
+
+class ArchiveTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.manager = DataManager(xml_mode="off")
+        for date in DATES:
+            insert_by_time(self.manager.petshop.sales, sale(date))
+            insert_by_time(self.manager.vetclinic.records, visit(date))
+        self.everything = list(self.manager.petshop.sales)
+        self.manager.save_all()
+
+    def archived(self, kind: str) -> list:
+        return list(self.manager.archive_store.read(kind))
+
+    def test_trim_at_cutoff(self):
+        cutoff = datetime.strptime(DATES[3], "%d.%m.%y %H:%M:%S")
+        self.assertEqual(self.manager.archive(cutoff), (3, 3))
+        # Запись ровно на границе остаётся в текущих данных
+        self.assertEqual(self.manager.petshop.sales, self.everything[3:])
+        self.assertEqual(self.archived("sales"), self.everything[:3])
+        loaded = DataManager(xml_mode="off")
+        loaded.load_all()
+        self.assertSameData(self.manager, loaded)
+
+    def test_file_per_month(self):
+        self.manager.archive(CUTOFF)
+        self.assertEqual(sorted(os.listdir(DataManager.ARCHIVE_DIR)), [
+            f"{kind}-2024-{month}.jsonl.gz"
+            for kind in ("records", "sales") for month in ("01", "02", "03")])
+        with gzip.open(os.path.join(DataManager.ARCHIVE_DIR, "sales-2024-01.jsonl.gz"),
+                       "rt", encoding="utf-8") as f:
+            self.assertEqual([json.loads(line) for line in f], self.everything[:2])
+
+    def test_repeat_without_duplicates_or_losses(self):
+        self.manager.archive(CUTOFF)
+        self.assertEqual(self.manager.archive(CUTOFF), (0, 0))
+        # Сбой после записи архива, до сохранения данных: повтор не дублирует
+        pending = self.manager.petshop.sales[:1]
+        self.manager.archive_store.add("sales", pending)
+        # Продажа, внесённая поздно задним числом (то же время, что
+        # у последней в архиве, и раньше)
+        late = [sale(DATES[3], "Барсик"), sale(DATES[1], "Шарик")]
+        for rec in late:
+            insert_by_time(self.manager.petshop.sales, rec)
+        self.manager.archive(datetime(2024, 4, 20))
+        archived = self.archived("sales")
+        self.assertEqual(len(archived), len(self.everything) - 1 + len(late))
+        self.assertEqual(sorted(map(json.dumps, archived)),
+                         sorted(map(json.dumps, self.everything[:-1] + late)))
+        self.assertEqual(self.manager.petshop.sales, self.everything[-1:])
+
+    def test_history(self):
+        self.manager.archive(CUTOFF)
+        self.assertEqual(list(self.manager.history("sales")), self.everything)
+        # Период через файлы архива и текущие данные
+        period = list(self.manager.history(
+            "records", datetime(2024, 2, 1), datetime(2024, 4, 30)))
+        self.assertEqual([r["date"] for r in period], DATES[2:5])
+        self.assertEqual(list(self.manager.history(
+            "sales", datetime(2024, 1, 15, 11), datetime(2024, 1, 31))), self.everything[1:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
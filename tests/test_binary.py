@@ -0,0 +1,71 @@
+"""Двоичный снимок data.bin (--format binary): запись и чтение без потерь"""
+import json
+import unittest
+
+from main import BinarySnapshot, DataManager, Owner, record_ts
+from tests.support import TempDirTestCase, cat, dog, fill
+
+
+class BinarySnapshotTest(TempDirTestCase):
+
+    def reload(self, **options) -> DataManager:
+        manager = DataManager(snapshot_format="binary", **options)
+        manager.load_all()
+        return manager
+
+    def test_round_trip(self):
+        manager = DataManager(snapshot_format="binary", xml_mode="off")
+        fill(manager)
+        self.assertSameData(manager, self.reload())
+
+    def test_same_as_json(self):
+        manager = DataManager()
+        fill(manager)
+        manager.snapshot_format = "binary"
+        manager.save_all()
+        loaded = self.reload()
+        with open(DataManager.JSON_FILE, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), loaded.build_payload())
+
+    def test_optional_fields(self):
+        manager = DataManager(snapshot_format="binary", xml_mode="off")
+        owner = Owner("Анна", 30, "Женский", [dog("Рекс"), cat("Мурка")])
+        owner.pets[0].passport = None
+        owner.pets[1].breed = None
+        manager.owners.append(owner)
+        manager.owners.append(Owner("Борис", 45, "Мужской"))
+        # Записи старого формата и с лишними полями хранятся как есть
+        manager.vetclinic.records.append(
+            {"pet_name": "Рекс", "type": "Вакцина", "detail": "Прививка от бешенства",
+             "date": "01.02.24 10:00:00", "visits": 3, "notes": ["осмотр", 1]})
+        manager.petshop.sales.append({"owner_name": "Анна", "pet_name": "Мурка",
+                                      "date": "02.02.24"})
+        # Время записи, как после загрузки
+        for rec in manager.petshop.sales + manager.vetclinic.records:
+            record_ts(rec)
+        manager.save_all()
+        self.assertSameData(manager, self.reload())
+
+    def test_empty(self):
+        manager = DataManager(snapshot_format="binary", xml_mode="off")
+        manager.save_all()
+        self.assertSameData(manager, self.reload())
+
+    def test_with_journal(self):
+        manager = DataManager(snapshot_format="binary", xml_mode="off", journal=True)
+        manager.COMPACT_EVERY = 4
+        fill(manager)
+        manager.add_owner(Owner("Гоша", 50, "Мужской"))
+        loaded = self.reload(journal=True)
+        self.assertSameData(manager, loaded)
+        self.assertEqual(loaded.journal_seq, manager.journal_seq)
+
+    def test_unknown_format(self):
+        with open(DataManager.BIN_FILE, "wb") as f:
+            f.write(BinarySnapshot.HEADER.pack(b"JUNK", 1, 0, 0))
+        with self.assertRaises(ValueError):
+            self.reload()
+
+
+if __name__ == "__main__":
+    unittest.main()
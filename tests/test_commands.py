@@ -0,0 +1,89 @@
+"""Команды без диалогов (python main.py run): разбор строк и фиксация
+изменений на контрольных точках"""
+import io
+import json
+import unittest
+
+from main import CommandError, DataManager, parse_command, run_commands
+from tests.support import TempDirTestCase
+
+SCRIPT = """\
+# владельцы и магазин
+owner Анна 30 Женский
+pet Cat Мурка 2 Женский Серый Сфинкс
+{"cmd": "pet", "type": "Dog", "name": "Рекс", "age": 3, "gender": "Мужской", "color": "Черный", "breed": "Хаски"}
+sell Анна Мурка
+checkpoint
+treat owner=Анна pet=Мурка diseases=Аллергия "vaccinations=Прививка от гриппа"
+owner 'Анна мария' 25 Женский
+"""
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_positional_and_keys(self):
+        self.assertEqual(parse_command("owner Анна 30 gender=Женский"),
+                         {"cmd": "owner", "name": "Анна", "age": "30", "gender": "Женский"})
+
+    def test_quoted(self):
+        self.assertEqual(parse_command("sell \"Анна Мария\" 'Мурка' "),
+                         {"cmd": "sell", "owner": "Анна Мария", "pet": "Мурка"})
+        self.assertEqual(parse_command('treat Анна Мурка "vaccinations=Прививка от гриппа"'),
+                         {"cmd": "treat", "owner": "Анна", "pet": "Мурка",
+                          "vaccinations": "Прививка от гриппа"})
+
+    def test_json(self):
+        command = {"cmd": "treat", "owner": "Анна", "pet": "Мурка", "diseases": ["Аллергия"]}
+        self.assertEqual(parse_command(json.dumps(command, ensure_ascii=False)), command)
+
+    def test_errors(self):
+        for line in ('{"cmd": ', '{"owner": "Анна"}', "sell Анна Мурка лишний", "owner 'Анна"):
+            with self.subTest(line=line), self.assertRaises(CommandError):
+                parse_command(line)
+
+
+class RunTest(TempDirTestCase):
+
+    def run_script(self, script: str, checkpoint: int = 0):
+        """(выполнено, с ошибками, точек), дозаписи журнала и лог ошибок"""
+        manager = DataManager(journal=True, xml_mode="off")
+        manager.load_all()
+        appends = []
+        append = manager.append_journal
+        manager.append_journal = lambda ops: (appends.append(len(ops)), append(ops))
+        log = io.StringIO()
+        result = run_commands(manager, io.StringIO(script), "cmds", checkpoint, log)
+        self.manager = manager
+        return result, appends, log.getvalue()
+
+    def test_script(self):
+        result, appends, log = self.run_script(SCRIPT)
+        self.assertEqual(result, (6, 0, 2), log)
+        # По одной дозаписи журнала на контрольную точку
+        self.assertEqual(appends, [4, 2])
+        owner = self.manager.owners[0]
+        self.assertEqual([p.name for p in owner.pets], ["Мурка"])
+        self.assertEqual(owner.pets[0].medical_card.diseases, ["Аллергия"])
+        self.assertEqual(self.manager.owners[1].name, "Анна мария")
+        loaded = DataManager(journal=True, xml_mode="off")
+        loaded.load_all()
+        self.assertSameData(self.manager, loaded)
+
+    def test_every_n_commands(self):
+        script = "".join(f"owner Владелец {20 + i} Мужской\n" for i in range(5))
+        result, appends, _ = self.run_script(script, checkpoint=2)
+        self.assertEqual(result[:2], (5, 0))
+        self.assertEqual(appends, [2, 2, 1])
+
+    def test_errors_are_skipped(self):
+        script = "owner Анна 30 Женский\nsell Борис Мурка\nowner анна 30 Женский\nfly\n"
+        result, appends, log = self.run_script(script)
+        self.assertEqual(result, (1, 3, 1))
+        self.assertEqual(appends, [1])
+        self.assertIn("cmds:2: Владелец 'Борис' не найден.", log)
+        self.assertIn("cmds:3: ", log)
+        self.assertIn("cmds:4: Неизвестная команда: 'fly'", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
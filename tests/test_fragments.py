@@ -0,0 +1,78 @@
+"""Кэш фрагментов снимка (--fragment-cache): после любых изменений
+data.json и data.xml совпадают с полной записью байт в байт"""
+import unittest
+from datetime import datetime
+
+from main import DataManager, Disease, Owner, Vaccine
+from tests.support import TempDirTestCase, cat, dog, fill
+
+
+class FragmentCacheTest(TempDirTestCase):
+
+    def read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    def assertSameAsFullSave(self, manager: DataManager):
+        """Сохранение из кэша против сохранения того же без кэша"""
+        manager.save_all()
+        cached = self.read(manager.JSON_FILE), self.read(manager.XML_FILE)
+        cache = manager._fragments
+        manager._fragments = None
+        manager.JSON_FILE, manager.XML_FILE = "full.json", "full.xml"
+        try:
+            manager.save_all()
+        finally:
+            manager._fragments = cache
+            del manager.JSON_FILE, manager.XML_FILE
+        self.assertEqual(cached, (self.read("full.json"), self.read("full.xml")))
+
+    def test_mutations(self):
+        manager = DataManager(fragment_cache=True)
+        fill(manager)
+        self.assertSameAsFullSave(manager)
+        # Каждое изменение — по уже закэшированным объектам
+        owner = manager.owners[0]
+        manager.add_shop_pet(dog("Тузик"))
+        manager.sell_pet(owner, len(manager.petshop.available_pets))
+        self.assertSameAsFullSave(manager)
+        manager.treat(owner, owner.pets[0], [Disease.FLU], [])
+        self.assertSameAsFullSave(manager)
+        manager.treat(owner, owner.pets[0], [], [Vaccine.GENERAL_SHOT])
+        self.assertSameAsFullSave(manager)
+        manager.remove_pet(owner, 0)
+        self.assertSameAsFullSave(manager)
+        manager.import_batch([Owner("Гоша", 50, "Мужской")], [(0, cat("Тиша")), (1, dog("Бим"))])
+        self.assertSameAsFullSave(manager)
+        manager.remove_owner(0)
+        self.assertSameAsFullSave(manager)
+        self.assertGreater(manager._fragments.hits, 0)
+
+    def test_archive(self):
+        manager = DataManager(fragment_cache=True)
+        fill(manager)
+        self.assertSameAsFullSave(manager)
+        # Продажи из fill — февраль 2024, записи клиники — сегодня
+        sales, _ = manager.archive(datetime(2024, 2, 3))
+        self.assertEqual(sales, 2)
+        self.assertSameAsFullSave(manager)
+
+    def test_journal_replay(self):
+        # Изменения другого процесса применяются к закэшированным объектам
+        first = DataManager(shared=True)
+        second = DataManager(shared=True, fragment_cache=True)
+        second.load_all()
+        fill(first)
+        second.sync()
+        self.assertSameAsFullSave(second)
+        owner = first.owners[0]
+        first.treat(owner, owner.pets[0], [Disease.FLU], [])
+        first.add_shop_pet(cat("Пушок"))
+        first.sell_pet(owner, len(first.petshop.available_pets))
+        first.remove_pet(first.owners[1], 0)
+        second.sync()
+        self.assertSameAsFullSave(second)
+
+
+if __name__ == "__main__":
+    unittest.main()
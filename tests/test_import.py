@@ -0,0 +1,113 @@
+"""Пакетная загрузка (python main.py import): проверка строк, CSV и JSONL,
+код выхода"""
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from main import BATCH_FIELDS, DataManager, export_file, import_file, validate_batch
+from tests.support import TempDirTestCase
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+OWNER = {"kind": "owner", "name": "Анна", "age": "30", "gender": "Женский"}
+PET = {"kind": "pet", "type": "Cat", "name": "Мурка", "age": "2", "gender": "Женский",
+       "color": "Серый", "breed": "Сфинкс", "owner": "Анна"}
+
+
+def row(base: dict, **changes) -> dict:
+    return {**base, **changes}
+
+
+def write_csv(path: str, rows: list):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, BATCH_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_jsonl(path: str, rows: list):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+
+class ValidateTest(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual(validate_batch([OWNER, PET, row(PET, type="", breed="Хаски")]),
+                         [None, None, None])
+
+    def test_errors(self):
+        errors = validate_batch([
+            row(OWNER, age="-1"),
+            row(OWNER, age="много"),
+            row(PET, type="Dog"),
+            row(PET, type="", breed=""),
+            row(PET, color="Зелёный"),
+            row(OWNER, owner="Борис"),
+            None,
+        ])
+        self.assertTrue(all(errors), errors)
+        self.assertIn("Сфинкс", errors[2])
+        self.assertIn("Dog", errors[2])
+
+
+class ImportTest(TempDirTestCase):
+
+    ROWS = [OWNER, PET, row(PET, name="Рекс", type="Dog", breed="Хаски", owner=""),
+            row(PET, name="Бим", owner="Борис"), row(PET, age="-3")]
+
+    def load(self, path: str):
+        manager = DataManager(xml_mode="off")
+        manager.load_all()
+        log = io.StringIO()
+        return manager, import_file(manager, path, batch_size=2, log=log), log.getvalue()
+
+    def check(self, path: str, first_line: int):
+        """first_line — номер строки файла с первой записью"""
+        manager, counts, log = self.load(path)
+        self.assertEqual(counts, (1, 2, 2))
+        self.assertIn(f"{path}:{first_line + 3}: Владелец 'Борис' не найден.", log)
+        self.assertIn(f"{path}:{first_line + 4}: ", log)
+        self.assertEqual([p.name for p in manager.owners[0].pets], ["Мурка"])
+        self.assertEqual([p.name for p in manager.petshop.available_pets], ["Рекс"])
+        loaded = DataManager(xml_mode="off")
+        loaded.load_all()
+        self.assertSameData(manager, loaded)
+
+    def test_csv(self):
+        write_csv("pets.csv", self.ROWS)
+        self.check("pets.csv", 2)
+
+    def test_jsonl(self):
+        write_jsonl("pets.jsonl", self.ROWS)
+        self.check("pets.jsonl", 1)
+
+    def test_export_import(self):
+        write_jsonl("pets.jsonl", self.ROWS[:3])
+        source, _, _ = self.load("pets.jsonl")
+        export_file(source, "out.csv")
+        os.remove(DataManager.JSON_FILE)
+        manager, counts, _ = self.load("out.csv")
+        self.assertEqual(counts, (1, 2, 0))
+        self.assertSameData(source, manager)
+
+    def run_import(self, path: str) -> subprocess.CompletedProcess:
+        return subprocess.run([sys.executable, MAIN, "import", path, "--xml", "off"],
+                              capture_output=True, text=True)
+
+    def test_exit_code(self):
+        write_jsonl("good.jsonl", self.ROWS[:3])
+        self.assertEqual(self.run_import("good.jsonl").returncode, 0)
+        write_jsonl("bad.jsonl", self.ROWS)
+        result = self.run_import("bad.jsonl")
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("пропущено строк: 2", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Журнал изменений (--journal): дозапись, компакция в снимок и повтор
+при загрузке, в том числе после оборванной записи"""
+import json
+import os
+import unittest
+
+from main import DataManager, Disease, Owner, Vaccine
+from tests.support import TempDirTestCase, dog, fill
+
+
+class JournalTest(TempDirTestCase):
+
+    def reload(self) -> DataManager:
+        manager = DataManager(journal=True)
+        manager.load_all()
+        return manager
+
+    def entries(self) -> list:
+        with open(DataManager.JOURNAL_FILE, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_changes_are_appended_not_saved(self):
+        manager = DataManager(journal=True)
+        fill(manager)
+        self.assertFalse(os.path.exists(DataManager.JSON_FILE))
+        entries = self.entries()
+        self.assertEqual([e["seq"] for e in entries], list(range(1, len(entries) + 1)))
+        self.assertEqual(manager.journal_seq, len(entries))
+
+    def test_reload_replays_journal(self):
+        manager = DataManager(journal=True)
+        fill(manager)
+        loaded = self.reload()
+        self.assertSameData(manager, loaded)
+        self.assertEqual(loaded.journal_seq, manager.journal_seq)
+
+    def test_compaction(self):
+        manager = DataManager(journal=True)
+        manager.COMPACT_EVERY = 4
+        fill(manager)
+        # После компакции в журнале остаются только записи новее снимка
+        self.assertLess(len(self.entries()), manager.journal_seq)
+        self.assertSameData(manager, self.reload())
+        manager.compact()
+        self.assertEqual(self.entries(), [{"seq": manager.journal_seq, "op": "snapshot"}])
+        manager.add_owner(Owner("Гоша", 50, "Мужской"))
+        self.assertSameData(manager, self.reload())
+
+    def test_entries_already_in_snapshot_are_skipped(self):
+        # Сбой между записью снимка и заменой журнала: старые записи
+        # остались, но повторно не применяются
+        manager = DataManager(journal=True)
+        fill(manager)
+        with open(DataManager.JOURNAL_FILE, "rb") as f:
+            old = f.read()
+        manager.compact()
+        with open(DataManager.JOURNAL_FILE, "wb") as f:
+            f.write(old)
+        self.assertSameData(manager, self.reload())
+
+    def test_replay_visit_without_medical_card(self):
+        manager = DataManager(journal=True)
+        owner = Owner("Анна", 30, "Женский", [dog("Рекс")])
+        manager.add_owner(owner)
+        records = manager.treat(owner, owner.pets[0], [Disease.ALLERGY], [Vaccine.FLU_SHOT])
+        entry = self.entries()[-1]
+        target = DataManager()
+        target.owners.append(Owner("Анна", 30, "Женский", [dog("Рекс")]))
+        pet = target.owners[0].pets[0]
+        pet.medical_card = None
+        target.apply(entry)
+        self.assertEqual(pet.medical_card.diseases, [Disease.ALLERGY.value])
+        self.assertEqual(pet.medical_card.vaccinations, [Vaccine.FLU_SHOT.value])
+        # Записи те же, с исходным временем
+        self.assertEqual(target.vetclinic.records, records)
+
+    def test_torn_tail(self):
+        manager = DataManager(journal=True)
+        fill(manager)
+        with open(DataManager.JOURNAL_FILE, "rb") as f:
+            last = f.read().splitlines(keepends=True)[-1]
+        # Сбой посреди дозаписи: от новой записи — только начало
+        with open(DataManager.JOURNAL_FILE, "ab") as f:
+            f.write(last[:len(last) // 2])
+        loaded = self.reload()
+        self.assertSameData(manager, loaded)
+        # Следующие изменения после такой загрузки тоже не теряются
+        loaded.add_shop_pet(dog("Тузик"))
+        loaded.add_owner(Owner("Гоша", 50, "Мужской"))
+        self.assertSameData(loaded, self.reload())
+
+
+if __name__ == "__main__":
+    unittest.main()
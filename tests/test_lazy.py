@@ -0,0 +1,86 @@
+"""Ленивая загрузка (--lazy): потоковое чтение data.json (JsonStream)
+и питомцы, создаваемые при первом обращении (LazyPets)"""
+import io
+import json
+import unittest
+from unittest import mock
+
+from main import DataManager, Disease, JsonStream, LazyPets, Owner
+from tests.support import TempDirTestCase, cat, dog, fill
+
+
+class JsonStreamTest(unittest.TestCase):
+
+    TEXT = json.dumps({"a": [12345, -678.25e2, 0, 987654321987654321, "строка", None],
+                       "b": {"c": [True, False, 3]}, "d": 10 ** 30})
+
+    def read(self, text: str, chunk: int):
+        js = JsonStream(io.StringIO(text))
+        js.CHUNK = chunk
+        result = {}
+        for key in js.iter_object():
+            result[key] = list(js.iter_array()) if key == "a" else js.value()
+        return result
+
+    def test_chunk_boundaries(self):
+        # Граница куска приходится на каждую позицию, в том числе внутри чисел
+        expected = json.loads(self.TEXT)
+        for chunk in range(1, 24):
+            with self.subTest(chunk=chunk):
+                self.assertEqual(self.read(self.TEXT, chunk), expected)
+
+    def test_number_at_end(self):
+        for chunk in range(1, 8):
+            js = JsonStream(io.StringIO("[1, 23456]"))
+            js.CHUNK = chunk
+            self.assertEqual(list(js.iter_array()), [1, 23456])
+
+
+class LazyLoadTest(TempDirTestCase):
+
+    def load(self, **options) -> DataManager:
+        manager = DataManager(xml_mode="off", **options)
+        manager.load_all()
+        return manager
+
+    def test_same_as_full_load(self):
+        fill(DataManager(xml_mode="off"))
+        # Мелкие куски: числа и строки рвутся между чтениями
+        with mock.patch.object(JsonStream, "CHUNK", 7):
+            lazy = self.load(lazy=True)
+        self.assertIsInstance(lazy.petshop.available_pets, LazyPets)
+        self.assertSameData(self.load(), lazy)
+
+    def test_changes_to_lazy_pets(self):
+        source = DataManager(xml_mode="off")
+        fill(source)
+        source.add_shop_pet(dog("Тузик"))
+        source.add_shop_pet(cat("Пушок"))
+        # С журналом изменение не пересохраняет (и не создаёт) всех питомцев
+        lazy = self.load(lazy=True, journal=True)
+        owner = lazy.owners[0]
+        lazy.sell_pet(owner, lazy.petshop.available_pets[-1])
+        lazy.treat(owner, owner.pets[0], [Disease.FLU], [])
+        lazy.remove_pet(owner, owner.pets[1])
+        lazy.add_owner(Owner("Гоша", 50, "Мужской"))
+        lazy.sell_pet(lazy.owners[-1], 1)
+        # Не тронутые питомцы так и не созданы
+        self.assertTrue(any(isinstance(p, dict) for p in lazy.petshop.available_pets._items))
+        self.assertSameData(lazy, self.load(journal=True))
+        self.assertSameData(lazy, self.load(lazy=True, journal=True))
+
+    def test_journal_on_lazy_load(self):
+        manager = DataManager(journal=True, xml_mode="off")
+        manager.COMPACT_EVERY = 5
+        fill(manager)
+        owner = manager.owners[0]
+        manager.treat(owner, owner.pets[0], [Disease.FLU], [])
+        manager.add_shop_pet(dog("Тузик"))
+        lazy = self.load(lazy=True, journal=True)
+        self.assertSameData(manager, lazy)
+        lazy.sell_pet(lazy.owners[0], 1)
+        self.assertSameData(lazy, self.load(journal=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Общий режим (--shared): несколько DataManager с одними файлами видят
+изменения друг друга через журнал под блокировкой data.lock"""
+import multiprocessing
+import os
+import unittest
+
+from main import ConflictError, DataManager, Disease, Owner
+from tests.support import TempDirTestCase, cat, dog, fill
+
+
+def open_shared() -> DataManager:
+    manager = DataManager(shared=True, xml_mode="off")
+    manager.load_all()
+    return manager
+
+
+def add_owners(path: str, prefix: str, count: int):
+    """Процесс-оператор: count владельцев по одному изменению"""
+    os.chdir(path)
+    manager = open_shared()
+    for i in range(count):
+        manager.add_owner(Owner(f"{prefix}{i}", 30, "Мужской"))
+
+
+class SharedTest(TempDirTestCase):
+
+    def test_sync_between_managers(self):
+        first, second = open_shared(), open_shared()
+        fill(first)
+        # Изменение второго ложится поверх изменений первого
+        second.add_shop_pet(dog("Тузик"))
+        second.sell_pet(second.owners[0], len(second.petshop.available_pets))
+        first.sync()
+        self.assertSameData(first, second)
+        self.assertEqual(first.journal_seq, second.journal_seq)
+        self.assertSameData(first, open_shared())
+
+    def test_conflict(self):
+        first, second = open_shared(), open_shared()
+        first.add_owner(Owner("Анна", 30, "Женский"))
+        first.add_shop_pet(cat("Мурка"))
+        second.sync()
+        pet = second.petshop.available_pets[0]
+        first.sell_pet(first.owners[0], first.petshop.available_pets[0])
+        # Питомец уже продан другим оператором
+        with self.assertRaises(ConflictError):
+            second.sell_pet(second.owners[0], pet)
+        self.assertSameData(first, second)
+
+    def test_owner_removed_by_other_manager(self):
+        first, second = open_shared(), open_shared()
+        first.add_owner(Owner("Анна", 30, "Женский"))
+        first.add_shop_pet(cat("Мурка"))
+        first.add_shop_pet(dog("Рекс"))
+        second.sync()
+        second.sell_pet(second.owners[0], 2)
+        first.sync()
+        owner = second.owners[0]
+        pet = second.petshop.available_pets[0]
+        first.remove_owner(0)
+        # Ни одно действие с удалённым владельцем не меняет данные второго
+        with self.assertRaises(ConflictError):
+            second.sell_pet(owner, pet)
+        with self.assertRaises(ConflictError):
+            second.remove_pet(owner, owner.pets[0])
+        with self.assertRaises(ConflictError):
+            second.treat(owner, owner.pets[0], [Disease.ALLERGY], [])
+        self.assertSameData(first, second)
+        self.assertEqual(owner.pets[0].medical_card.diseases, [])
+        second.save_all()
+        self.assertSameData(first, open_shared())
+
+    def test_compaction_by_other_manager(self):
+        first, second = open_shared(), open_shared()
+        first.COMPACT_EVERY = 3
+        fill(first)
+        # Отставший меньше чем на KEEP_TAIL записей догоняет по журналу
+        second.sync()
+        self.assertSameData(first, second)
+        first.add_shop_pet(dog("Бобик"))
+        first._journal_tail.clear()
+        first.compact()
+        # Хвоста в журнале нет — второй перечитывает снимок
+        seq = second.journal_seq
+        second.sync()
+        self.assertSameData(first, second)
+        self.assertEqual(second.journal_seq, seq + 1)
+        second.add_owner(Owner("Гоша", 50, "Мужской"))
+        first.sync()
+        self.assertSameData(first, second)
+
+    def test_processes(self):
+        ctx = multiprocessing.get_context("spawn")
+        workers = [ctx.Process(target=add_owners, args=(os.getcwd(), f"Оператор{n}-", 20))
+                   for n in range(3)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+            self.assertEqual(w.exitcode, 0)
+        manager = open_shared()
+        self.assertEqual(len(manager.owners), 60)
+        self.assertEqual(manager.journal_seq, 60)
+        self.assertEqual(len({o.name for o in manager.owners}), 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Хранение в SQLite (--sqlite): перенос из data.json и построчная
+фиксация изменений"""
+import unittest
+
+from main import DataManager, Owner, SqliteStorage
+from tests.support import TempDirTestCase, cat, dog, fill
+
+DB_FILE = "pets.db"
+
+
+class SqliteTest(TempDirTestCase):
+
+    def open(self) -> DataManager:
+        manager = DataManager(storage=SqliteStorage(DB_FILE))
+        self.addCleanup(manager.storage.close)
+        manager.load_all()
+        return manager
+
+    def trace(self, manager: DataManager) -> list:
+        """SQL-запросы, выполненные дальше через хранилище manager"""
+        statements = []
+        manager.storage.conn.set_trace_callback(statements.append)
+        return statements
+
+    def test_migration_from_json(self):
+        source = DataManager()
+        fill(source)
+        self.assertSameData(source, self.open())
+
+    def test_passport_and_card_as_saved(self):
+        source = DataManager()
+        owner = Owner("Анна", 30, "Женский", [dog("Рекс"), cat("Мурка")])
+        owner.pets[0].passport = None
+        passport = owner.pets[1].passport
+        passport.birth_date = "01.01.20"
+        passport.age = 1
+        owner.pets[1].medical_card.pet_name = "Мурка-старшая"
+        source.add_owner(owner)
+        source.save_all()
+        loaded = self.open()
+        self.assertSameData(source, loaded)
+        self.assertIsNone(loaded.owners[0].pets[0].passport)
+
+    def test_changes_are_committed_row_by_row(self):
+        manager = self.open()
+        statements = self.trace(manager)
+        fill(manager)
+        # Без полной перезаписи: таблицы целиком не очищаются
+        self.assertNotIn("DELETE FROM owners", statements)
+        self.assertSameData(manager, self.open())
+
+    def test_deferred_batch_is_one_transaction(self):
+        manager = self.open()
+        statements = self.trace(manager)
+        with manager.deferred():
+            # Позиции владельцев и питомцев сдвигаются внутри пачки
+            fill(manager)
+            manager.add_shop_pet(cat("Пушок"))
+            manager.sell_pet(manager.owners[-1], len(manager.petshop.available_pets))
+            manager.add_owner(Owner("Гоша", 50, "Мужской"))
+        self.assertEqual(sum(s.startswith("BEGIN") for s in statements), 1)
+        self.assertNotIn("DELETE FROM owners", statements)
+        self.assertSameData(manager, self.open())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""data.xml: потоковая запись совпадает с прежней записью через minidom"""
+import os
+import unittest
+
+from main import DataManager, Owner, write_xml
+from tests.support import TempDirTestCase, cat, fill
+
+# Эталон получен прежним способом (ElementTree + minidom.toprettyxml(indent="  "))
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "minidom.xml")
+
+
+def pet(kind: str, name: str, breed, passport=True, vaccinations=(), diseases=()) -> dict:
+    return {
+        "type": kind, "name": name, "age": 3, "gender": "Мужской", "color": "Черный",
+        "breed": breed,
+        "passport": {"pet_name": name, "age": 3, "color": "Черный", "gender": "Мужской",
+                     "breed": breed, "birth_date": "01.02.24"} if passport else None,
+        "medical_card": {"pet_name": name, "vaccinations": list(vaccinations),
+                         "diseases": list(diseases)},
+    }
+
+
+PAYLOAD = {
+    "owners": [
+        {"name": 'Том & "Джерри" <мл.>', "age": 30, "gender": "Мужской", "pets": [
+            pet("Dog", "Рекс <1>", "Хаски", vaccinations=["Прививка от гриппа"],
+                diseases=["Аллергия"]),
+            pet("Cat", "Мурка & Ко", None, passport=False),
+        ]},
+        # Пустые элементы: владелец без питомцев
+        {"name": "Анна", "age": 25, "gender": "Женский", "pets": []},
+    ],
+    "petshop": {
+        "available_pets": [
+            pet("Cat", "Барсик", None),
+            pet("Dog", 'Шарик "Ш"', "Лабрадор", passport=False, diseases=["Грипп"]),
+        ],
+        "sales": [{"owner_name": "Анна", "pet_name": "Пушок > всех",
+                   "date": "03.02.24 10:00:00", "ts": 1706954400}],
+    },
+    "vetclinic": {"records": []},
+}
+
+
+class XmlTest(TempDirTestCase):
+
+    def read(self, path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_same_as_minidom(self):
+        write_xml("data.xml", PAYLOAD)
+        self.assertEqual(self.read("data.xml"), self.read(GOLDEN))
+
+    def test_export_from_objects(self):
+        # Экспорт по запросу кодирует объекты по одному — результат тот же
+        manager = DataManager(xml_mode="off")
+        fill(manager)
+        manager.add_owner(Owner("Пустой <&>", 40, "Мужской"))
+        manager.petshop.available_pets[0].passport = None
+        manager.add_shop_pet(cat("Снежок"))
+        manager.save_xml()
+        write_xml("full.xml", manager.build_payload())
+        self.assertEqual(self.read(DataManager.XML_FILE), self.read("full.xml"))
+
+
+if __name__ == "__main__":
+    unittest.main()